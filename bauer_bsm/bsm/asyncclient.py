@@ -0,0 +1,440 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from . import config
+from . import modbus
+from . import readplan
+from .client import BSM_DEFAULT_BAUDRATE, BSM_DEFAULT_PARITY, \
+    BSM_DEFAULT_READ_PLAN_MAX_GAP, BSM_DEFAULT_SLAVE_ID, \
+    BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF, BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL, \
+    BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL, BSM_DEFAULT_SNAPSHOT_TIMEOUT, \
+    BSM_DEFAULT_TIMEOUT, BsmClientDevice, SnapshotStatus, SnapshotTimeoutError
+from ..sunspec.core import client as sclient
+from ..sunspec.core.modbus import client as smodbus
+import asyncio
+
+
+# Methods and attributes of BsmClientDevice which don't perform any I/O and
+# are provided by AsyncBsmClientDevice as they are.
+_DELEGATED_ATTRIBUTES = {
+        'aliases_list',
+        'has_repeating_blocks_blob_layout',
+        'lookup_model',
+        'lookup_point_in_model',
+        'lookup_snapshot',
+        'model_aliases',
+        'model_instance_label',
+        'models_list',
+        'repeating_blocks_blob',
+        'repeating_blocks_blob_explicit_length_bytes',
+        'repeating_blocks_blob_id',
+        'snapshot_aliases',
+    }
+
+
+
+
+class AsyncModbusTcpTransport:
+    """
+    Modbus TCP transport for AsyncBsmClientDevice.
+
+    The connection gets established with the first transaction. It gets
+    closed when a transaction fails or gets cancelled and re-established with
+    the next one.
+    """
+    def __init__(self, host, port=smodbus.TCP_DEFAULT_PORT):
+        self.host = host
+        self.port = port
+
+        self._lock = asyncio.Lock()
+        self._reader = None
+        self._writer = None
+        self._transaction_id = 0
+
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+
+    async def close(self):
+        async with self._lock:
+            self._close()
+
+
+    async def transaction(self, slave_id, pdu):
+        """
+        Sends the request PDU to unit slave_id and returns the response PDU.
+        """
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    (self._reader, self._writer) = \
+                        await asyncio.open_connection(self.host, self.port)
+
+                self._transaction_id = (self._transaction_id + 1) & 0xffff
+                self._writer.write(modbus.tcp_frame(self._transaction_id, slave_id, pdu))
+                await self._writer.drain()
+
+                header = await self._reader.readexactly(modbus.TCP_HEADER_LEN)
+                (transaction_id, unit_id, length) = modbus.tcp_header(header)
+                response = await self._reader.readexactly(length)
+
+                if transaction_id != self._transaction_id or unit_id != slave_id:
+                    raise smodbus.ModbusClientError('Modbus response to unexpected request')
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self._close()
+                raise smodbus.ModbusClientError('Socket error: {}'.format(e))
+            except BaseException:
+                # Don't get confused by leftovers from a failed or cancelled
+                # transaction. Start over with a new connection.
+                self._close()
+                raise
+
+        return response
+
+
+
+
+class AsyncModbusRtuTransport:
+    """
+    Modbus RTU transport for AsyncBsmClientDevice.
+
+    The serial port gets opened with the first transaction and is accessed
+    without blocking by watching its file descriptor with the event loop.
+    This requires an event loop supporting add_reader and add_writer (which
+    is the case for the default event loop on POSIX systems).
+
+    Requests are sent not before the inter-frame delay has passed since the
+    end of the previous transaction.
+    """
+    def __init__(self, port, baudrate=BSM_DEFAULT_BAUDRATE, parity=BSM_DEFAULT_PARITY):
+        self.port = port
+        self.baudrate = baudrate
+        self.parity = parity
+        self.serial = None
+
+        self._lock = asyncio.Lock()
+        self._last_frame_end = None
+
+
+    async def _drain(self):
+        # Wait for the request to actually be put on the line. The
+        # inter-frame delay and the response timeout start at its end.
+        character_time = modbus.rtu_character_time(self.baudrate)
+        waiting = self.serial.out_waiting
+
+        while waiting:
+            await asyncio.sleep(waiting * character_time)
+            waiting = self.serial.out_waiting
+
+
+    def _open(self):
+        # Importing pySerial takes a while. Defer it until it is actually
+        # needed.
+        import serial
+
+        try:
+            self.serial = serial.Serial(port=self.port, baudrate=self.baudrate,
+                bytesize=8, parity=self.parity, stopbits=1, xonxoff=0,
+                timeout=0, write_timeout=0)
+        except serial.SerialException as e:
+            raise smodbus.ModbusClientError('Serial init error: {}'.format(e))
+
+
+    async def _read_exactly(self, count):
+        data = b''
+
+        while len(data) < count:
+            chunk = self.serial.read(count - len(data))
+
+            if chunk:
+                data += chunk
+            else:
+                await self._wait_for_port(writable=False)
+
+        return data
+
+
+    async def _wait_for_inter_frame_delay(self):
+        if self._last_frame_end is not None:
+            loop = asyncio.get_running_loop()
+            delay = self._last_frame_end \
+                + modbus.rtu_inter_frame_delay(self.baudrate) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+    async def _wait_for_port(self, writable):
+        loop = asyncio.get_running_loop()
+        fd = self.serial.fileno()
+        ready = loop.create_future()
+
+        if writable:
+            (add, remove) = (loop.add_writer, loop.remove_writer)
+        else:
+            (add, remove) = (loop.add_reader, loop.remove_reader)
+
+        add(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+    async def _write(self, data):
+        while data:
+            written = self.serial.write(data)
+            data = data[written:]
+
+            if data:
+                await self._wait_for_port(writable=True)
+
+        await self._drain()
+
+
+    async def close(self):
+        async with self._lock:
+            if self.serial is not None:
+                self.serial.close()
+                self.serial = None
+
+
+    async def transaction(self, slave_id, pdu):
+        """
+        Sends the request PDU to unit slave_id and returns the response PDU.
+        """
+        async with self._lock:
+            if self.serial is None:
+                self._open()
+
+            await self._wait_for_inter_frame_delay()
+
+            try:
+                # Discard late responses from failed or cancelled
+                # transactions.
+                self.serial.reset_input_buffer()
+                await self._write(modbus.rtu_frame(slave_id, pdu))
+
+                header = await self._read_exactly(modbus.RTU_RESPONSE_HEADER_LEN)
+                remaining = modbus.rtu_response_len(header) - len(header)
+                response = header + await self._read_exactly(remaining)
+            except OSError as e:
+                raise smodbus.ModbusClientError('Serial error: {}'.format(e))
+            finally:
+                self._last_frame_end = asyncio.get_running_loop().time()
+
+        return modbus.rtu_pdu(response, slave_id)
+
+
+
+
+class AsyncBsmClientDevice:
+    """
+    An asyncio client for BSM meters providing the same model instances and
+    aliases as BsmClientDevice.
+
+    Data gets read and written asynchronously through a transport (either
+    AsyncModbusRtuTransport or AsyncModbusTcpTransport). Decoding the data
+    and verifying snapshots is done by a BsmClientDevice without Modbus
+    device of its own. Each Modbus transaction is limited to timeout seconds
+    and the methods could be cancelled at any time.
+
+    Attributes:
+
+        device
+            The BsmClientDevice providing the model instances.
+
+        transport
+            The transport used for Modbus transactions.
+    """
+    def __init__(self, transport, slave_id=BSM_DEFAULT_SLAVE_ID,
+            timeout=BSM_DEFAULT_TIMEOUT, max_count=smodbus.REQ_COUNT_MAX):
+        self.device = BsmClientDevice(device_type=None, slave_id=slave_id,
+            max_count=max_count)
+        self.transport = transport
+        self.slave_id = slave_id
+        self.timeout = timeout
+        self.max_count = max_count
+
+
+    def __getattr__(self, name):
+        if name in _DELEGATED_ATTRIBUTES:
+            return getattr(self.device, name)
+        raise AttributeError(name)
+
+
+    async def _read_image_requests(self, requests):
+        """
+        Asynchronous counterpart of BsmClientDevice._read_image_requests.
+        """
+        image = readplan.RegisterImage()
+
+        for (addr, count) in requests(image):
+            image.add(addr, await self.read(addr, count))
+
+        return image
+
+
+    async def _transaction(self, pdu):
+        try:
+            return await asyncio.wait_for(
+                self.transport.transaction(self.slave_id, pdu), self.timeout)
+        except asyncio.TimeoutError:
+            raise smodbus.ModbusClientTimeout('Response timeout')
+
+
+    async def close(self):
+        await self.transport.close()
+
+
+    async def create_snapshot(self, alias):
+        snapshot = self.device.snapshot_aliases[alias]
+        status = snapshot.points[config.SNAPSHOT_STATUS_DATA_POINT_ID]
+
+        status.value = SnapshotStatus.UPDATING
+        await self.write(int(status.addr),
+            status.point_type.to_data(status.value_base, 2 * int(status.point_type.len)))
+        status.dirty = False
+
+
+    async def get_public_key(self, read_data=True, output_format='der'):
+        if read_data:
+            await self.read_points_compact(config.BSM_INSTANCE_ALIAS)
+
+        return self.device.get_public_key(read_data=False, output_format=output_format)
+
+
+    async def get_snapshot(self, alias, timeout=BSM_DEFAULT_SNAPSHOT_TIMEOUT,
+            poll_interval=BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL,
+            poll_backoff=BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF,
+            poll_max_interval=BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL):
+        """
+        Creates a snapshot for the given alias and reads its data once the
+        meter has finished it. See BsmClientDevice.get_snapshot for details.
+        """
+        loop = asyncio.get_running_loop()
+        snapshot = self.device.snapshot_aliases[alias]
+        status = snapshot.points[config.SNAPSHOT_STATUS_DATA_POINT_ID]
+        deadline = loop.time() + timeout
+        interval = poll_interval
+
+        await self.create_snapshot(alias)
+
+        await self.read_points_subset(snapshot, [status])
+        while status.value == SnapshotStatus.UPDATING:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise SnapshotTimeoutError('Snapshot \'{}\' not ready within {} s.'.format(alias, timeout))
+
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * poll_backoff, poll_max_interval)
+            await self.read_points_subset(snapshot, [status])
+
+        if status.value == SnapshotStatus.VALID:
+            await self.read_points_compact(snapshot)
+            return snapshot
+        else:
+            return None
+
+
+    def lookup_model_and_point(self, model_name, point_id):
+        """
+        Case-insensitively looks up a data point along with its model by the
+        given point name and model name or alias.
+        """
+        return self.device.lookup_model_and_point(model_name, point_id)
+
+
+    async def read(self, addr, count):
+        """
+        Reads Modbus registers from the device.
+        """
+        data = b''
+
+        try:
+            for (request_addr, request_count) in readplan.plan_reads([(addr, count)], self.max_count):
+                pdu = await self._transaction(modbus.read_request(request_addr, request_count))
+                data += modbus.read_response_data(pdu, request_count)
+        except smodbus.ModbusClientError as e:
+            raise sclient.SunSpecClientError('Modbus read error: {}'.format(e))
+
+        return data
+
+
+    async def read_models(self, models, max_gap=BSM_DEFAULT_READ_PLAN_MAX_GAP):
+        """
+        Reads the data points of the given model instances (or aliases). See
+        BsmClientDevice.read_models for details.
+        """
+        models = self.device._resolve_models(models)
+        image = await self._read_image_requests(
+            lambda image: self.device._models_requests(models, max_gap))
+        self.device._read_models_from_image(models, image)
+
+
+    async def read_points(self, model):
+        """
+        Reads all data points of the given model instance (or alias).
+        """
+        await self.read_models([model])
+
+
+    async def read_points_compact(self, model):
+        """
+        Reads all data points of the given model instance (or alias) but
+        skips unused registers of BLOB or trailing string data. See
+        BsmClientDevice.read_points_compact for details.
+        """
+        [model] = self.device._resolve_models([model])
+        image = await self._read_image_requests(
+            lambda image: self.device._compact_requests(model, image))
+        self.device._read_model_from_image(model, image)
+
+
+    async def read_points_subset(self, model, point_ids, max_gap=BSM_DEFAULT_READ_PLAN_MAX_GAP):
+        """
+        Reads just the given data points of a model instance (or alias) along
+        with the scale factors they reference. See
+        BsmClientDevice.read_points_subset for details.
+        """
+        [model] = self.device._resolve_models([model])
+        points = self.device._resolve_points(model, point_ids)
+        image = await self._read_image_requests(
+            lambda image: self.device._points_requests(points, max_gap))
+        self.device._read_points_from_image(points, image)
+
+        return points
+
+
+    async def verify_snapshot(self, alias, read_data=True, trace=None):
+        """
+        Verifies snapshot data for the given alias.
+
+        By default both, the BSM model containing the public key and the
+        snapshot are read before verification.
+        """
+        if read_data:
+            await self.read_points_compact(config.BSM_INSTANCE_ALIAS)
+            await self.read_points_compact(self.device.snapshot_aliases[alias])
+
+        return self.device.verify_snapshot(alias, read_data=False, trace=trace)
+
+
+    async def write(self, addr, data):
+        """
+        Writes Modbus registers to the device.
+        """
+        try:
+            for offset in range(0, len(data) // 2, self.max_count):
+                chunk = data[2 * offset:2 * (offset + self.max_count)]
+                pdu = await self._transaction(modbus.write_request(addr + offset, chunk))
+                modbus.write_response_check(pdu, addr + offset, len(chunk) // 2)
+        except smodbus.ModbusClientError as e:
+            raise sclient.SunSpecClientError('Modbus write error: {}'.format(e))
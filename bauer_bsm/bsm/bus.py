@@ -0,0 +1,714 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from . import modbus
+from . import readplan
+from .client import BSM_DEFAULT_BAUDRATE, BSM_DEFAULT_PARITY, BSM_DEFAULT_TIMEOUT
+from ..sunspec.core import client as sclient
+from ..sunspec.core.modbus import client as smodbus
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import binascii
+import collections
+import socket
+import threading
+import time
+
+
+# Buses shared by the clients of several meters.
+#
+# A bus owns the connection to the meters (a serial port or a TCP connection
+# to a gateway) and keeps it open for all of its clients. It provides a Modbus
+# device for each meter which gets used by BsmClientDevice in place of
+# pySunSpec's own Modbus devices. Transactions are serialized by the bus'
+# lock except for PipelinedTcpBus which keeps several of them in flight.
+
+
+# Number of outstanding requests for a PipelinedTcpBus.
+BSM_DEFAULT_PIPELINE_WINDOW = 8
+
+
+
+
+class _BusDevice:
+    """
+    Modbus device for a single unit on a bus. It provides the interface of
+    pySunSpec's Modbus devices for being used as the Modbus device of a
+    BsmClientDevice.
+    """
+    def __init__(self, bus, slave_id, trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        self.bus = bus
+        self.slave_id = slave_id
+        self.trace_func = trace_func
+        self.max_count = max_count
+
+
+    def close(self):
+        # The connection is owned by the bus and stays open.
+        pass
+
+
+    def read(self, addr, count, op=smodbus.FUNC_READ_HOLDING):
+        return self.bus.read(self.slave_id, addr, count, op=op,
+            trace_func=self.trace_func, max_count=self.max_count)
+
+
+    def read_multiple(self, requests, op=smodbus.FUNC_READ_HOLDING):
+        return self.bus.read_multiple(self.slave_id, requests, op=op,
+            trace_func=self.trace_func, max_count=self.max_count)
+
+
+    def write(self, addr, data):
+        return self.bus.write(self.slave_id, addr, data,
+            trace_func=self.trace_func, max_count=self.max_count)
+
+
+
+
+class _ConnectionLost(Exception):
+    pass
+
+
+
+
+class _Bus:
+    """
+    Common functionality of all buses.
+    """
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def device(self, slave_id, trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Returns a Modbus device for the unit slave_id on this bus.
+        """
+        return _BusDevice(self, slave_id, trace_func=trace_func,
+            max_count=max_count)
+
+
+    def read_multiple(self, slave_id, requests, op=smodbus.FUNC_READ_HOLDING,
+            trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Reads the register ranges given as list of (address, count) tuples
+        from unit slave_id and returns a list of their data.
+        """
+        with self.lock:
+            return [self.read(slave_id, addr, count, op=op,
+                trace_func=trace_func, max_count=max_count)
+                for (addr, count) in requests]
+
+
+
+
+class SerialBus(_Bus):
+    """
+    A serial Modbus RTU bus (like an RS-485 line with several daisy-chained
+    meters) shared by any number of BsmClientDevice instances.
+
+    The serial port gets opened once when creating the bus and stays open
+    until the bus gets closed, regardless of the clients using it. Modbus
+    transactions from all clients get serialized by lock, which makes the bus
+    safe to use from multiple threads. Holding lock keeps other threads from
+    interleaving their transactions with a sequence of transactions.
+
+    Pass a bus to BsmClientDevice instead of a serial device name for using
+    it.
+
+    Attributes:
+
+        name
+            Name of the serial device.
+
+        client
+            The pySunSpec ModbusClientRTU doing the actual communication.
+
+        device_type
+            The pySunSpec device type of this bus.
+
+        lock
+            Reentrant lock serializing the transactions on this bus.
+    """
+    device_type = sclient.RTU
+
+
+    def __init__(self, name, baudrate=BSM_DEFAULT_BAUDRATE,
+            parity=BSM_DEFAULT_PARITY, timeout=BSM_DEFAULT_TIMEOUT):
+        self.name = name
+        self.lock = threading.RLock()
+
+        # Create the client on our own instead of getting it from pySunSpec's
+        # registry of RTU clients which closes the port once its last device
+        # is gone.
+        self.client = smodbus.ModbusClientRTU(name, baudrate, parity)
+        self.client.serial.timeout = timeout
+        self.client.serial.writeTimeout = timeout
+
+
+    @property
+    def serial(self):
+        """
+        The pySerial Serial object of this bus for controlling modem lines.
+        """
+        return self.client.serial
+
+
+    def close(self):
+        """
+        Closes the serial port.
+        """
+        with self.lock:
+            self.client.close()
+
+
+    def read(self, slave_id, addr, count, op=smodbus.FUNC_READ_HOLDING,
+            trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Reads count registers starting at addr from unit slave_id.
+        """
+        with self.lock:
+            return self.client.read(slave_id, addr, count, op=op,
+                trace_func=trace_func, max_count=max_count)
+
+
+    def write(self, slave_id, addr, data, trace_func=None,
+            max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Writes data to the registers starting at addr of unit slave_id.
+        """
+        with self.lock:
+            return self.client.write(slave_id, addr, data,
+                trace_func=trace_func, max_count=max_count)
+
+
+
+
+class _SocketBus(_Bus):
+    """
+    Common functionality of buses connected through a TCP gateway.
+
+    The connection gets established with the first transaction and is kept
+    open for subsequent ones. It gets closed when a transaction fails and
+    re-established with the next one. A transaction on a connection which
+    has been closed by the gateway in the meantime (which gateways tend to do
+    with idle connections) gets retried once on a new connection.
+    """
+    device_type = sclient.TCP
+
+
+    def __init__(self, host, port=smodbus.TCP_DEFAULT_PORT,
+            timeout=BSM_DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.name = '{}:{}'.format(host, port)
+        self.lock = threading.RLock()
+        self.socket = None
+
+
+    def _close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+    def _connect(self):
+        self.socket = socket.create_connection((self.host, self.port),
+            timeout=self.timeout)
+        # Requests are small and get sent at once. Don't let them wait for
+        # outstanding acknowledgements.
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+    def _recv_exactly(self, count):
+        data = b''
+
+        while len(data) < count:
+            chunk = self.socket.recv(count - len(data))
+            if not chunk:
+                if data:
+                    raise smodbus.ModbusClientError('Connection closed within response')
+                raise _ConnectionLost()
+            data += chunk
+
+        return data
+
+
+    def _trace(self, trace_func, slave_id, addr, direction, frame):
+        if trace_func:
+            trace_func('{}:{}[addr={}] {}{}'.format(self.name, slave_id, addr,
+                direction, binascii.hexlify(frame).decode().upper()))
+
+
+    def _transaction(self, slave_id, addr, pdu, trace_func):
+        with self.lock:
+            while True:
+                reused = self.socket is not None
+
+                try:
+                    if self.socket is None:
+                        self._connect()
+                    return self._exchange(slave_id, addr, pdu, trace_func)
+                except _ConnectionLost:
+                    self._close()
+                    if reused:
+                        continue
+                    raise smodbus.ModbusClientError('Connection closed by gateway')
+                except socket.timeout:
+                    self._close()
+                    raise smodbus.ModbusClientTimeout('Response timeout')
+                except (ConnectionResetError, BrokenPipeError) as e:
+                    self._close()
+                    if reused:
+                        continue
+                    raise smodbus.ModbusClientError('Socket error: {}'.format(e))
+                except OSError as e:
+                    self._close()
+                    raise smodbus.ModbusClientError('Socket error: {}'.format(e))
+                except BaseException:
+                    # Don't get confused by leftovers from a failed
+                    # transaction. Start over with a new connection.
+                    self._close()
+                    raise
+
+
+    def close(self):
+        """
+        Closes the connection to the gateway.
+        """
+        with self.lock:
+            self._close()
+
+
+    def read(self, slave_id, addr, count, op=smodbus.FUNC_READ_HOLDING,
+            trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Reads count registers starting at addr from unit slave_id.
+        """
+        data = b''
+
+        with self.lock:
+            for (request_addr, request_count) in readplan.plan_reads([(addr, count)], max_count):
+                pdu = self._transaction(slave_id, request_addr,
+                    modbus.read_request(request_addr, request_count, op=op),
+                    trace_func)
+                data += modbus.read_response_data(pdu, request_count, op=op)
+
+        return data
+
+
+    def write(self, slave_id, addr, data, trace_func=None,
+            max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Writes data to the registers starting at addr of unit slave_id.
+        """
+        with self.lock:
+            for offset in range(0, len(data) // 2, max_count):
+                chunk = data[2 * offset:2 * (offset + max_count)]
+                pdu = self._transaction(slave_id, addr + offset,
+                    modbus.write_request(addr + offset, chunk), trace_func)
+                modbus.write_response_check(pdu, addr + offset, len(chunk) // 2)
+
+
+
+
+class TcpBus(_SocketBus):
+    """
+    A Modbus TCP gateway (or a meter with Modbus TCP interface) shared by any
+    number of BsmClientDevice instances.
+
+    In contrast to pySunSpec's Modbus TCP device, which connects for every
+    single read, the connection is kept open and gets shared by all clients.
+    Transactions from all clients get serialized by lock like for a
+    SerialBus.
+
+    Attributes:
+
+        name
+            Host and port of the gateway.
+
+        device_type
+            The pySunSpec device type of this bus.
+
+        lock
+            Reentrant lock serializing the transactions on this bus.
+
+        socket
+            The socket of the current connection, if any.
+    """
+    def __init__(self, host, port=smodbus.TCP_DEFAULT_PORT,
+            timeout=BSM_DEFAULT_TIMEOUT):
+        super(TcpBus, self).__init__(host, port=port, timeout=timeout)
+        self._transaction_id = 0
+
+
+    def _exchange(self, slave_id, addr, pdu, trace_func):
+        self._transaction_id = (self._transaction_id + 1) & 0xffff
+        request = modbus.tcp_frame(self._transaction_id, slave_id, pdu)
+        self._trace(trace_func, slave_id, addr, '->', request)
+        self.socket.sendall(request)
+
+        header = self._recv_exactly(modbus.TCP_HEADER_LEN)
+        (transaction_id, unit_id, length) = modbus.tcp_header(header)
+        response = self._recv_exactly(length)
+        self._trace(trace_func, slave_id, addr, '<--', header + response)
+
+        if transaction_id != self._transaction_id or unit_id != slave_id:
+            raise smodbus.ModbusClientError('Modbus response to unexpected request')
+
+        return response
+
+
+
+
+class RtuOverTcpBus(_SocketBus):
+    """
+    A serial Modbus RTU bus accessed through a transparent TCP gateway which
+    forwards RTU frames as they are. It is shared by any number of
+    BsmClientDevice instances like a TcpBus.
+
+    Attributes:
+
+        name
+            Host and port of the gateway.
+
+        device_type
+            The pySunSpec device type of this bus.
+
+        lock
+            Reentrant lock serializing the transactions on this bus.
+
+        socket
+            The socket of the current connection, if any.
+    """
+    device_type = sclient.RTU
+
+
+    def _exchange(self, slave_id, addr, pdu, trace_func):
+        request = modbus.rtu_frame(slave_id, pdu)
+        self._trace(trace_func, slave_id, addr, '->', request)
+        self.socket.sendall(request)
+
+        header = self._recv_exactly(modbus.RTU_RESPONSE_HEADER_LEN)
+        response = header + self._recv_exactly(modbus.rtu_response_len(header) - len(header))
+        self._trace(trace_func, slave_id, addr, '<--', response)
+
+        return modbus.rtu_pdu(response, slave_id)
+
+
+
+
+class _PipelinedConnection:
+    """
+    A single connection of a PipelinedTcpBus along with the transactions in
+    flight on it.
+    """
+    def __init__(self, sock):
+        self.socket = sock
+        self.pending = {}
+        # Transactions given up by timeout. Their responses get discarded when
+        # they arrive after all.
+        self.abandoned = set()
+        self.error = None
+        self.reader = None
+
+
+
+
+class PipelinedTcpBus(_Bus):
+    """
+    A Modbus TCP gateway shared by any number of BsmClientDevice instances
+    which keeps up to window requests in flight on a single connection.
+
+    Responses get matched to their requests by the MBAP transaction ID. This
+    pays off for gateways serving several serial lines: transactions for
+    meters on different lines (for example from the workers of a
+    FleetPoller) get executed by the gateway in parallel. Requests for a
+    single read get sent at once as well which saves the round trip time for
+    all but the first one.
+
+    Not all gateways accept more than one outstanding request. Use TcpBus
+    for these.
+
+    Transactions from different threads are not serialized. The connection
+    gets established with the first transaction and is served by a reader
+    thread dispatching the responses. Transactions waiting for a response
+    fail when the connection breaks and the next transaction establishes a
+    new one.
+
+    Attributes:
+
+        name
+            Host and port of the gateway.
+
+        device_type
+            The pySunSpec device type of this bus.
+
+        window
+            The maximum number of outstanding requests.
+    """
+    device_type = sclient.TCP
+
+
+    def __init__(self, host, port=smodbus.TCP_DEFAULT_PORT,
+            timeout=BSM_DEFAULT_TIMEOUT, window=BSM_DEFAULT_PIPELINE_WINDOW):
+        if window < 1:
+            raise ValueError('Window must allow at least one request.')
+
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.window = window
+        self.name = '{}:{}'.format(host, port)
+
+        self._connection = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(window)
+        self._transaction_id = 0
+
+
+    def _abandon(self, transaction):
+        """
+        Gives up waiting for the response to a transaction from _submit and
+        frees its slot in the window. A late response gets dropped.
+        """
+        (transaction_id, connection, future) = transaction
+
+        with self._lock:
+            if connection.pending.pop(transaction_id, None) is not None:
+                connection.abandoned.add(transaction_id)
+                future.set_exception(smodbus.ModbusClientTimeout('Response timeout'))
+
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port),
+            timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # The reader thread blocks until a response or the end of the
+        # connection arrives. Timeouts are handled per transaction.
+        sock.settimeout(None)
+
+        connection = _PipelinedConnection(sock)
+        connection.reader = threading.Thread(target=self._read_responses,
+            args=(connection,), name='bsm-pipeline-{}'.format(self.name),
+            daemon=True)
+        connection.reader.start()
+
+        return connection
+
+
+    def _fail(self, connection, error):
+        """
+        Closes the given connection and fails all of its pending
+        transactions.
+        """
+        with self._lock:
+            if connection.error is None:
+                connection.error = error
+            if self._connection is connection:
+                self._connection = None
+            pending = list(connection.pending.values())
+            connection.pending.clear()
+
+        try:
+            connection.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        connection.socket.close()
+
+        for (_, future) in pending:
+            future.set_exception(smodbus.ModbusClientError(
+                'Connection lost: {}'.format(connection.error)))
+
+
+    def _next_transaction_id(self, connection):
+        # Skip IDs still in use for not mixing up their responses.
+        while True:
+            self._transaction_id = (self._transaction_id + 1) & 0xffff
+            if self._transaction_id not in connection.pending \
+                    and self._transaction_id not in connection.abandoned:
+                return self._transaction_id
+
+
+    def _read_responses(self, connection):
+        try:
+            while True:
+                header = self._recv_exactly(connection.socket, modbus.TCP_HEADER_LEN)
+                (transaction_id, unit_id, length) = modbus.tcp_header(header)
+                pdu = self._recv_exactly(connection.socket, length)
+
+                with self._lock:
+                    entry = connection.pending.pop(transaction_id, None)
+                    if entry is None:
+                        if transaction_id in connection.abandoned:
+                            connection.abandoned.discard(transaction_id)
+                            continue
+                        raise smodbus.ModbusClientError('Modbus response to unexpected request')
+
+                (slave_id, future) = entry
+                if unit_id != slave_id:
+                    future.set_exception(smodbus.ModbusClientError(
+                        'Modbus response from unexpected unit {}'.format(unit_id)))
+                else:
+                    future.set_result(pdu)
+        except (OSError, smodbus.ModbusClientError) as e:
+            self._fail(connection, e)
+
+
+    def _recv_exactly(self, sock, count):
+        data = b''
+
+        while len(data) < count:
+            chunk = sock.recv(count - len(data))
+            if not chunk:
+                raise smodbus.ModbusClientError('Connection closed by gateway')
+            data += chunk
+
+        return data
+
+
+    def _submit(self, slave_id, addr, pdu, trace_func, deadline):
+        """
+        Sends a request and returns the transaction ID along with the
+        connection and a Future for the response PDU.
+        """
+        if not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+            raise smodbus.ModbusClientTimeout('Response timeout')
+
+        future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            with self._lock:
+                if self._connection is None:
+                    self._connection = self._connect()
+                connection = self._connection
+
+                transaction_id = self._next_transaction_id(connection)
+                connection.pending[transaction_id] = (slave_id, future)
+        except OSError as e:
+            future.set_exception(smodbus.ModbusClientError('Socket error: {}'.format(e)))
+            raise smodbus.ModbusClientError('Socket error: {}'.format(e))
+
+        request = modbus.tcp_frame(transaction_id, slave_id, pdu)
+        self._trace(trace_func, slave_id, addr, '->', request)
+        try:
+            with self._send_lock:
+                connection.socket.sendall(request)
+        except OSError as e:
+            self._fail(connection, e)
+            raise smodbus.ModbusClientError('Socket error: {}'.format(e))
+
+        return (transaction_id, connection, future)
+
+
+    def _trace(self, trace_func, slave_id, addr, direction, frame):
+        if trace_func:
+            trace_func('{}:{}[addr={}] {}{}'.format(self.name, slave_id, addr,
+                direction, binascii.hexlify(frame).decode().upper()))
+
+
+    def _wait(self, slave_id, addr, transaction, trace_func, deadline):
+        """
+        Waits for the response to a transaction from _submit and returns its
+        PDU.
+        """
+        (transaction_id, _, future) = transaction
+
+        try:
+            pdu = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            self._abandon(transaction)
+            # The response might have arrived in the meantime.
+            pdu = future.result()
+
+        self._trace(trace_func, slave_id, addr, '<--',
+            modbus.tcp_frame(transaction_id, slave_id, pdu))
+        return pdu
+
+
+    def close(self):
+        """
+        Closes the connection to the gateway. Pending transactions fail.
+        """
+        with self._lock:
+            connection = self._connection
+
+        if connection is not None:
+            self._fail(connection, 'closed')
+            connection.reader.join()
+
+
+    def read(self, slave_id, addr, count, op=smodbus.FUNC_READ_HOLDING,
+            trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Reads count registers starting at addr from unit slave_id. Requests
+        for the chunks of max_count registers get sent at once.
+        """
+        return b''.join(self.read_multiple(slave_id, [(addr, count)], op=op,
+            trace_func=trace_func, max_count=max_count))
+
+
+    def read_multiple(self, slave_id, requests, op=smodbus.FUNC_READ_HOLDING,
+            trace_func=None, max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Reads the register ranges given as list of (address, count) tuples
+        from unit slave_id and returns a list of their data. All requests get
+        sent without waiting for the previous responses as long as the window
+        allows.
+        """
+        chunks = []
+        for (index, (addr, count)) in enumerate(requests):
+            for chunk in readplan.plan_reads([(addr, count)], max_count):
+                chunks.append((index, chunk))
+
+        # Keep sending requests ahead while collecting the responses in
+        # order. Each transaction has timeout seconds from being sent.
+        transactions = collections.deque()
+        data = [b''] * len(requests)
+        sent = 0
+
+        try:
+            for (index, (addr, count)) in chunks:
+                while sent < len(chunks) and len(transactions) < self.window:
+                    (_, (send_addr, send_count)) = chunks[sent]
+                    deadline = time.monotonic() + self.timeout
+                    transactions.append((deadline, self._submit(slave_id, send_addr,
+                        modbus.read_request(send_addr, send_count, op=op),
+                        trace_func, deadline)))
+                    sent += 1
+
+                (deadline, transaction) = transactions[0]
+                pdu = self._wait(slave_id, addr, transaction, trace_func, deadline)
+                transactions.popleft()
+                data[index] += modbus.read_response_data(pdu, count, op=op)
+        except BaseException:
+            # Don't keep the window occupied by the requests sent so far.
+            for (_, transaction) in transactions:
+                self._abandon(transaction)
+            raise
+
+        return data
+
+
+    def write(self, slave_id, addr, data, trace_func=None,
+            max_count=smodbus.REQ_COUNT_MAX):
+        """
+        Writes data to the registers starting at addr of unit slave_id. The
+        chunks get written one after another for preserving their order.
+        """
+        for offset in range(0, len(data) // 2, max_count):
+            chunk = data[2 * offset:2 * (offset + max_count)]
+            deadline = time.monotonic() + self.timeout
+            transaction = self._submit(slave_id, addr + offset,
+                modbus.write_request(addr + offset, chunk), trace_func, deadline)
+            pdu = self._wait(slave_id, addr + offset, transaction, trace_func, deadline)
+            modbus.write_response_check(pdu, addr + offset, len(chunk) // 2)
@@ -6,15 +6,24 @@
 
 
 from . import config
+from . import identitystore
 from . import md
+from . import modelcache
+from . import readplan
+from . import records
+from . import registercache
 from . import util as butil
-from ..crypto import util as cutil
 from ..sunspec.core import client as sclient
 from ..sunspec.core import suns
 from ..sunspec.core.modbus import client as smodbus
 from collections import namedtuple
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
 from aenum import IntEnum
+import hashlib
+import json
 import sys
+import time
 
 PY2 = sys.version_info[0] == 2
 PY3 = sys.version_info[0] == 3
@@ -27,11 +36,37 @@ BSM_DEFAULT_PARITY = sclient.PARITY_EVEN
 BSM_DEFAULT_SLAVE_ID = 42
 BSM_DEFAULT_TIMEOUT = 10
 
+# Maximum number of registers in between model instances or data points to
+# read along for saving a separate request. At 19200 baud, one register takes
+# about one millisecond on the wire while a request takes tens of them.
+BSM_DEFAULT_READ_PLAN_MAX_GAP = 32
+
+# Polling the snapshot status while the meter is creating a snapshot. The
+# interval between polls grows by the backoff factor up to its maximum.
+BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL = 0.1
+BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF = 1.5
+BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL = 1.0
+BSM_DEFAULT_SNAPSHOT_TIMEOUT = 30
+
 SUNSPEC_ID_REGS = 2
 SUNSPEC_HEADER_REGS = 2
 
 
 _BSM_BASE_OFFSET = 40000
+_BSM_MODEL_ID = 64900
+# Models updated by the meter when creating a snapshot.
+_SNAPSHOT_MODEL_IDS = [64901, 64903]
+
+# Data points of the BSM model instance identifying the meter and its
+# firmware. The fingerprint covers the public key and the communication
+# module firmware hash as well. See identitystore.py.
+_IDENTITY_FINGERPRINT_POINT_IDS = [
+        config.BSM_SERIAL_NUMBER_METER_DATA_POINT_ID,
+        config.BSM_SERIAL_NUMBER_COMMUNICATION_MODULE_DATA_POINT_ID,
+        config.BSM_SOFTWARE_VERSION_METER_DATA_POINT_ID,
+        config.BSM_SOFTWARE_VERSION_COMMUNICATION_MODULE_DATA_POINT_ID,
+        config.BSM_METER_ADDRESS_1_DATA_POINT_ID,
+    ]
 _BSM_MODEL_INSTANCES = [
         _BsmModelInstanceInfo(1,        'Common',                               False,  ['common', 'cb']),
         _BsmModelInstanceInfo(10,       'Serial Interface Header',              False,  ['serial_interface_header', 'sih']),
@@ -66,6 +101,11 @@ def _blob_point_value(point):
     return point.point_type.to_data(value_base, 2 * point.point_type.len)
 
 
+def _identity_fingerprint(points, data):
+    return json.dumps([x.value_base for x in points]
+        + [hashlib.sha256(data).hexdigest()])
+
+
 class _BlobProxy:
     """
     Proxy for exposing BLOB data from a SunSpecClientDevice convenience
@@ -89,6 +129,75 @@ class _BlobProxy:
         return blob
 
 
+class _LazyModelDict(Mapping):
+    """
+    Read-only dictionary mapping aliases to model instances of a
+    BsmClientDevice. Model instances get created on first access.
+    """
+    def __init__(self, device):
+        self.device = device
+        self.indices = {}
+
+
+    def __getitem__(self, key):
+        return self.device._model_instance(self.indices[key])
+
+
+    def __iter__(self):
+        return iter(self.indices)
+
+
+    def __len__(self):
+        return len(self.indices)
+
+
+    def index_for(self, key):
+        """
+        Returns the model instance index for the given alias without creating
+        the model instance.
+        """
+        return self.indices[key]
+
+
+    def register(self, key, index):
+        self.indices[key] = index
+
+
+class _LazyModelList(Sequence):
+    """
+    Read-only list of the model instances of a BsmClientDevice. Model
+    instances get created on first access.
+    """
+    def __init__(self, device):
+        self.device = device
+
+
+    def __contains__(self, model):
+        return any(map(lambda x: x is model, self.device._models))
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        else:
+            if index < 0:
+                index += len(self)
+            if index < 0 or index >= len(self):
+                raise IndexError('Model instance index out of range.')
+            return self.device._model_instance(index)
+
+
+    def __len__(self):
+        return len(self.device._models)
+
+
+    def index(self, model, *args):
+        for index, current in enumerate(self.device._models):
+            if current is model:
+                return index
+        raise ValueError('Model instance is not in list.')
+
+
 # TODO: What about initializing the value from the actual model symbols?
 class SnapshotType(IntEnum):
     CURRENT = 0
@@ -96,6 +205,13 @@ class SnapshotType(IntEnum):
     TURN_OFF = 2
 
 
+class SnapshotTimeoutError(sclient.SunSpecClientError):
+    """
+    Raised when a snapshot did not become ready within the given time.
+    """
+    pass
+
+
 # TODO: What about initializing the value from the actual model symbols?
 class SnapshotStatus(IntEnum):
     VALID = 0
@@ -108,12 +224,43 @@ class SnapshotStatus(IntEnum):
 
 class BsmClientDevice(sclient.ClientDevice):
     """
+    Model instances are created on their first access through models_list,
+    model_aliases, snapshot_aliases, or one of the lookup methods. Creating a
+    client is cheap this way and commands only pay for the model instances
+    they actually use.
+
+    Several clients for meters on the same serial line or behind the same TCP
+    gateway could share a single SerialBus, TcpBus, or RtuOverTcpBus (see
+    bus.py) passed as bus. The connection parameters and timeout of the bus
+    apply then.
+
+    Passing an AdaptiveLink (see link.py) as link adapts the request size to
+    the error rate of the link and retries failed reads.
+
+    Passing a RegisterCache (see registercache.py) as cache serves reads of
+    identification data and the public key from memory after their first
+    read.
+
+    Passing an IdentityStore (see identitystore.py) as identity_store keeps
+    the identity of the meter on disk. Getting the public key, verifying
+    snapshots, and generating billing data take it from there as long as it
+    matches the meter.
+
     Attributes:
 
         aliases_list
             All aliases for the model instnace from models_list at the
             corresponding index.
 
+        cache
+            The RegisterCache used by this client, if any.
+
+        identity_store
+            The IdentityStore used by this client, if any.
+
+        link
+            The AdaptiveLink used by this client, if any.
+
         model_aliases
             Dictionary mapping model instance aliases to the instances from
             models_list. This includes BSM snapshots.
@@ -126,16 +273,118 @@ class BsmClientDevice(sclient.ClientDevice):
             name=None, pathlist=None, baudrate=BSM_DEFAULT_BAUDRATE,
             parity=BSM_DEFAULT_PARITY, ipaddr=None,
             ipport=None, timeout=BSM_DEFAULT_TIMEOUT, trace=False,
-            max_count=smodbus.REQ_COUNT_MAX):
-        super(BsmClientDevice, self).__init__(device_type, slave_id=slave_id, name=name,
-            pathlist=pathlist, baudrate=baudrate, parity=parity,
-            ipaddr=ipaddr, ipport=ipport, timeout=timeout, trace=trace,
-            max_count=max_count)
+            max_count=smodbus.REQ_COUNT_MAX, bus=None, link=None, cache=None,
+            identity_store=None):
+        if bus is not None:
+            # Use the Modbus device provided by the bus instead of letting
+            # pySunSpec open a serial port or TCP connection.
+            super(BsmClientDevice, self).__init__(None, slave_id=slave_id,
+                name=bus.name, pathlist=pathlist)
+            self.type = bus.device_type
+            self.modbus_device = bus.device(slave_id, trace_func=trace or None,
+                max_count=max_count)
+        else:
+            super(BsmClientDevice, self).__init__(device_type, slave_id=slave_id, name=name,
+                pathlist=pathlist, baudrate=baudrate, parity=parity,
+                ipaddr=ipaddr, ipport=ipport, timeout=timeout, trace=trace,
+                max_count=max_count)
+        if link is not None and self.modbus_device is not None:
+            self.modbus_device = link.device(self.modbus_device)
+        self.max_count = max_count
+        self.link = link
+        self.cache = cache
+        self.identity_store = identity_store
         self.aliases_list = []
-        self.model_aliases = {}
-        self.snapshot_aliases = {}
+        self.models_list = _LazyModelList(self)
+        self.model_aliases = _LazyModelDict(self)
+        self.snapshot_aliases = _LazyModelDict(self)
+
+        self._models = []
+        self._model_addresses = []
+        self._model_types = []
+        self._prefetched = None
 
         self._init_bsm_models()
+        if cache is not None:
+            self._init_cache_regions()
+
+
+    def _blob_bytes_point(self, model):
+        """
+        Returns the data point giving the explicit BLOB data length (in bytes)
+        of the given model or None, if there is none.
+        """
+        result = None
+        blob_id = self.repeating_blocks_blob_id(model)
+
+        if blob_id is not None:
+            bytes_point = model.blocks[0].points.get('B' + blob_id, None)
+
+            if bytes_point:
+                bytes_type = bytes_point.point_type
+
+                if bytes_type.type == suns.SUNS_TYPE_UINT16 \
+                    and bytes_type.units is None \
+                    and bytes_type.sf is None:
+                    result = bytes_point
+
+        return result
+
+
+    def _compact_requests(self, model, image):
+        """
+        Generates the read requests for the data of the given model required
+        for its BLOB or trailing string data (see read_points_compact).
+
+        Subsequent requests depend on the data read so far. The caller needs
+        to add the data for each request to image before continuing. This
+        allows sharing the read logic between blocking and asynchronous
+        clients.
+        """
+        model_end = model.addr + model.len
+        bytes_point = self._blob_bytes_point(model)
+        string_point = self._trailing_string_point(model)
+
+        def filled_requests(addr, count):
+            requests = readplan.plan_reads([(addr, count)], self.max_count)
+            # The last request could carry some more registers at no extra
+            # cost. Fill it up for getting the start of the BLOB or string
+            # data along.
+            (last_addr, last_count) = requests[-1]
+            requests[-1] = (last_addr, min(self.max_count, model_end - last_addr))
+            return requests
+
+        if bytes_point is not None:
+            # Phase one reads the fixed block with the explicit BLOB length.
+            # Phase two reads the remaining BLOB data, if any.
+            fixed = model.blocks[0]
+            for request in filled_requests(fixed.addr, fixed.len):
+                yield request
+            read_end = request[0] + request[1]
+            self._read_point_data(bytes_point, image.get(int(bytes_point.addr), 1))
+
+            blob_end = model_end
+            if bytes_point.value is not None:
+                blob_end = min(model_end, model.blocks[1].addr + (bytes_point.value + 1) // 2)
+            if read_end < blob_end:
+                for request in filled_requests(read_end, blob_end - read_end):
+                    yield request
+        elif string_point is not None:
+            # Phase one reads up to the start of the string data. Subsequent
+            # phases continue until the NUL padding has been reached.
+            string_addr = int(string_point.addr)
+            read_end = model.addr
+            count = max(1, string_addr - model.addr)
+            while read_end < model_end:
+                for request in filled_requests(read_end, count):
+                    yield request
+                read_end = request[0] + request[1]
+                count = 1
+                if b'\0' in image.get(string_addr, read_end - string_addr):
+                    break
+        else:
+            for request in readplan.plan_reads([(model.addr, model.len)], self.max_count):
+                yield request
 
 
     def _fixup_curve_name(self, name):
@@ -149,33 +398,311 @@ class BsmClientDevice(sclient.ClientDevice):
         return name
 
 
+    def _identity_data_range(self):
+        """
+        Returns the register range from the public key part of the BSM model
+        instance up to the end of the communication module firmware hash
+        model instance following it as (address, count) tuple.
+        """
+        (addr, _) = self._public_key_range()
+        index = self.model_aliases.index_for(config.CM_FIRMWARE_HASH_INSTANCE_ALIAS)
+        end = self._model_addresses[index] + self._model_types[index].len
+
+        return (addr, end - addr)
+
+
+    def _identity_from_models(self, fingerprint=None, firmware_hash=None):
+        """
+        Returns the MeterIdentity made up from the data read for the common
+        and BSM model instances along with the given fingerprint and
+        firmware hash.
+        """
+        common = self.model_aliases[config.COMMON_INSTANCE_ALIAS]
+        bsm = self.model_aliases[config.BSM_INSTANCE_ALIAS]
+
+        return identitystore.MeterIdentity(
+            serial_number=bsm.points[config.BSM_SERIAL_NUMBER_METER_DATA_POINT_ID].value,
+            fingerprint=fingerprint,
+            public_key=self.get_public_key(read_data=False),
+            meter_version=bsm.points[config.BSM_SOFTWARE_VERSION_METER_DATA_POINT_ID].value,
+            communication_module_version=bsm.points[config.BSM_SOFTWARE_VERSION_COMMUNICATION_MODULE_DATA_POINT_ID].value,
+            meter_address=bsm.points[config.BSM_METER_ADDRESS_1_DATA_POINT_ID].value,
+            manufacturer=common.points[config.COMMON_MANUFACTURER_DATA_POINT_ID].value,
+            model=common.points[config.COMMON_MODEL_DATA_POINT_ID].value,
+            firmware_hash=firmware_hash)
+
+
     def _init_bsm_models(self):
         """
-        Initializes BSM models for the known layout for this device. This saves
-        the time for scanning the device.
+        Initializes the model instance layout known for this device. This saves
+        the time for scanning the device. The actual model instances get
+        created on demand by _model_instance.
         """
         address = _BSM_BASE_OFFSET + SUNSPEC_ID_REGS + SUNSPEC_HEADER_REGS
 
-        for info in _BSM_MODEL_INSTANCES:
-            model = sclient.ClientModel(self, info.id, addr=address, mlen=0)
-            model.load()
+        for index, info in enumerate(_BSM_MODEL_INSTANCES):
+            # Get the model type from the cache. This avoids parsing SMDX data
+            # again and again.
+            model_type = modelcache.model_type_get(info.id)
 
-            self.add_model(model)
+            self._models.append(None)
+            self._model_addresses.append(address)
+            self._model_types.append(model_type)
             self.aliases_list.append(info.aliases)
 
             # Provide model instances as well by name. The BSM snapshots use
             # all the same model and a name comes in quite handy for referring
             # to them.
-            self._register_aliases(self.model_aliases, info.aliases, model)
+            self._register_aliases(self.model_aliases, info.aliases, index)
             if info.is_snapshot:
-                self._register_aliases(self.snapshot_aliases, info.aliases, model)
+                self._register_aliases(self.snapshot_aliases, info.aliases, index)
+
+            address += model_type.len + SUNSPEC_HEADER_REGS
+
+
+    def _init_cache_regions(self):
+        """
+        Assigns the register ranges of the model instances to their cache
+        classes.
+        """
+        for index, info in enumerate(_BSM_MODEL_INSTANCES):
+            self.cache.add_region(info.aliases, self._model_addresses[index],
+                self._model_types[index].len)
 
-            address += model.len + SUNSPEC_HEADER_REGS
+        (addr, count) = self._public_key_range()
+        self.cache.add_region([registercache.BSM_PUBLIC_KEY_CACHE_CLASS], addr, count)
 
 
-    def _register_aliases(self, dictionary, aliases, model):
+    def _model_instance(self, index):
+        """
+        Returns the model instance at the given index from the layout and
+        creates it on first access.
+        """
+        model = self._models[index]
+
+        if model is None:
+            info = _BSM_MODEL_INSTANCES[index]
+            model = sclient.ClientModel(self, info.id,
+                addr=self._model_addresses[index], mlen=0)
+            model.load()
+            self._models[index] = model
+
+            # Keep pySunSpec's dictionary of model instances by ID up to date
+            # and in the order of the layout.
+            self.models[model.id] = list(filter(
+                lambda x: x is not None and x.id == model.id, self._models))
+
+        return model
+
+
+    def _models_requests(self, models, max_gap):
+        """
+        Returns the read requests for the given model instances. Model
+        instances held by the cache get read from there.
+        """
+        if self.cache is not None:
+            models = filter(lambda x: not self.cache.covers(x.addr, x.len), models)
+        ranges = map(lambda x: (x.addr, x.len), models)
+        return readplan.plan_reads(ranges, self.max_count, max_gap=max_gap)
+
+
+    def _points_requests(self, points, max_gap):
+        """
+        Returns the read requests for the given data points and the scale
+        factors they reference.
+        """
+        sf_points = [x.sf_point for x in points if x.sf_point is not None]
+        ranges = map(lambda x: (int(x.addr), int(x.point_type.len)), sf_points + points)
+        return readplan.plan_reads(ranges, self.max_count, max_gap=max_gap)
+
+
+    @contextmanager
+    def _prefetched_data(self, image):
+        """
+        Serves reads covered by the given RegisterImage from it while active.
+        """
+        previous = self._prefetched
+        self._prefetched = image
+        try:
+            yield image
+        finally:
+            self._prefetched = previous
+
+
+    def _public_key_range(self):
+        """
+        Returns the register range of the public key part of the BSM model
+        instance as (address, count) tuple.
+        """
+        index = self.model_aliases.index_for(config.BSM_INSTANCE_ALIAS)
+        model_type = self._model_types[index]
+        regs_point = model_type.fixed_block.points[config.BSM_PUBLIC_KEY_REGS_DATA_POINT_ID]
+
+        return (self._model_addresses[index] + regs_point.offset,
+            model_type.len - regs_point.offset)
+
+
+    def _read_image(self, requests):
+        """
+        Reads the data for the given list of independent requests into a new
+        RegisterImage. Modbus devices supporting read_multiple (like the ones
+        from a PipelinedTcpBus) get passed all requests at once.
+        """
+        read_multiple = getattr(self.modbus_device, 'read_multiple', None)
+        if read_multiple is None or len(requests) < 2:
+            return self._read_image_requests(lambda image: requests)
+
+        image = readplan.RegisterImage()
+        if self.cache is not None:
+            uncached = []
+            for (addr, count) in requests:
+                data = self.cache.get(addr, count)
+                if data is None:
+                    uncached.append((addr, count))
+                else:
+                    image.add(addr, data)
+            requests = uncached
+
+        try:
+            data = read_multiple(requests) if requests else []
+        except smodbus.ModbusClientError as e:
+            raise sclient.SunSpecClientError('Modbus read error: {}'.format(e))
+
+        for ((addr, _), chunk) in zip(requests, data):
+            image.add(addr, chunk)
+            if self.cache is not None:
+                self.cache.add(addr, chunk)
+
+        return image
+
+
+    def _read_image_requests(self, requests):
+        """
+        Reads the data for the requests returned by requests into a new
+        RegisterImage. The callable gets passed this image for the request
+        generators depending on the data read so far.
+        """
+        image = readplan.RegisterImage()
+
+        for (addr, count) in requests(image):
+            image.add(addr, self.read(addr, count))
+
+        return image
+
+
+    def _read_model_from_image(self, model, image):
+        """
+        Updates all data points of the given model from image. Registers not
+        contained in image are treated as being zero.
+        """
+        data = bytearray(2 * model.len)
+        for (addr, segment) in image.segments:
+            offset = 2 * (addr - model.addr)
+            data[offset:offset + len(segment)] = segment
+        data = bytes(data)
+
+        # Scale factors need to be read first for being applied to the
+        # values.
+        for block in model.blocks:
+            for point in block.points_sf.values():
+                offset = 2 * (int(point.addr) - model.addr)
+                self._read_point_data(point, data[offset:offset + 2 * int(point.point_type.len)])
+        for block in model.blocks:
+            for point in block.points.values():
+                offset = 2 * (int(point.addr) - model.addr)
+                self._read_point_data(point, data[offset:offset + 2 * int(point.point_type.len)])
+
+
+    def _read_models_from_image(self, models, image):
+        """
+        Updates the data points of the given models from image with
+        pySunSpec's ClientModel.read_points.
+        """
+        with self._prefetched_data(image):
+            for model in models:
+                model.read_points()
+
+
+    def _read_point_data(self, point, data):
+        """
+        Updates the given data point from its register data the same way as
+        pySunSpec's ClientModel.read_points does.
+        """
+        point_type = point.point_type
+        value = point_type.data_to(data)
+
+        if PY3 and isinstance(value, bytes):
+            value = str(value, 'latin-1')
+
+        if point_type.is_impl(value):
+            point.value_base = value
+            if point.sf_point is not None:
+                point.value_sf = point.sf_point.value_base
+        else:
+            point.value_base = None
+            point.value_sf = None
+
+
+    def _read_points_from_image(self, points, image):
+        """
+        Updates the given data points and the scale factors they reference
+        from image.
+        """
+        # Scale factors need to be read first for being applied to the values.
+        sf_points = [x.sf_point for x in points if x.sf_point is not None]
+
+        for point in sf_points + points:
+            data = image.get(int(point.addr), int(point.point_type.len))
+            self._read_point_data(point, data)
+
+
+    def _register_aliases(self, dictionary, aliases, index):
         for alias in aliases:
-            dictionary[alias] = model
+            dictionary.register(alias, index)
+
+
+    def _resolve_models(self, models):
+        """
+        Returns the model instances for a list of model instances or aliases.
+        """
+        return list(map(lambda x: self.model_aliases[x] if isinstance(x, str) else x, models))
+
+
+    def _resolve_points(self, model, point_ids):
+        """
+        Returns the data points of the given model for a list of data points
+        or their IDs (looked up case-insensitively).
+        """
+        points = []
+
+        for point_id in point_ids:
+            point = point_id
+            if isinstance(point_id, str):
+                point = self.lookup_point_in_model(model, point_id)
+            if point is None:
+                raise ValueError('Unknown data point \'{}\' in model {}.'.format(
+                    point_id, model.model_type.id))
+            points.append(point)
+
+        return points
+
+
+    def _trailing_string_point(self, model):
+        """
+        Returns the string data point at the end of the given model (like
+        the OCMF data) or None, if there is none.
+        """
+        result = None
+
+        if len(model.blocks) == 1:
+            points = model.blocks[0].points_list
+            last = max(points, key=lambda x: int(x.addr), default=None)
+
+            if last is not None and last.point_type.type == suns.SUNS_TYPE_STRING \
+                and int(last.addr) + int(last.point_type.len) == model.addr + model.len:
+                result = last
+
+        return result
 
 
     def create_snapshot(self, alias):
@@ -185,32 +712,81 @@ class BsmClientDevice(sclient.ClientDevice):
         status.value = SnapshotStatus.UPDATING
         status.write()
 
+        if self.cache is not None:
+            # The meter updates the snapshots, their OCMF counterparts, and
+            # the counters of the BSM model instance along with this one. The
+            # public key stays the same.
+            for index, info in enumerate(_BSM_MODEL_INSTANCES):
+                addr = self._model_addresses[index]
+                if info.id == _BSM_MODEL_ID:
+                    self.cache.invalidate(addr, self._public_key_range()[0] - addr)
+                elif info.id in _SNAPSHOT_MODEL_IDS:
+                    self.cache.invalidate(addr, self._model_types[index].len)
+
 
     def get_public_key(self, read_data=True, output_format='der'):
+        # Importing the ecdsa package takes a while. Defer it until it is
+        # actually needed.
+        from ..crypto import util as cutil
+
         bsm = self.model_aliases[config.BSM_INSTANCE_ALIAS]
+        public_key = None
         result = None
 
-        if read_data:
-            bsm.read_points()
+        if read_data and self.identity_store is not None:
+            public_key = self.meter_identity().public_key
+        else:
+            if read_data:
+                self.read_points_compact(bsm)
+            if self.has_repeating_blocks_blob_layout(bsm):
+                public_key = self.repeating_blocks_blob(bsm)
 
-        if self.has_repeating_blocks_blob_layout(bsm):
-            public_key = self.repeating_blocks_blob(bsm)
+        if public_key is not None:
             result = cutil.public_key_data_from_blob(public_key, config.BSM_MESSAGE_DIGEST, output_format=output_format)
 
         return result
 
 
-    def get_snapshot(self, alias):
+    def get_snapshot(self, alias, timeout=BSM_DEFAULT_SNAPSHOT_TIMEOUT,
+            poll_interval=BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL,
+            poll_backoff=BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF,
+            poll_max_interval=BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL):
+        """
+        Creates a snapshot for the given alias and reads its data once the
+        meter has finished it.
+
+        While the meter is creating the snapshot, only its status data point
+        gets polled. The interval between polls starts at poll_interval
+        seconds and grows by the factor poll_backoff up to poll_max_interval
+        seconds. The complete snapshot gets read only once its status is
+        valid.
+
+        Returns:
+            The snapshot model or None if creating the snapshot failed.
+
+        Raises:
+            SnapshotTimeoutError: The snapshot did not become ready within
+                timeout seconds.
+        """
         snapshot = self.snapshot_aliases[alias]
         status = snapshot.points[config.SNAPSHOT_STATUS_DATA_POINT_ID]
+        deadline = time.monotonic() + timeout
+        interval = poll_interval
 
         self.create_snapshot(alias)
 
-        snapshot.read_points()
+        self.read_points_subset(snapshot, [status])
         while status.value == SnapshotStatus.UPDATING:
-            snapshot.read_points()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SnapshotTimeoutError('Snapshot \'{}\' not ready within {} s.'.format(alias, timeout))
+
+            time.sleep(min(interval, remaining))
+            interval = min(interval * poll_backoff, poll_max_interval)
+            self.read_points_subset(snapshot, [status])
 
         if status.value == SnapshotStatus.VALID:
+            self.read_points_compact(snapshot)
             return snapshot
         else:
             return None
@@ -242,23 +818,26 @@ class BsmClientDevice(sclient.ClientDevice):
         """
         Case-insensitively looks up a model by the given name or alias.
         """
-        models = filter(lambda x: x.model_type.name.lower() == name.lower(),
-                        self.models_list)
+        # Look up the name from the model types for not creating all model
+        # instances just for comparing their names.
+        indices = filter(lambda x: self._model_types[x].name.lower() == name.lower(),
+                         range(len(self._model_types)))
+        index = next(indices, None)
         model = None
-        if PY2:
-            if len(models) >= 1:
-                model = models[0]
-        if PY3:
-            model = next(models, None)
+        if index is not None:
+            model = self._model_instance(index)
         if not model:
             model = butil.dict_get_case_insensitive(self.model_aliases, name)
         return model
 
 
-    def lookup_model_and_point(self, model_name, point_id):
+    def lookup_model_and_point(self, model_name, point_id, read_data=False):
         """
         Case-insensitively looks up a data point along with its model by the
         given point name and model name or alias.
+
+        If requested, just the data point found and its scale factor get read
+        from the device.
         """
         model = self.lookup_model(model_name)
         point = None
@@ -266,6 +845,9 @@ class BsmClientDevice(sclient.ClientDevice):
         if model:
             point = self.lookup_point_in_model(model, point_id)
 
+        if point and read_data:
+            self.read_points_subset(model, [point])
+
         return (model, point)
 
 
@@ -289,15 +871,148 @@ class BsmClientDevice(sclient.ClientDevice):
         return butil.dict_get_case_insensitive(self.snapshot_aliases, name)
 
 
+    def meter_identity(self, read_data=True):
+        """
+        Returns the identity of the meter as identitystore.MeterIdentity.
+
+        With an identity store, the stored identity gets returned if it
+        matches the fingerprint read from the meter. Otherwise, the common,
+        BSM, and communication module firmware hash model instances get read
+        and the identity made up from them gets stored. Without reading data,
+        the identity is made up from the common and BSM model instances read
+        before and has neither a fingerprint nor a firmware hash.
+        """
+        result = None
+        fingerprint = None
+        firmware_hash = None
+
+        if read_data:
+            common = self.model_aliases[config.COMMON_INSTANCE_ALIAS]
+            bsm = self.model_aliases[config.BSM_INSTANCE_ALIAS]
+            cfwh = self.model_aliases[config.CM_FIRMWARE_HASH_INSTANCE_ALIAS]
+
+            if self.identity_store is not None:
+                points = self.read_points_subset(bsm, _IDENTITY_FINGERPRINT_POINT_IDS)
+                data = self.read(*self._identity_data_range())
+                fingerprint = _identity_fingerprint(points, data)
+                serial_number = bsm.points[config.BSM_SERIAL_NUMBER_METER_DATA_POINT_ID].value
+                if serial_number is not None:
+                    stored = self.identity_store.get(serial_number)
+                    if stored is not None and stored.fingerprint == fingerprint:
+                        result = stored
+
+            if result is None:
+                self.read_models([common, cfwh])
+                self.read_points_compact(bsm)
+                firmware_hash = self.repeating_blocks_blob(cfwh)
+
+        if result is None:
+            result = self._identity_from_models(fingerprint, firmware_hash)
+            if read_data and self.identity_store is not None \
+                and result.serial_number is not None:
+                self.identity_store.put(result)
+
+        return result
+
+
     def model_instance_label(self, model):
         """
         Returns a label for the given model instance.
         """
-        for index, current_model in enumerate(self.models_list):
-            if model == current_model:
+        for index, current_model in enumerate(self._models):
+            if model is current_model:
                 return _BSM_MODEL_INSTANCES[index].label
 
 
+    def read(self, addr, count):
+        """
+        Reads Modbus registers from the device. Data which has already been
+        read by read_models or is held by the cache is served without a new
+        request.
+        """
+        data = None
+
+        if self._prefetched is not None:
+            data = self._prefetched.get(addr, count)
+
+        if data is None and self.cache is not None:
+            data = self.cache.get(addr, count)
+
+        if data is None:
+            data = super(BsmClientDevice, self).read(addr, count)
+            if self.cache is not None:
+                self.cache.add(addr, data)
+
+        return data
+
+
+    def read_models(self, models, max_gap=BSM_DEFAULT_READ_PLAN_MAX_GAP):
+        """
+        Reads the data points of the given model instances (or aliases) with
+        as few Modbus requests as possible.
+
+        The register ranges of all model instances get combined across model
+        boundaries as long as this does not require additional requests and
+        the gaps do not exceed max_gap registers. See readplan.plan_reads for
+        details.
+        """
+        models = self._resolve_models(models)
+        image = self._read_image(self._models_requests(models, max_gap))
+        self._read_models_from_image(models, image)
+
+
+    def read_points_compact(self, model):
+        """
+        Reads all data points of the given model like ClientModel.read_points
+        but skips the unused registers of BLOB or trailing string data.
+
+        Models with an explicit BLOB length (like 'BSig' for 'Sig') get read
+        in two phases: the fixed block containing the length first and then
+        just the registers holding actual BLOB data. Trailing string data
+        (like the OCMF data) gets read until its NUL padding. The skipped
+        registers are treated as being zero.
+        """
+        image = self._read_image_requests(lambda image: self._compact_requests(model, image))
+        self._read_model_from_image(model, image)
+
+
+    def read_points_subset(self, model, point_ids, max_gap=BSM_DEFAULT_READ_PLAN_MAX_GAP):
+        """
+        Reads just the given data points of a model instance from the device
+        along with the scale factors they reference.
+
+        The data points could be given either by their IDs (looked up
+        case-insensitively) or as point objects. Their register ranges get
+        combined as described for read_models. Returns the list of points
+        read.
+        """
+        points = self._resolve_points(model, point_ids)
+        image = self._read_image(self._points_requests(points, max_gap))
+        self._read_points_from_image(points, image)
+
+        return points
+
+
+    def read_record(self, alias):
+        """
+        Reads the data of the model instance with the given alias and returns
+        it as register record (see bauer_bsm.bsm.records).
+
+        This is a lightweight alternative to reading data points through the
+        model instance. The data points of the model instance are not
+        updated.
+        """
+        index = self.model_aliases.index_for(alias)
+        model_type = self._model_types[index]
+        record_class = records.record_class_for_model_id(model_type.id)
+
+        if record_class is None:
+            raise ValueError('No register record for model {}.'.format(model_type.id))
+
+        data = self.read(self._model_addresses[index], model_type.len)
+        return record_class(data)
+
+
     # I did not find a mechanism for conveniently reading BLOB data from
     # repeating blocks in pySunSpec.
     #
@@ -339,18 +1054,10 @@ class BsmClientDevice(sclient.ClientDevice):
         'Bx' when the repeating block data point is named 'x'.
         """
         result = None
-
-        blob_id = self.repeating_blocks_blob_id(model)
-        bytes_id = 'B' + blob_id
-        bytes_point = model.blocks[0].points.get(bytes_id, None)
+        bytes_point = self._blob_bytes_point(model)
 
         if bytes_point:
-            bytes_type = bytes_point.point_type
-
-            if bytes_point and bytes_type.type == suns.SUNS_TYPE_UINT16 \
-                and bytes_type.units is None \
-                and bytes_type.sf is None:
-                result = bytes_point.value
+            result = bytes_point.value
 
         return result
 
@@ -378,16 +1085,18 @@ class BsmClientDevice(sclient.ClientDevice):
         By default both, the BSM model containing the public key and the
         snapshot are read before verification.
         """
+        from ..crypto import util as cutil
+
         result = False
 
-        bsm = self.model_aliases[config.BSM_INSTANCE_ALIAS]
         snapshot = self.snapshot_aliases[alias]
 
         if read_data:
-            bsm.read_points()
-            snapshot.read_points()
+            self.read_points_compact(snapshot)
 
-        public_key_data = self.get_public_key(read_data=False)
+        # Reads the public key from the identity store or the BSM model
+        # instance if requested.
+        public_key_data = self.get_public_key(read_data=read_data)
         public_key = cutil.public_key_from_blob(public_key_data, config.BSM_MESSAGE_DIGEST)
         curve_name = self._fixup_curve_name(public_key.curve.name)
         signature_regs = snapshot.points[config.SNAPSHOT_SIGNATURE_REGS_DATA_POINT_ID].value
@@ -417,7 +1126,7 @@ class BsmClientDevice(sclient.ClientDevice):
             if trace:
                 trace('Snapshot data SHA-256 digest: {}'.format(digest.hex()))
 
-            if cutil.verify_signed_digest(public_key_data, config.BSM_MESSAGE_DIGEST, signature, digest):
+            if cutil.verify_signed_digest(public_key, config.BSM_MESSAGE_DIGEST, signature, digest):
                 if trace:
                     trace('Success.')
                 result = True
@@ -429,6 +1138,18 @@ class BsmClientDevice(sclient.ClientDevice):
         return result
 
 
+    def write(self, addr, data):
+        """
+        Writes Modbus registers to the device and drops the cached data for
+        them.
+        """
+        try:
+            super(BsmClientDevice, self).write(addr, data)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(addr, len(data) // 2)
+
+
 
 
 class SunSpecBsmClientDevice(sclient.SunSpecClientDeviceBase):
@@ -438,61 +1159,91 @@ class SunSpecBsmClientDevice(sclient.SunSpecClientDeviceBase):
 
     In addition to the model attributes from SunSpecClientDeviceBase, it also
     provides attributes for the model instance aliases from BsmClientDevice.
+    Like the model instances of the wrapped device, the attribute models get
+    created on their first access.
     """
     def __init__(self, device_type=sclient.RTU, slave_id=BSM_DEFAULT_SLAVE_ID, name=None,
             pathlist=None, baudrate=BSM_DEFAULT_BAUDRATE,
             parity=BSM_DEFAULT_PARITY, ipaddr=None, ipport=None,
             timeout=BSM_DEFAULT_TIMEOUT, trace=False, scan_progress=None,
-            scan_delay=None, max_count=smodbus.REQ_COUNT_MAX):
+            scan_delay=None, max_count=smodbus.REQ_COUNT_MAX, bus=None,
+            link=None, cache=None, identity_store=None):
         device = BsmClientDevice(device_type, slave_id, name, pathlist,
-            baudrate, parity, ipaddr, ipport, timeout, trace, max_count)
-        super(self.__class__, self).__init__(device)
+            baudrate, parity, ipaddr, ipport, timeout, trace, max_count,
+            bus=bus, link=link, cache=cache, identity_store=identity_store)
+
+        # Don't let SunSpecClientDeviceBase create attribute models for all
+        # model instances upfront. This is done on demand by __getattr__.
+        self.device = device
+        self.models = []
+        self._attribute_models = [None] * len(device.aliases_list)
 
-        # Also provide attributes for model aliases.
-        self._add_alias_attributes()
+        for model_type in device._model_types:
+            if model_type.name not in self.models:
+                self.models.append(model_type.name)
 
         # Also provide convenient access to BLOBs (from models and aliases).
         setattr(self, 'blobs', _BlobProxy(self))
 
 
+    def __getattr__(self, name):
+        """
+        Creates the attribute models for model names and aliases on their
+        first access.
+        """
+        device = self.__dict__.get('device')
+        if device is None or name.startswith('_'):
+            raise AttributeError(name)
+
+        result = None
+
+        if name in device.model_aliases:
+            result = self._get_attribute_model(device.model_aliases.index_for(name))
+        else:
+            indices = [i for i, t in enumerate(device._model_types) if t.name == name]
+
+            if len(indices) == 0:
+                raise AttributeError(name)
+            elif len(indices) == 1:
+                result = self._get_attribute_model(indices[0])
+            else:
+                # Provide a list for multiple instances of the same model like
+                # SunSpecClientDeviceBase. Model instance indices start at 1.
+                result = [None] + [self._get_attribute_model(i) for i in indices]
+
+        setattr(self, name, result)
+        return result
+
+
+    def __getitem__(self, key):
+        return getattr(self, key, None)
+
+
     def _snapshot_alias(self, snapshot):
         alias = None
 
-        for a, m in self.device.snapshot_aliases.items():
-            if m is snapshot.model:
-                alias = a
-                break
+        if snapshot.model in self.device.models_list:
+            index = self.device.models_list.index(snapshot.model)
+            for a in self.device.aliases_list[index]:
+                if a in self.device.snapshot_aliases:
+                    alias = a
+                    break
 
         return alias
 
 
-    def _add_alias_attributes(self):
+    def _get_attribute_model(self, index):
         """
-        Registers the attribute model instances under the aliases given by the
-        client as well.
+        Returns the attribute model for the model instance at the given index
+        and creates it on first access.
         """
-        for index, model in enumerate(self.device.models_list):
-            aliases = self.device.aliases_list[index]
-            if aliases:
-                attribute_model = self._get_attribute_model(model)
-                for alias in aliases:
-                    setattr(self, alias, attribute_model)
+        result = self._attribute_models[index]
 
-
-    def _get_attribute_model(self, model):
-        """
-        "Scrapes" corresponding attribute model instance from this object's
-        attributes. This is done because there is no list of them (by now).
-        """
-        models = getattr(self, model.model_type.name)
-        result = None
-
-        if type(models) is list:
-            # Pick the corresponding attribute model instance from the list in
-            # case of multiple instances of the same model.
-            result = next(filter(lambda x: x is not None and x.model == model, models), None)
-        else:
-            result = models
+        if result is None:
+            model = self.device.models_list[index]
+            model_class = sclient.model_class_get(str(model.id))
+            result = model_class(model, model.model_type.name)
+            self._attribute_models[index] = result
 
         return result
 
@@ -506,11 +1257,15 @@ class SunSpecBsmClientDevice(sclient.SunSpecClientDeviceBase):
         return self.device.get_public_key(output_format=output_format)
 
 
-    def get_snapshot(self, snapshot):
+    def get_snapshot(self, snapshot, **kwargs):
+        """
+        Creates a snapshot and reads its data. See
+        BsmClientDevice.get_snapshot for the optional polling parameters.
+        """
         alias = self._snapshot_alias(snapshot)
         result = None
 
-        if self.device.get_snapshot(alias) is not None:
+        if self.device.get_snapshot(alias, **kwargs) is not None:
             # If the wrapped device returs something we were successful. Return
             # the wrapped snapshot model whose underlying model has been
             # updated.
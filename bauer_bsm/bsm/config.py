@@ -5,7 +5,6 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from ..crypto.curves import SECP256r1
 from hashlib import sha256
 
 
@@ -14,7 +13,6 @@ from hashlib import sha256
 PYSUNSPEC_STRING_ENCODING = 'iso-8859-1'
 
 
-BSM_CURVE = SECP256r1
 BSM_CURVE_NAME = 'secp256r1'
 BSM_CURVE_ALIASES = [BSM_CURVE_NAME, 'secp256v1', 'NIST256p']
 BSM_MESSAGE_DIGEST = sha256
@@ -25,7 +23,12 @@ COMMON_MANUFACTURER_DATA_POINT_ID = 'Mn'
 COMMON_MODEL_DATA_POINT_ID = 'Md'
 
 
+AC_METER_INSTANCE_ALIAS = 'tpm'
+
+
 BSM_INSTANCE_ALIAS = 'sm'
+BSM_SERIAL_NUMBER_METER_DATA_POINT_ID = 'SNM'
+BSM_SERIAL_NUMBER_COMMUNICATION_MODULE_DATA_POINT_ID = 'SNC'
 BSM_SOFTWARE_VERSION_METER_DATA_POINT_ID = 'VrM'
 BSM_SOFTWARE_VERSION_COMMUNICATION_MODULE_DATA_POINT_ID = 'VrC'
 BSM_METER_ADDRESS_1_DATA_POINT_ID = 'MA1'
@@ -33,6 +36,9 @@ BSM_PUBLIC_KEY_BYTES_DATA_POINT_ID = 'BPK'
 BSM_PUBLIC_KEY_REGS_DATA_POINT_ID = 'NPK'
 
 
+CM_FIRMWARE_HASH_INSTANCE_ALIAS = 'cfwh'
+
+
 OCMF_DATA_DATA_POINT_ID = 'O'
 OCMF_STATUS_DATA_POINT_ID = 'St'
 
@@ -49,3 +55,16 @@ SNAPSHOT_TIMEZONE_OFFSET_DATA_POINT_ID = 'TZO'
 SNAPSHOT_META1_DATA_POINT_ID = 'Meta1'
 SNAPSHOT_META2_DATA_POINT_ID = 'Meta2'
 SNAPSHOT_META3_DATA_POINT_ID = 'Meta3'
+
+
+
+
+def __getattr__(name):
+    # Provide the curve on demand for not importing the ecdsa package when
+    # just referring to the configuration. Module-level __getattr__ requires
+    # Python 3.7 or later. Use crypto.curves.SECP256r1 on older versions.
+    if name == 'BSM_CURVE':
+        from ..crypto.curves import SECP256r1
+        return SECP256r1
+
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,441 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from . import config
+from .client import BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF, \
+    BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL, BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL, \
+    BSM_DEFAULT_SNAPSHOT_TIMEOUT, SnapshotStatus, SnapshotTimeoutError
+from aenum import IntEnum
+from concurrent.futures import CancelledError, Future
+import heapq
+import itertools
+import threading
+import time
+
+
+# Scheduling operations for many meters on several buses.
+#
+# Modbus RTU on RS-485 is half-duplex and a Modbus TCP gateway to such a bus
+# is no different. Every bus gets served by a worker thread of its own which
+# runs the operations for the meters on this bus one after another. The
+# workers for different buses run in parallel (pySunSpec releases the GIL
+# while waiting for I/O). Meters on different serial lines behind the same
+# gateway could share a PipelinedTcpBus but get added with different bus
+# names. Their workers keep all lines busy through a single connection then.
+#
+# Within a bus, operations get executed by their priority and in the order
+# they have been submitted. An operation is never interrupted but billing
+# operations get executed before any pending telemetry operation. Getting a
+# snapshot is split into several operations for not blocking the bus while
+# the meter is creating it.
+
+
+class Priority(IntEnum):
+    """
+    Priority classes of fleet operations. Lower values take precedence.
+    """
+    BILLING = 0
+    DEFAULT = 10
+    TELEMETRY = 20
+
+
+
+
+class _Job:
+    __slots__ = ('priority', 'sequence', 'due', 'meter', 'operation',
+        'future', 'interval', 'callback', 'step_of')
+
+
+    def __init__(self, priority, due, meter, operation, future=None,
+            interval=None, callback=None, step_of=None):
+        self.priority = priority
+        self.sequence = None
+        self.due = due
+        self.meter = meter
+        self.operation = operation
+        self.future = future
+        self.interval = interval
+        self.callback = callback
+        self.step_of = step_of
+
+
+
+
+class _BusWorker:
+    """
+    Executes the operations for the meters on a single bus.
+    """
+    def __init__(self, bus):
+        self.bus = bus
+        self.thread = None
+
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        # Jobs ready to run ordered by priority and sequence number and jobs
+        # scheduled for later ordered by their due time.
+        self._ready = []
+        self._scheduled = []
+        # The job currently being executed.
+        self._current = None
+        self._running = False
+        self._stopped = False
+
+
+    def _cancel(self, job):
+        if job.future is not None:
+            job.future.cancel()
+        elif job.step_of is not None and not job.step_of.cancel():
+            # Multi-step operations already running.
+            if not job.step_of.done():
+                job.step_of.set_exception(CancelledError())
+
+
+    def _next_job(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                while self._scheduled and self._scheduled[0][0] <= now:
+                    (_, _, job) = heapq.heappop(self._scheduled)
+                    heapq.heappush(self._ready, (job.priority, job.sequence, job))
+
+                if self._ready:
+                    self._current = heapq.heappop(self._ready)[2]
+                    return self._current
+
+                timeout = None
+                if self._scheduled:
+                    timeout = self._scheduled[0][0] - now
+                self._condition.wait(timeout)
+
+        return None
+
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+
+            if job.future is not None:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.operation(job.meter.client))
+                    except BaseException as e:
+                        job.future.set_exception(e)
+            else:
+                # Periodic jobs report their results and errors to their
+                # callback and get scheduled again. Steps of multi-step
+                # operations take care of their future on their own.
+                result = None
+                error = None
+                try:
+                    result = job.operation(job.meter.client)
+                except Exception as e:
+                    error = e
+
+                if job.callback is not None:
+                    job.callback(job.meter.name, result, error)
+
+            with self._condition:
+                # Decide on rescheduling along with clearing the current job
+                # for not missing a concurrent cancel_periodic.
+                self._current = None
+                if job.future is None and job.interval is not None:
+                    job.due = max(job.due + job.interval, time.monotonic())
+                    self.put(job)
+
+
+    def cancel_periodic(self, meter):
+        with self._condition:
+            jobs = [x[2] for x in self._scheduled + self._ready]
+            if self._current is not None:
+                jobs.append(self._current)
+
+            for job in jobs:
+                if job.meter is meter and job.future is None:
+                    job.interval = None
+            self._scheduled = [x for x in self._scheduled if x[2].interval is not None]
+            heapq.heapify(self._scheduled)
+
+
+    def put(self, job):
+        with self._condition:
+            if self._stopped:
+                # Steps of multi-step operations and periodic jobs getting
+                # scheduled by the operation running while stopping.
+                stopped = True
+            else:
+                stopped = False
+                # Jobs of the same priority get executed in the order they
+                # have been put. This includes periodic jobs getting
+                # rescheduled for not starving other jobs.
+                job.sequence = next(self._sequence)
+                if job.due <= time.monotonic():
+                    heapq.heappush(self._ready, (job.priority, job.sequence, job))
+                else:
+                    heapq.heappush(self._scheduled, (job.due, job.sequence, job))
+                self._condition.notify()
+
+        if stopped:
+            self._cancel(job)
+
+
+    def start(self):
+        if self.thread is not None:
+            # A bus gets served by a single thread.
+            return
+
+        with self._condition:
+            self._running = True
+            self._stopped = False
+        self.thread = threading.Thread(target=self._run,
+            name='bsm-fleet-{}'.format(self.bus), daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._stopped = True
+            pending = self._ready + self._scheduled
+            self._ready = []
+            self._scheduled = []
+            self._condition.notify()
+
+        # Let the current operation complete before cancelling the pending
+        # ones. Jobs it puts get cancelled right away.
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        for (_, _, job) in pending:
+            self._cancel(job)
+
+
+
+
+class FleetMeter:
+    """
+    A meter managed by a FleetPoller.
+
+    Attributes:
+
+        name
+            Name identifying the meter within the fleet.
+
+        bus
+            Name of the bus the meter is connected to, like the serial device
+            or the address of a Modbus TCP gateway.
+
+        client
+            The BsmClientDevice for accessing this meter.
+    """
+    def __init__(self, name, bus, client):
+        self.name = name
+        self.bus = bus
+        self.client = client
+
+
+
+
+class FleetPoller:
+    """
+    Runs operations for many meters spread over several buses with one
+    worker thread per bus and priority scheduling within each bus.
+
+    Operations are callables getting passed the meter's BsmClientDevice.
+    Billing operations (getting and verifying snapshots) take precedence over
+    background telemetry reads. The clients of the meters on the same bus
+    get only accessed from the worker of this bus.
+    """
+    def __init__(self):
+        self.meters = {}
+
+        self._lock = threading.Lock()
+        self._started = False
+        self._workers = {}
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    def _job(self, meter, operation, priority, due=None, **kwargs):
+        if due is None:
+            due = time.monotonic()
+        return _Job(priority, due, meter, operation, **kwargs)
+
+
+    def add_meter(self, name, bus, client):
+        """
+        Adds a meter accessed through the given client (a BsmClientDevice) to
+        the fleet. All meters sharing the same physical bus must be given the
+        same bus name.
+        """
+        with self._lock:
+            if name in self.meters:
+                raise ValueError('Meter \'{}\' already exists.'.format(name))
+
+            self.meters[name] = FleetMeter(name, bus, client)
+
+            worker = self._workers.get(bus)
+            if worker is None:
+                worker = _BusWorker(bus)
+                self._workers[bus] = worker
+                if self._started:
+                    worker.start()
+
+
+    def get_snapshot(self, name, alias, timeout=BSM_DEFAULT_SNAPSHOT_TIMEOUT,
+            poll_interval=BSM_DEFAULT_SNAPSHOT_POLL_INTERVAL,
+            poll_backoff=BSM_DEFAULT_SNAPSHOT_POLL_BACKOFF,
+            poll_max_interval=BSM_DEFAULT_SNAPSHOT_POLL_MAX_INTERVAL):
+        """
+        Submits creating and reading a snapshot as billing operation. Returns
+        a concurrent.futures.Future for the snapshot model or None if
+        creating the snapshot failed.
+
+        This works like BsmClientDevice.get_snapshot but polling the status
+        gets scheduled as separate operations. Other operations on the same
+        bus get executed while the meter is creating the snapshot.
+        """
+        meter = self.meters[name]
+        worker = self._workers[meter.bus]
+        future = Future()
+        state = {'deadline': None, 'interval': poll_interval}
+
+        def step(operation):
+            def run(client):
+                try:
+                    operation(client)
+                except BaseException as e:
+                    future.set_exception(e)
+            return run
+
+        def schedule(operation, due=None):
+            worker.put(self._job(meter, step(operation), Priority.BILLING, due=due,
+                step_of=future))
+
+        def create(client):
+            if future.set_running_or_notify_cancel():
+                client.create_snapshot(alias)
+                state['deadline'] = time.monotonic() + timeout
+                poll(client)
+
+        def poll(client):
+            snapshot = client.snapshot_aliases[alias]
+            status = snapshot.points[config.SNAPSHOT_STATUS_DATA_POINT_ID]
+
+            client.read_points_subset(snapshot, [status])
+            if status.value == SnapshotStatus.UPDATING:
+                now = time.monotonic()
+                if now >= state['deadline']:
+                    raise SnapshotTimeoutError('Snapshot \'{}\' not ready within {} s.'.format(alias, timeout))
+
+                schedule(poll, due=min(now + state['interval'], state['deadline']))
+                state['interval'] = min(state['interval'] * poll_backoff, poll_max_interval)
+            elif status.value == SnapshotStatus.VALID:
+                client.read_points_compact(snapshot)
+                future.set_result(snapshot)
+            else:
+                future.set_result(None)
+
+        schedule(create)
+        return future
+
+
+    def poll(self, name, interval, operation=None, callback=None,
+            priority=Priority.TELEMETRY):
+        """
+        Runs an operation every interval seconds for the given meter. By
+        default, this reads the AC meter model. The callback gets called with
+        the name of the meter, the operation's result, and the exception
+        raised by the operation, if any.
+        """
+        if operation is None:
+            def operation(client):
+                return client.read_models([config.AC_METER_INSTANCE_ALIAS])
+
+        job = self._job(self.meters[name], operation, priority, interval=interval,
+            callback=callback)
+        self._workers[job.meter.bus].put(job)
+
+
+    def read_telemetry(self, name, aliases=None):
+        """
+        Submits reading the given model instances (the AC meter by default)
+        as telemetry operation.
+        """
+        if aliases is None:
+            aliases = [config.AC_METER_INSTANCE_ALIAS]
+
+        return self.submit(name, lambda client: client.read_models(aliases),
+            priority=Priority.TELEMETRY)
+
+
+    def remove_meter(self, name):
+        """
+        Removes a meter from the fleet and stops its periodic operations.
+        Operations already submitted still get executed.
+        """
+        with self._lock:
+            meter = self.meters.pop(name)
+            self._workers[meter.bus].cancel_periodic(meter)
+
+
+    def start(self):
+        """
+        Starts the workers for all buses. Starting a running poller does
+        nothing.
+        """
+        with self._lock:
+            if self._started:
+                return
+
+            self._started = True
+            for worker in self._workers.values():
+                worker.start()
+
+
+    def stop(self):
+        """
+        Stops the workers for all buses after completing their current
+        operation. Pending operations and operations submitted afterwards
+        get cancelled until the workers get started again. Futures of
+        snapshots which are in progress fail with CancelledError.
+        """
+        with self._lock:
+            self._started = False
+            workers = list(self._workers.values())
+
+        for worker in workers:
+            worker.stop()
+
+
+    def submit(self, name, operation, priority=Priority.DEFAULT):
+        """
+        Submits an operation for the given meter. Returns a
+        concurrent.futures.Future for its result.
+        """
+        future = Future()
+        job = self._job(self.meters[name], operation, priority, future=future)
+        self._workers[job.meter.bus].put(job)
+        return future
+
+
+    def verify_snapshot(self, name, alias):
+        """
+        Submits reading and verifying a snapshot as billing operation. See
+        BsmClientDevice.verify_snapshot.
+        """
+        return self.submit(name, lambda client: client.verify_snapshot(alias),
+            priority=Priority.BILLING)
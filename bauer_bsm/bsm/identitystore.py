@@ -0,0 +1,177 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from collections import namedtuple
+from pathlib import Path
+import os
+import threading
+
+
+# Persistent store for the identity of meters.
+#
+# Generating billing data requires the public key, the firmware versions, and
+# the manufacturer and model name of a meter. Reading them takes the 300
+# registers of the BSM model instance and the common model instance every
+# time. This data does not change unless the firmware gets updated or the
+# meter gets provisioned again. An IdentityStore passed as identity_store to
+# BsmClientDevice keeps it on disk in an SQLite database, keyed by the meter's
+# serial number 'SNM'.
+#
+# A stored identity gets validated against a fingerprint before being used.
+# The fingerprint consists of the serial numbers, the firmware versions, and
+# the meter address from the BSM model instance along with a hash of the
+# registers holding the public key and the communication module firmware
+# hash. They get read with two small requests. An identity with a deviating
+# fingerprint gets read from the meter again and replaces the stored one.
+#
+# The store could be shared by several processes. As it just holds data which
+# could be read from the meter at any time, an unusable database gets
+# replaced.
+
+
+MeterIdentity = namedtuple('MeterIdentity',
+    'serial_number, fingerprint, public_key, meter_version, '
+    'communication_module_version, meter_address, manufacturer, model, '
+    'firmware_hash')
+MeterIdentity.__doc__ = \
+    """
+    Identity of a meter. The public key is given in DER format and the
+    firmware hash is the one from the communication module firmware hash
+    model instance. The fingerprint is a string derived from the register
+    data it has been validated against. Both are None for identities which
+    have just been made up from data read before.
+    """
+
+
+IDENTITY_STORE_ENV = 'BSM_IDENTITY_STORE'
+
+# Increment this version when changing the database layout.
+_SCHEMA_VERSION = 1
+# Seconds to wait for other processes accessing the database.
+_TIMEOUT = 10
+
+
+
+
+class IdentityStore:
+    """
+    SQLite database holding MeterIdentity tuples by the serial number of the
+    meter. The store could be shared between threads.
+    """
+    def __init__(self, path=None):
+        # Importing sqlite3 takes a while. Just pay for it when actually
+        # using a store.
+        import sqlite3
+
+        if path is None:
+            path = default_path()
+        path = Path(path)
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(path), timeout=_TIMEOUT,
+            check_same_thread=False)
+
+        try:
+            self._init_schema()
+        except sqlite3.DatabaseError:
+            # Start over with a fresh database.
+            self._connection.close()
+            path.unlink()
+            self._connection = sqlite3.connect(str(path), timeout=_TIMEOUT,
+                check_same_thread=False)
+            self._init_schema()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _init_schema(self):
+        with self._connection as connection:
+            (version,) = connection.execute('PRAGMA user_version').fetchone()
+            if version != _SCHEMA_VERSION:
+                connection.execute('DROP TABLE IF EXISTS meters')
+                connection.execute('PRAGMA user_version = {}'.format(_SCHEMA_VERSION))
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS meters ('
+                'serial_number TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, '
+                'public_key BLOB, meter_version TEXT, '
+                'communication_module_version TEXT, meter_address TEXT, '
+                'manufacturer TEXT, model TEXT, firmware_hash BLOB)')
+
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+    def get(self, serial_number):
+        """
+        Returns the stored identity for the given serial number or None if
+        there is none.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT {} FROM meters WHERE serial_number = ?'.format(
+                    ', '.join(MeterIdentity._fields)),
+                (serial_number,)).fetchone()
+
+        result = None
+        if row is not None:
+            result = MeterIdentity(*row)
+
+        return result
+
+
+    def put(self, identity):
+        """
+        Stores the given identity and replaces the one stored for the same
+        serial number.
+        """
+        with self._lock, self._connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO meters ({}) VALUES ({})'.format(
+                    ', '.join(MeterIdentity._fields),
+                    ', '.join(['?'] * len(MeterIdentity._fields))),
+                tuple(identity))
+
+
+    def remove(self, serial_number):
+        """
+        Removes the identity stored for the given serial number, if any.
+        """
+        with self._lock, self._connection as connection:
+            connection.execute('DELETE FROM meters WHERE serial_number = ?',
+                (serial_number,))
+
+
+
+
+def default_path():
+    """
+    Returns the default location of the store. It could be set by the
+    environment variable BSM_IDENTITY_STORE and is located in
+    $XDG_CACHE_HOME/bauer_bsm or ~/.cache/bauer_bsm otherwise.
+    """
+    path = os.getenv(IDENTITY_STORE_ENV)
+
+    if path:
+        result = Path(path)
+    else:
+        xdg_cache_home = os.getenv('XDG_CACHE_HOME')
+        if xdg_cache_home:
+            result = Path(xdg_cache_home) / 'bauer_bsm' / 'meters.sqlite'
+        else:
+            result = Path.home() / '.cache' / 'bauer_bsm' / 'meters.sqlite'
+
+    return result
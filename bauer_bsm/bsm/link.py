@@ -0,0 +1,262 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from . import readplan
+from ..sunspec.core.modbus import client as smodbus
+import threading
+import time
+
+
+# Adapting the request size and retrying failed requests per link.
+#
+# A long or noisy serial line (or a flaky gateway) shows up as timeouts and
+# CRC errors which become more likely the longer the frames get. Instead of
+# configuring the worst case chunk size for every site, an AdaptiveLink
+# starts with the configured maximum, halves the request size after a failed
+# request, and grows it again step by step after a series of clean requests.
+# Failed requests get retried with exponential backoff.
+#
+# Exceptions reported by the meter itself (like for an illegal address) are
+# not a matter of the link and get raised right away. Writes are not retried
+# as they might have been executed by the meter despite a lost response.
+#
+# Devices reading several ranges at once (like the ones from a
+# PipelinedTcpBus) keep doing so. After a failure of such a batch of
+# requests, its ranges get read one after another with retries.
+
+
+BSM_DEFAULT_LINK_MIN_COUNT = 8
+BSM_DEFAULT_LINK_RETRIES = 3
+BSM_DEFAULT_LINK_BACKOFF = 0.1
+BSM_DEFAULT_LINK_MAX_BACKOFF = 2.0
+# Number of successive clean requests before growing the request size.
+BSM_DEFAULT_LINK_GROW_AFTER = 16
+
+# Weight of the latest request for the moving averages of error rate and
+# latency.
+_AVERAGE_WEIGHT = 0.1
+
+
+
+
+class _AdaptiveDevice:
+    """
+    Modbus device splitting reads into requests of the link's current size
+    and retrying failed ones. It wraps the Modbus device of a
+    BsmClientDevice and provides read_multiple if the wrapped device does.
+    """
+    def __init__(self, link, device):
+        self.link = link
+        self.device = device
+
+        if hasattr(device, 'read_multiple'):
+            self.read_multiple = self._read_multiple
+
+
+    def _read_multiple(self, requests, op=smodbus.FUNC_READ_HOLDING):
+        chunks = []
+        for (index, (addr, count)) in enumerate(requests):
+            for chunk in readplan.plan_reads([(addr, count)], self.link.max_count):
+                chunks.append((index, chunk))
+
+        start = time.monotonic()
+        try:
+            chunks_data = self.device.read_multiple([chunk for (_, chunk) in chunks], op=op)
+        except smodbus.ModbusClientException:
+            raise
+        except smodbus.ModbusClientError:
+            # Start over request by request with retries and the reduced
+            # request size.
+            self.link.record_failure()
+            return [self.read(addr, count, op=op) for (addr, count) in requests]
+
+        self.link.record_success(time.monotonic() - start)
+
+        data = [b''] * len(requests)
+        for ((index, _), chunk_data) in zip(chunks, chunks_data):
+            data[index] += chunk_data
+        return data
+
+
+    def close(self):
+        self.device.close()
+
+
+    def read(self, addr, count, op=smodbus.FUNC_READ_HOLDING):
+        data = b''
+
+        while len(data) < 2 * count:
+            offset = len(data) // 2
+            # Determine the request size for every attempt. Retries use the
+            # size reduced by the failure.
+            data += self.link.call(lambda: self.device.read(addr + offset,
+                min(count - offset, self.link.max_count), op=op))
+
+        return data
+
+
+    def write(self, addr, data):
+        start = time.monotonic()
+        try:
+            result = self.device.write(addr, data)
+        except smodbus.ModbusClientException:
+            raise
+        except smodbus.ModbusClientError:
+            self.link.record_failure()
+            raise
+
+        self.link.record_success(time.monotonic() - start)
+        return result
+
+
+
+
+class AdaptiveLink:
+    """
+    Adaptive request size and retry policy for a link to one or more meters.
+
+    Pass it as link to BsmClientDevice for using it. Clients for meters on
+    the same serial line or behind the same gateway should share a single
+    link as they are suffering from the same conditions.
+
+    Attributes:
+
+        max_count
+            The current maximum amount of registers per request.
+
+        upper_count
+            The maximum amount of registers per request on a clean link.
+
+        min_count
+            The lower bound for max_count.
+
+        retries
+            The number of retries for a failed request.
+
+        requests, failures, retried
+            Counters for requests, failed requests, and retries.
+
+        error_rate
+            Moving average of the failure rate.
+
+        latency
+            Moving average of the time for a successful request in seconds.
+    """
+    def __init__(self, max_count=smodbus.REQ_COUNT_MAX,
+            min_count=BSM_DEFAULT_LINK_MIN_COUNT,
+            retries=BSM_DEFAULT_LINK_RETRIES, backoff=BSM_DEFAULT_LINK_BACKOFF,
+            max_backoff=BSM_DEFAULT_LINK_MAX_BACKOFF,
+            grow_after=BSM_DEFAULT_LINK_GROW_AFTER):
+        self.upper_count = max_count
+        self.min_count = min(min_count, max_count)
+        self.max_count = max_count
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.grow_after = grow_after
+
+        self.requests = 0
+        self.failures = 0
+        self.retried = 0
+        self.error_rate = 0.0
+        self.latency = None
+
+        self._lock = threading.Lock()
+        self._clean = 0
+
+
+    def __repr__(self):
+        return '{}(max_count={}, error_rate={:.3f}, latency={}, requests={}, failures={}, retried={})'.format(
+            type(self).__name__, self.max_count, self.error_rate,
+            'None' if self.latency is None else '{:.3f}'.format(self.latency),
+            self.requests, self.failures, self.retried)
+
+
+    def call(self, request):
+        """
+        Calls request for performing a Modbus request, retries it after link
+        errors, and records the outcome. The last error gets raised if all
+        retries failed.
+        """
+        attempt = 0
+
+        while True:
+            start = time.monotonic()
+            try:
+                result = request()
+            except smodbus.ModbusClientException:
+                raise
+            except smodbus.ModbusClientError:
+                self.record_failure()
+                if attempt >= self.retries:
+                    raise
+
+                time.sleep(min(self.backoff * 2 ** attempt, self.max_backoff))
+                attempt += 1
+                with self._lock:
+                    self.retried += 1
+            else:
+                self.record_success(time.monotonic() - start)
+                return result
+
+
+    def device(self, device):
+        """
+        Returns a Modbus device using this link's policy for accessing the
+        given one.
+        """
+        return _AdaptiveDevice(self, device)
+
+
+    def parameters(self):
+        """
+        Returns a dictionary with the currently chosen parameters and the
+        link statistics.
+        """
+        with self._lock:
+            return {
+                'max_count': self.max_count,
+                'upper_count': self.upper_count,
+                'retries': self.retries,
+                'error_rate': self.error_rate,
+                'latency': self.latency,
+                'requests': self.requests,
+                'failures': self.failures,
+                'retried': self.retried,
+            }
+
+
+    def record_failure(self):
+        """
+        Records a failed request and shrinks the request size.
+        """
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.error_rate += _AVERAGE_WEIGHT * (1.0 - self.error_rate)
+            self._clean = 0
+            self.max_count = max(self.min_count, self.max_count // 2)
+
+
+    def record_success(self, latency):
+        """
+        Records a successful request which took latency seconds and grows the
+        request size after grow_after clean requests in a row.
+        """
+        with self._lock:
+            self.requests += 1
+            self.error_rate -= _AVERAGE_WEIGHT * self.error_rate
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += _AVERAGE_WEIGHT * (latency - self.latency)
+
+            self._clean += 1
+            if self._clean >= self.grow_after and self.max_count < self.upper_count:
+                self._clean = 0
+                self.max_count = min(self.upper_count,
+                    self.max_count + max(1, self.max_count // 4))
@@ -9,7 +9,7 @@ from . import config
 from . import dlms
 from . import format as fmt
 from ..sunspec.core import suns
-from struct import pack
+from struct import pack, Struct
 
 
 _MD_SIGNED_TYPES = \
@@ -29,6 +29,36 @@ _MD_UNSIGNED_TYPES = \
         suns.SUNS_TYPE_UINT32,
     ]
 
+# The data points of a snapshot included in its message digest in the order
+# of their appearance.
+SNAPSHOT_MD_POINT_IDS = \
+    (
+        'Typ',
+        'RCR',
+        'TotWhImp',
+        'W',
+        'MA1',
+        'RCnt',
+        'OS',
+        'Epoch',
+        'TZO',
+        'EpochSetCnt',
+        'EpochSetOS',
+        'DI',
+        'DO',
+        'Meta1',
+        'Meta2',
+        'Meta3',
+        'Evt',
+    )
+SNAPSHOT_MODEL_ID = 64901
+
+_SNAPSHOT_MD_LAYOUT = None
+_SNAPSHOT_MD_SERIALIZER = None
+
+# Number of structs for different string lengths kept by an _MdSerializer.
+_MD_STRUCT_CACHE_SIZE = 64
+
 _MD_UNIMPL_VALUES = \
     {
         suns.SUNS_TYPE_ACC32:           suns.SUNS_UNIMPL_ACC32,
@@ -43,26 +73,198 @@ _MD_UNIMPL_VALUES = \
     }
 
 
+class _MdSerializer:
+    """
+    Serializer for the message digest input of a fixed sequence of data
+    points, compiled from their types, DLMS units, and scale factor sources.
+
+    It produces the same data as update_md_from_point does for the
+    individual points but packs the whole input with a single struct. Only
+    the lengths of the strings vary and the struct for the lengths at hand
+    gets cached.
+    """
+    def __init__(self, layout):
+        formats = ['>']
+        segments = []
+        scale_factors = []
+        unimpl_values = []
+        run = None
+
+        for (index, (type_, dlms_unit, sf)) in enumerate(layout):
+            if type_ in _MD_UNSIGNED_TYPES or type_ in _MD_SIGNED_TYPES:
+                # Value, scaler, and unit of adjacent integer points get
+                # packed from a run of arguments.
+                if run is None:
+                    run = (index, [])
+                    segments.append(run)
+                run[1].extend((None, None, dlms_unit))
+                formats.append('LbB' if type_ in _MD_UNSIGNED_TYPES else 'lbB')
+            elif type_ == suns.SUNS_TYPE_STRING:
+                run = None
+                segments.append((index, None))
+                formats.append('L{}s')
+            else:
+                raise TypeError('Unsupported point type \'{}\'.'.format(type_))
+
+            if sf is not None:
+                scale_factors.append((index, sf))
+            unimpl_values.append(_MD_UNIMPL_VALUES.get(type_))
+
+        self.count = len(unimpl_values)
+        self.scale_factors = tuple(scale_factors)
+
+        self._format = ''.join(formats)
+        self._segments = tuple(map(lambda x: (x[0],
+            None if x[1] is None else x[0] + len(x[1]) // 3,
+            None if x[1] is None else tuple(x[1])), segments))
+        self._structs = {}
+        self._unimpl_values = tuple(unimpl_values)
+
+
+    def _struct(self, lengths):
+        struct = self._structs.get(lengths)
+
+        if struct is None:
+            if len(self._structs) >= _MD_STRUCT_CACHE_SIZE:
+                self._structs.clear()
+            struct = Struct(self._format.format(*lengths))
+            self._structs[lengths] = struct
+
+        return struct
+
+
+    def serialize(self, values, scalers):
+        """
+        Returns the message digest input for the given point values and
+        scalers. Values of None denote 'not implemented' values. Scalers of
+        points without a scale factor have to be zero.
+        """
+        if None in values:
+            values = [u if v is None else v for (v, u) in zip(values, self._unimpl_values)]
+
+        args = []
+        lengths = []
+
+        for (start, stop, template) in self._segments:
+            if template is None:
+                string = values[start]
+                data = string.encode(config.PYSUNSPEC_STRING_ENCODING)
+                args += (len(string), data)
+                lengths.append(len(data))
+            else:
+                run = list(template)
+                run[0::3] = values[start:stop]
+                run[1::3] = scalers[start:stop]
+                args += run
+
+        return self._struct(tuple(lengths)).pack(*args)
+
+
+
+
+def _data_for_md(type_, value, scaler, dlms_unit):
+    """
+    Returns the message digest input for a value along with a slicer for
+    tracing it.
+    """
+    if type_ in _MD_UNSIGNED_TYPES:
+        data = data_for_scaled_uint32(None, value, scaler, dlms_unit)
+        trace_data_slicer = scaled_int32_uint32_slicer
+    elif type_ in _MD_SIGNED_TYPES:
+        data = data_for_scaled_int32(None, value, scaler, dlms_unit)
+        trace_data_slicer = scaled_int32_uint32_slicer
+    elif type_ == suns.SUNS_TYPE_STRING:
+        data = data_for_string(None, value)
+        trace_data_slicer = string_slicer
+    else:
+        raise TypeError('Unsupported point type \'{}\'.'.format(type_))
+
+    return (data, trace_data_slicer)
+
+
+def _snapshot_md_layout():
+    """
+    Returns a tuple of (point ID, point type, DLMS unit, units, scale factor)
+    for the data points of the snapshot message digest from the snapshot
+    model definition.
+    """
+    global _SNAPSHOT_MD_LAYOUT
+
+    if _SNAPSHOT_MD_LAYOUT is None:
+        from . import modelcache
+
+        model_type = modelcache.model_type_get(SNAPSHOT_MODEL_ID)
+        points = model_type.fixed_block.points
+        _SNAPSHOT_MD_LAYOUT = tuple(map(lambda x: (x, points[x].type,
+            dlms.dlms_unit_for_symbol(points[x].units), points[x].units,
+            points[x].sf), SNAPSHOT_MD_POINT_IDS))
+
+    return _SNAPSHOT_MD_LAYOUT
+
+
+def _snapshot_md_serializer():
+    global _SNAPSHOT_MD_SERIALIZER
+
+    if _SNAPSHOT_MD_SERIALIZER is None:
+        _SNAPSHOT_MD_SERIALIZER = _MdSerializer(map(lambda x: (x[1], x[2], x[4]),
+            _snapshot_md_layout()))
+
+    return _SNAPSHOT_MD_SERIALIZER
+
+
+def _trace_md_data(trace, point_id, value, data, trace_data_slicer):
+    # Render trace data separated by spaces to improve readability if
+    # slicing has been provided.
+    if trace_data_slicer:
+        rendered = ' '.join(map(lambda x: x.hex(), trace_data_slicer(data)))
+    else:
+        rendered = data.hex()
+
+    trace('{}:\n    value: {}\n    data:  {}\n'.format(point_id, value, rendered))
+
+
 def md_for_snapshot_data(snapshot, trace=None):
+    if not trace:
+        return config.BSM_MESSAGE_DIGEST(snapshot_md_data(snapshot)).digest()
+
+    md = config.BSM_MESSAGE_DIGEST()
+
+    for point_id in SNAPSHOT_MD_POINT_IDS:
+        update_md_from_point(md, snapshot.points[point_id], trace=trace)
+
+    return md.digest()
+
+
+def md_for_snapshot_record(record, trace=None):
+    """
+    Computes the message digest for snapshot data from a register record
+    (see records.Model64901Record) the same way as md_for_snapshot_data does
+    for a pySunSpec model instance.
+    """
+    if not trace:
+        return config.BSM_MESSAGE_DIGEST(snapshot_record_md_data(record)).digest()
+
     md = config.BSM_MESSAGE_DIGEST()
 
-    update_md_from_point(md, snapshot.points['Typ'], trace=trace)
-    update_md_from_point(md, snapshot.points['RCR'], trace=trace)
-    update_md_from_point(md, snapshot.points['TotWhImp'], trace=trace)
-    update_md_from_point(md, snapshot.points['W'], trace=trace)
-    update_md_from_point(md, snapshot.points['MA1'], trace=trace)
-    update_md_from_point(md, snapshot.points['RCnt'], trace=trace)
-    update_md_from_point(md, snapshot.points['OS'], trace=trace)
-    update_md_from_point(md, snapshot.points['Epoch'], trace=trace)
-    update_md_from_point(md, snapshot.points['TZO'], trace=trace)
-    update_md_from_point(md, snapshot.points['EpochSetCnt'], trace=trace)
-    update_md_from_point(md, snapshot.points['EpochSetOS'], trace=trace)
-    update_md_from_point(md, snapshot.points['DI'], trace=trace)
-    update_md_from_point(md, snapshot.points['DO'], trace=trace)
-    update_md_from_point(md, snapshot.points['Meta1'], trace=trace)
-    update_md_from_point(md, snapshot.points['Meta2'], trace=trace)
-    update_md_from_point(md, snapshot.points['Meta3'], trace=trace)
-    update_md_from_point(md, snapshot.points['Evt'], trace=trace)
+    for (point_id, type_, dlms_unit, units, _) in _snapshot_md_layout():
+        value = getattr(record, point_id)
+        if value is None:
+            value = _MD_UNIMPL_VALUES[type_]
+
+        # Like md_scaler_for_point, use zero for points without scale factor
+        # and the scale factor's value in all other cases.
+        scaler = 0
+        if point_id in record.SCALE_FACTORS:
+            scaler = record.scale_factor(point_id)
+
+        (data, trace_data_slicer) = _data_for_md(type_, value, scaler, dlms_unit)
+        md.update(data)
+
+        if trace:
+            scaled = record.value(point_id)
+            unit = ' {}'.format(units) if scaled is not None and units else ''
+            _trace_md_data(trace, point_id, '{}{}'.format(scaled, unit), data,
+                trace_data_slicer)
 
     return md.digest()
 
@@ -83,6 +285,18 @@ def md_scaler_for_point(point):
     return scaler
 
 
+def md_unimpl_value_for_snapshot_point(point_id):
+    """
+    Returns the value used for computing the message digest of a snapshot
+    if the given data point is not implemented.
+    """
+    for (id_, type_, _, _, _) in _snapshot_md_layout():
+        if id_ == point_id:
+            return _MD_UNIMPL_VALUES[type_]
+
+    raise KeyError('Unknown snapshot data point \'{}\'.'.format(point_id))
+
+
 def md_value_and_scaler_for_point(point):
     type_ = point.point_type.type
     value = point.value_base
@@ -99,38 +313,49 @@ def md_value_and_scaler_for_point(point):
     return (value, scaler)
 
 
+def snapshot_md_data(snapshot):
+    """
+    Returns the message digest input for a snapshot model instance. This is
+    the data md_for_snapshot_data feeds into the message digest.
+    """
+    serializer = _snapshot_md_serializer()
+    points = snapshot.points
+    values = [points[x].value_base for x in SNAPSHOT_MD_POINT_IDS]
+    scalers = [0] * serializer.count
+
+    for (index, _) in serializer.scale_factors:
+        scalers[index] = md_scaler_for_point(points[SNAPSHOT_MD_POINT_IDS[index]])
+
+    return serializer.serialize(values, scalers)
+
+
+def snapshot_record_md_data(record):
+    """
+    Returns the message digest input for snapshot data from a register
+    record. This is the data md_for_snapshot_record feeds into the message
+    digest.
+    """
+    serializer = _snapshot_md_serializer()
+    values = [getattr(record, x) for x in SNAPSHOT_MD_POINT_IDS]
+    scalers = [0] * serializer.count
+
+    for (index, sf) in serializer.scale_factors:
+        scalers[index] = getattr(record, sf) if isinstance(sf, str) else sf
+
+    return serializer.serialize(values, scalers)
+
+
 def update_md_from_point(md, point, trace=None):
     type_ = point.point_type.type
     dlms_unit = dlms.dlms_unit_for_symbol(point.point_type.units)
     (value, scaler) = md_value_and_scaler_for_point(point)
 
-    data = None
-    trace_data_slicer = None
-
-    if type_ in _MD_UNSIGNED_TYPES:
-        data = data_for_scaled_uint32(md, value, scaler, dlms_unit)
-        trace_data_slicer = scaled_int32_uint32_slicer
-    elif type_ in _MD_SIGNED_TYPES:
-        data = data_for_scaled_int32(md, value, scaler, dlms_unit)
-        trace_data_slicer = scaled_int32_uint32_slicer
-    elif type_ == suns.SUNS_TYPE_STRING:
-        data = data_for_string(md, value)
-        trace_data_slicer = string_slicer
-    else:
-        raise TypeError('Unsupported point type \'{}\'.'.format(type_))
-
+    (data, trace_data_slicer) = _data_for_md(type_, value, scaler, dlms_unit)
     md.update(data)
 
     if trace:
-        # Render trace data separated by spaces to improve readability if
-        # slicing has been provided.
-        if trace_data_slicer:
-            rendered = ' '.join(map(lambda x: x.hex(), trace_data_slicer(data)))
-        else:
-            rendered = data.hex()
-
-        trace('{}:\n    value: {}\n    data:  {}\n'.format(point.point_type.id,
-            fmt.format_point_value(point), rendered))
+        _trace_md_data(trace, point.point_type.id, fmt.format_point_value(point),
+            data, trace_data_slicer)
 
 
 def data_for_scaled_int32(md, value, scaler, unit):
@@ -0,0 +1,171 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from ..sunspec.core.modbus import client as smodbus
+import struct
+
+
+# Encoding and decoding of Modbus frames independent from any I/O.
+#
+# This covers the subset of Modbus used by BSM meters (reading holding
+# registers and writing multiple registers) for RTU and TCP framing. Errors
+# are reported by pySunSpec's Modbus exceptions for being handled the same way
+# as errors from its own clients.
+
+
+FUNC_READ_HOLDING = smodbus.FUNC_READ_HOLDING
+FUNC_WRITE_MULTIPLE = smodbus.FUNC_WRITE_MULTIPLE
+
+# Response header length (slave ID, function code, and byte count or
+# exception code) required for determining the length of an RTU response.
+RTU_RESPONSE_HEADER_LEN = 3
+RTU_CRC_LEN = 2
+
+# An RTU character takes 11 bits on the line (start bit, eight data bits,
+# parity or second stop bit, and stop bit). Frames are separated by a silent
+# interval of 3.5 character times, which is fixed to 1.75 ms for baud rates
+# above 19200 baud.
+RTU_CHARACTER_BITS = 11
+RTU_INTER_FRAME_CHARACTERS = 3.5
+RTU_INTER_FRAME_MIN_DELAY = 0.00175
+
+# MBAP header length including the unit ID.
+TCP_HEADER_LEN = 7
+TCP_PROTOCOL_ID = 0
+
+
+def _check_exception(pdu):
+    if len(pdu) < 2:
+        raise smodbus.ModbusClientError('Modbus response too short')
+    if pdu[0] & 0x80:
+        raise smodbus.ModbusClientException('Modbus exception {}'.format(pdu[1]))
+
+
+def read_request(addr, count, op=FUNC_READ_HOLDING):
+    """
+    Returns the request PDU for reading count registers starting at addr.
+    """
+    return struct.pack('>BHH', op, int(addr), int(count))
+
+
+def read_response_data(pdu, count, op=FUNC_READ_HOLDING):
+    """
+    Returns the register data from a read response PDU after checking it for
+    matching the request.
+    """
+    _check_exception(pdu)
+
+    if pdu[0] != op or pdu[1] != 2 * count or len(pdu) != 2 + 2 * count:
+        raise smodbus.ModbusClientError('Modbus response format error')
+
+    return pdu[2:]
+
+
+def rtu_frame(slave_id, pdu):
+    """
+    Returns the RTU frame (ADU) for sending the given PDU to slave_id.
+    """
+    adu = struct.pack('>B', int(slave_id)) + pdu
+    return adu + struct.pack('>H', smodbus.computeCRC(adu))
+
+
+def rtu_character_time(baudrate):
+    """
+    Returns the time in seconds for transmitting a single RTU character at
+    the given baud rate.
+    """
+    return RTU_CHARACTER_BITS / baudrate
+
+
+def rtu_inter_frame_delay(baudrate):
+    """
+    Returns the minimum silent interval in seconds between two RTU frames at
+    the given baud rate.
+    """
+    if baudrate > 19200:
+        result = RTU_INTER_FRAME_MIN_DELAY
+    else:
+        result = RTU_INTER_FRAME_CHARACTERS * rtu_character_time(baudrate)
+
+    return result
+
+
+def rtu_pdu(adu, slave_id):
+    """
+    Returns the PDU from the given RTU response frame after checking its CRC
+    and slave ID.
+    """
+    if len(adu) < RTU_RESPONSE_HEADER_LEN + RTU_CRC_LEN:
+        raise smodbus.ModbusClientError('Modbus response too short')
+
+    (crc,) = struct.unpack('>H', adu[-RTU_CRC_LEN:])
+    if not smodbus.checkCRC(adu[:-RTU_CRC_LEN], crc):
+        raise smodbus.ModbusClientError('CRC error')
+    if adu[0] != slave_id:
+        raise smodbus.ModbusClientError('Modbus response from unexpected slave {}'.format(adu[0]))
+
+    return adu[1:-RTU_CRC_LEN]
+
+
+def rtu_response_len(header):
+    """
+    Returns the total length of an RTU response frame from its first
+    RTU_RESPONSE_HEADER_LEN bytes.
+    """
+    func = header[1]
+
+    if func & 0x80:
+        # Slave ID, function code, exception code, and CRC.
+        result = 5
+    elif func == FUNC_WRITE_MULTIPLE:
+        # Slave ID, function code, address, count, and CRC.
+        result = 8
+    else:
+        # Slave ID, function code, byte count, data, and CRC.
+        result = RTU_RESPONSE_HEADER_LEN + header[2] + RTU_CRC_LEN
+
+    return result
+
+
+def tcp_frame(transaction_id, slave_id, pdu):
+    """
+    Returns the TCP frame (MBAP header and PDU) for sending the given PDU to
+    unit slave_id.
+    """
+    return struct.pack('>HHHB', transaction_id & 0xffff, TCP_PROTOCOL_ID,
+        len(pdu) + 1, int(slave_id)) + pdu
+
+
+def tcp_header(header):
+    """
+    Decodes the MBAP header of a TCP response and returns a tuple of its
+    transaction ID, unit ID, and the length of the PDU following it.
+    """
+    (transaction_id, protocol_id, length, unit_id) = struct.unpack('>HHHB', header)
+
+    if protocol_id != TCP_PROTOCOL_ID or length < 2:
+        raise smodbus.ModbusClientError('Modbus TCP header error')
+
+    return (transaction_id, unit_id, length - 1)
+
+
+def write_request(addr, data):
+    """
+    Returns the request PDU for writing data to the registers starting at
+    addr.
+    """
+    return struct.pack('>BHHB', FUNC_WRITE_MULTIPLE, int(addr), len(data) // 2, len(data)) + data
+
+
+def write_response_check(pdu, addr, count):
+    """
+    Checks a write response PDU for matching the request.
+    """
+    _check_exception(pdu)
+
+    if len(pdu) != 5 or struct.unpack('>BHH', pdu) != (FUNC_WRITE_MULTIPLE, addr, count):
+        raise smodbus.ModbusClientError('Modbus response format error')
@@ -0,0 +1,228 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Persistent cache for parsed SunSpec model types.
+
+Parsing the SMDX model definitions is the most expensive part of setting up
+a BsmClientDevice. This module keeps the parsed ModelType objects on disk,
+keyed by the SHA-256 digest of the SMDX data they were created from, and
+registers them with pySunSpec for sharing them between all model instances
+within the process.
+
+The cache directory could be set by the environment variable
+BSM_MODEL_CACHE_DIR. Setting it to an empty string disables the on-disk
+cache. By default, the cache is located in $XDG_CACHE_HOME/bauer_bsm/models or
+~/.cache/bauer_bsm/models.
+
+Cache entries get only loaded from a directory and files owned by the
+current user which are neither group- nor world-writable. Unpickling data
+provided by others would allow them to execute arbitrary code.
+"""
+
+
+from ..sunspec.core import device as sdevice
+from ..sunspec.core import smdx
+from ..sunspec.core.util import SunSpecError
+from ..util import package_version
+from hashlib import sha256
+from pathlib import Path
+import os
+import pickle
+import stat
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+
+# Increment this version when changing the cache layout or the way model types
+# get created.
+CACHE_FORMAT_VERSION = 1
+CACHE_DIR_ENV = 'BSM_MODEL_CACHE_DIR'
+
+
+
+
+def _cache_root():
+    root = os.getenv(CACHE_DIR_ENV)
+
+    if root is None:
+        xdg_cache_home = os.getenv('XDG_CACHE_HOME')
+        if xdg_cache_home:
+            root = Path(xdg_cache_home) / 'bauer_bsm' / 'models'
+        else:
+            root = Path.home() / '.cache' / 'bauer_bsm' / 'models'
+    elif root == '':
+        root = None
+    else:
+        root = Path(root)
+
+    return root
+
+
+def _is_private(status):
+    """
+    Returns whether the file with the given os.stat_result belongs to the
+    current user and is neither group- nor world-writable.
+    """
+    getuid = getattr(os, 'getuid', None)
+
+    # There is no such ownership to check on Windows.
+    if getuid is None:
+        return True
+
+    return status.st_uid == getuid() \
+        and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _is_private_dir(path):
+    try:
+        return _is_private(os.stat(str(path)))
+    except OSError:
+        return False
+
+
+def _load_cached(path):
+    model_type = None
+
+    # A missing, truncated, or otherwise unusable cache entry is not an error.
+    # It will get replaced with freshly parsed data.
+    try:
+        if _is_private_dir(path.parent):
+            with open(str(path), 'rb') as f:
+                # Check the file actually opened.
+                if _is_private(os.fstat(f.fileno())):
+                    model_type = pickle.load(f)
+    except Exception:
+        model_type = None
+
+    return model_type
+
+
+def _parse_smdx_data(model_id, data):
+    # Parse the same way as pySunSpec's model_type_get does.
+    try:
+        root = ET.fromstring(data)
+        model_type = sdevice.ModelType()
+        model_type.from_smdx(root)
+    except Exception as e:
+        raise SunSpecError('Error loading model {}: {}'.format(model_id, str(e)))
+
+    return model_type
+
+
+def _read_smdx_data(model_id):
+    """
+    Reads the SMDX data for the given model ID from the same sources and in
+    the same order as pySunSpec does.
+    """
+    filename = smdx.model_id_to_filename(model_id)
+    data = None
+
+    if sdevice.file_pathlist is not None:
+        data = sdevice.file_pathlist.read(filename)
+
+    if not data:
+        path = os.path.join(sdevice.model_type_path_default, filename)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+
+    if not data:
+        raise SunSpecError('Model file for model {} not found'.format(model_id))
+
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    return data
+
+
+def _register_model_type(model_type):
+    # pySunSpec stores model types by their integer ID but looks them up by
+    # their string representation. Register them under both keys to let
+    # pySunSpec's own lookups find them as well.
+    sdevice.model_types[model_type.id] = model_type
+    sdevice.model_types[str(model_type.id)] = model_type
+
+
+def _store_cached(path, model_type):
+    # Write the cache entry atomically to avoid other processes from seeing
+    # partial data. Failing to do so just means that the model will be parsed
+    # again next time.
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Entries in a directory others could write to would not get loaded
+        # anyway.
+        if not _is_private_dir(path.parent):
+            return
+        (fd, temp_name) = tempfile.mkstemp(dir=str(path.parent), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(model_type, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, str(path))
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+    except Exception:
+        pass
+
+
+def cache_dir():
+    """
+    Returns the directory for cached model types of the running version of
+    this package or None if the on-disk cache is disabled.
+    """
+    root = _cache_root()
+    result = None
+
+    if root is not None:
+        # Entries depend on the versions of the pickle format and the model
+        # type classes. Keep them apart from ones of other versions.
+        version = '{}-{}-py{}{}'.format(CACHE_FORMAT_VERSION,
+            package_version(), sys.version_info[0], sys.version_info[1])
+        result = root / version
+
+    return result
+
+
+def load_model_types(model_ids):
+    """
+    Loads the model types for the given model IDs. See model_type_get for
+    details.
+    """
+    return [model_type_get(model_id) for model_id in model_ids]
+
+
+def model_type_get(model_id):
+    """
+    Returns the model type for the given model ID.
+
+    The model type gets looked up from the process-wide model types of
+    pySunSpec first, then from the on-disk cache and gets parsed from its
+    SMDX data as the last resort. The result is registered with pySunSpec for
+    subsequent lookups.
+    """
+    model_type = sdevice.model_types.get(str(model_id))
+
+    if model_type is None:
+        data = _read_smdx_data(model_id)
+        digest = sha256(data).hexdigest()
+        directory = cache_dir()
+        path = None
+
+        if directory is not None:
+            path = directory / '{}-{}.pickle'.format(model_id, digest)
+            model_type = _load_cached(path)
+
+        if model_type is None or model_type.id != int(model_id):
+            model_type = _parse_smdx_data(model_id, data)
+            if path is not None:
+                _store_cached(path, model_type)
+
+        _register_model_type(model_type)
+
+    return model_type
@@ -0,0 +1,83 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from . import config
+from . import md
+from .records import Model64900Record, Model64901Record
+
+
+# Verifying snapshots from raw register data without a device.
+#
+# Snapshots stored as their register data (for example the data read by
+# BsmClientDevice.read for a snapshot model instance) could be verified later
+# on without any connection to the meter. The data is decoded by the register
+# records from records/ without creating pySunSpec models or points and the
+# message digest is computed by the same rules as for live snapshots.
+#
+# Register data is expected without the model ID and length header, starting
+# at the given byte offset. Any bytes-like object (including memoryview) will
+# do.
+
+
+def public_key_from_bsm_data(data, offset=0):
+    """
+    Returns the public key (DER) from the register data of a BSM model
+    instance (model 64900).
+    """
+    return Model64900Record(data, offset).blob()
+
+
+def snapshot_md_and_signature(data, offset=0, trace=None):
+    """
+    Returns a tuple of the message digest and the signature for the register
+    data of a snapshot model instance (model 64901).
+    """
+    record = Model64901Record(data, offset)
+    return (md.md_for_snapshot_record(record, trace=trace), record.blob())
+
+
+def verify_snapshot_data(snapshot_data, public_key=None, bsm_data=None,
+        snapshot_offset=0, bsm_offset=0, trace=None):
+    """
+    Verifies a snapshot from its register data. The public key is either
+    given in DER format or taken from the register data of the BSM model
+    instance of the meter which created the snapshot.
+
+    This gives the same result as BsmClientDevice.verify_snapshot for the
+    same data.
+    """
+    if public_key is None:
+        if bsm_data is None:
+            raise ValueError('Either public key or BSM model data is required.')
+        public_key = public_key_from_bsm_data(bsm_data, bsm_offset)
+
+    if trace:
+        trace('Computing SHA-256 digest for snapshot data:')
+    (digest, signature) = snapshot_md_and_signature(snapshot_data,
+        snapshot_offset, trace=trace)
+    if trace:
+        trace('Snapshot data SHA-256 digest: {}'.format(digest.hex()))
+        trace('Public key: {}'.format(bytes(public_key).hex()))
+        trace('Signature: {}'.format(signature.hex()))
+
+    if len(public_key) == 0:
+        if trace:
+            trace('Failed. Device has no public key.')
+        return False
+    if len(signature) == 0:
+        if trace:
+            trace('Failed. Snapshot contains no signature.')
+        return False
+
+    from ..crypto import util as cutil
+
+    result = cutil.verify_signed_digest(bytes(public_key),
+        config.BSM_MESSAGE_DIGEST, signature, digest)
+    if trace:
+        trace('Success.' if result else 'Failed.')
+
+    return result
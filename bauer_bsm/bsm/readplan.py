@@ -0,0 +1,119 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+def _merged_ranges(ranges):
+    """
+    Returns the given register ranges sorted and with overlapping and
+    adjacent ones merged.
+    """
+    result = []
+
+    for (addr, count) in sorted(ranges):
+        if count <= 0:
+            continue
+
+        if result and addr <= result[-1][0] + result[-1][1]:
+            (last_addr, last_count) = result[-1]
+            end = max(last_addr + last_count, addr + count)
+            result[-1] = (last_addr, end - last_addr)
+        else:
+            result.append((addr, count))
+
+    return result
+
+
+def _request_count(count, max_count):
+    return (count + max_count - 1) // max_count
+
+
+def plan_reads(ranges, max_count, max_gap=0):
+    """
+    Plans the Modbus read requests for the given register ranges.
+
+    Ranges which are at most max_gap registers apart get combined into a
+    single span if this does not increase the number of requests. The spans
+    are then split into requests of at most max_count registers.
+
+    Parameters:
+
+        ranges
+            Iterable of (address, count) tuples.
+
+        max_count
+            Maximum number of registers for a single request.
+
+        max_gap
+            Maximum number of unrequested registers to read for combining
+            neighbouring ranges.
+
+    Returns:
+        A list of (address, count) tuples for the requests in ascending order
+        of their addresses.
+    """
+    spans = []
+
+    for (addr, count) in _merged_ranges(ranges):
+        if spans:
+            (span_addr, span_count) = spans[-1]
+            gap = addr - (span_addr + span_count)
+            combined_count = addr + count - span_addr
+
+            if gap <= max_gap \
+                and _request_count(combined_count, max_count) \
+                    <= _request_count(span_count, max_count) + _request_count(count, max_count):
+                spans[-1] = (span_addr, combined_count)
+                continue
+
+        spans.append((addr, count))
+
+    requests = []
+    for (addr, count) in spans:
+        for offset in range(0, count, max_count):
+            requests.append((addr + offset, min(max_count, count - offset)))
+
+    return requests
+
+
+class RegisterImage:
+    """
+    Register data read from a device, stored as contiguous segments. It is
+    used for serving reads of model instances from data already read by a
+    read plan.
+    """
+    def __init__(self):
+        self.segments = []
+
+
+    def add(self, addr, data):
+        """
+        Adds register data starting at the given address. Data directly
+        following an already existing segment gets appended to it.
+        """
+        for (index, (segment_addr, segment_data)) in enumerate(self.segments):
+            if segment_addr + len(segment_data) // 2 == addr:
+                self.segments[index] = (segment_addr, segment_data + data)
+                break
+        else:
+            self.segments.append((addr, data))
+
+
+    def get(self, addr, count):
+        """
+        Returns the data for the given register range or None if it is not
+        completely contained in a single segment.
+        """
+        result = None
+
+        for (segment_addr, data) in self.segments:
+            start = 2 * (addr - segment_addr)
+            end = start + 2 * count
+
+            if start >= 0 and end <= len(data):
+                result = data[start:end]
+                break
+
+        return result
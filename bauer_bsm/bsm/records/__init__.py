@@ -0,0 +1,54 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+"""
+Register records for BSM model instances.
+
+The record classes are generated ahead of time from the SMDX model
+definitions by tools/generate-records. Each of them decodes a whole model
+instance with a single struct unpacking instead of creating a pySunSpec
+point object per data point.
+"""
+
+
+from .base import RecordBase
+from .model_1 import Model1Record
+from .model_203 import Model203Record
+from .model_64900 import Model64900Record
+from .model_64901 import Model64901Record
+from .model_64902 import Model64902Record
+from .model_64903 import Model64903Record
+
+
+__all__ = [
+        'RECORD_CLASSES',
+        'Model1Record',
+        'Model203Record',
+        'Model64900Record',
+        'Model64901Record',
+        'Model64902Record',
+        'Model64903Record',
+        'RecordBase',
+        'record_class_for_model_id',
+    ]
+
+
+RECORD_CLASSES = {
+        Model1Record.MODEL_ID: Model1Record,
+        Model203Record.MODEL_ID: Model203Record,
+        Model64900Record.MODEL_ID: Model64900Record,
+        Model64901Record.MODEL_ID: Model64901Record,
+        Model64902Record.MODEL_ID: Model64902Record,
+        Model64903Record.MODEL_ID: Model64903Record,
+    }
+
+
+def record_class_for_model_id(model_id):
+    """
+    Returns the record class for the given model ID or None if there is none.
+    """
+    return RECORD_CLASSES.get(model_id)
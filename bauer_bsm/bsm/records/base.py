@@ -0,0 +1,126 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from .. import config
+import math
+
+
+def decode_string(data):
+    """
+    Decodes string data the same way as pySunSpec does. A string starting with
+    a NUL character is considered not implemented and None is returned.
+    """
+    result = None
+
+    if data and data[0] != 0:
+        result = data.rstrip(b'\0').decode(config.PYSUNSPEC_STRING_ENCODING)
+
+    return result
+
+
+class RecordBase:
+    """
+    Base class for the generated register records.
+
+    A record holds the decoded values of a model instance's data points
+    without any per-point objects. The values are the same as value_base of
+    the corresponding pySunSpec data points: unscaled and None for values
+    which are reported as not implemented.
+
+    BLOB data from repeating blocks (like the public key or a signature) is
+    provided as raw byte string under the ID of the repeating data point.
+
+    Attributes (class-level, provided by the generated classes):
+
+        MODEL_ID
+            SunSpec model ID.
+
+        MODEL_NAME
+            Model name from the model definition.
+
+        LENGTH
+            Length of the model in registers (without the ID and length
+            header).
+
+        FIXED_LENGTH
+            Length of the fixed block in registers.
+
+        POINTS
+            IDs of the data points (excluding scale factors) in the order of
+            their appearance.
+
+        SCALE_FACTORS
+            Dictionary mapping data point IDs to the IDs of their scale factor
+            data points or constant scale factors.
+
+        BLOB
+            The ID of the repeating data point holding BLOB data or None.
+    """
+    __slots__ = ()
+
+    BLOB = None
+    SCALE_FACTORS = {}
+
+
+    def __init__(self, data, offset=0):
+        self.decode(data, offset)
+
+
+    def __repr__(self):
+        values = ', '.join('{}={!r}'.format(x, getattr(self, x)) for x in self.POINTS)
+        return '{}({})'.format(self.__class__.__name__, values)
+
+
+    def blob(self):
+        """
+        Returns the BLOB data from the repeating blocks. It gets trimmed to
+        its actual length if the model has an explicit length data point 'Bx'
+        for the repeating data point 'x'.
+        """
+        result = None
+
+        if self.BLOB is not None:
+            result = getattr(self, self.BLOB)
+            length = getattr(self, 'B' + self.BLOB, None)
+            if length is not None:
+                result = result[:length]
+
+        return result
+
+
+    def decode(self, data, offset=0):
+        """
+        Decodes the model data starting at the given byte offset.
+        """
+        raise NotImplementedError()
+
+
+    def scale_factor(self, point_id):
+        """
+        Returns the scale factor value for the given data point or None if it
+        has no scale factor.
+        """
+        sf = self.SCALE_FACTORS.get(point_id)
+
+        if isinstance(sf, str):
+            sf = getattr(self, sf)
+
+        return sf
+
+
+    def value(self, point_id):
+        """
+        Returns the value of the given data point with its scale factor
+        applied like pySunSpec's Point.value does.
+        """
+        value = getattr(self, point_id)
+        sf = self.scale_factor(point_id)
+
+        if value is not None and sf:
+            value = value * math.pow(10, sf)
+
+        return value
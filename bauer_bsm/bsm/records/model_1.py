@@ -0,0 +1,51 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 1.
+# Do not edit.
+
+
+from .base import RecordBase, decode_string
+from struct import Struct
+
+
+class Model1Record(RecordBase):
+    """
+    Register record for model 1 (common).
+    """
+    __slots__ = (
+            'Mn',
+            'Md',
+            'Opt',
+            'Vr',
+            'SN',
+            'DA',
+        )
+
+    MODEL_ID = 1
+    MODEL_NAME = 'common'
+    LENGTH = 66
+    FIXED_LENGTH = 66
+    POINTS = (
+            'Mn',
+            'Md',
+            'Opt',
+            'Vr',
+            'SN',
+            'DA',
+        )
+
+    _FIXED = Struct('>32s32s16s16s32sH2x')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2, _3, _4, _5) = self._FIXED.unpack_from(data, offset)
+        self.Mn = decode_string(_0)
+        self.Md = decode_string(_1)
+        self.Opt = decode_string(_2)
+        self.Vr = decode_string(_3)
+        self.SN = decode_string(_4)
+        self.DA = None if _5 == 65535 else _5
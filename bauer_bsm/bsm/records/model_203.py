@@ -0,0 +1,302 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 203.
+# Do not edit.
+
+
+from .base import RecordBase
+from struct import Struct
+
+
+class Model203Record(RecordBase):
+    """
+    Register record for model 203 (ac_meter).
+    """
+    __slots__ = (
+            'A',
+            'AphA',
+            'AphB',
+            'AphC',
+            'A_SF',
+            'PhV',
+            'PhVphA',
+            'PhVphB',
+            'PhVphC',
+            'PPV',
+            'PhVphAB',
+            'PhVphBC',
+            'PhVphCA',
+            'V_SF',
+            'Hz',
+            'Hz_SF',
+            'W',
+            'WphA',
+            'WphB',
+            'WphC',
+            'W_SF',
+            'VA',
+            'VAphA',
+            'VAphB',
+            'VAphC',
+            'VA_SF',
+            'VAR',
+            'VARphA',
+            'VARphB',
+            'VARphC',
+            'VAR_SF',
+            'PF',
+            'PFphA',
+            'PFphB',
+            'PFphC',
+            'PF_SF',
+            'TotWhExp',
+            'TotWhExpPhA',
+            'TotWhExpPhB',
+            'TotWhExpPhC',
+            'TotWhImp',
+            'TotWhImpPhA',
+            'TotWhImpPhB',
+            'TotWhImpPhC',
+            'TotWh_SF',
+            'TotVAhExp',
+            'TotVAhExpPhA',
+            'TotVAhExpPhB',
+            'TotVAhExpPhC',
+            'TotVAhImp',
+            'TotVAhImpPhA',
+            'TotVAhImpPhB',
+            'TotVAhImpPhC',
+            'TotVAh_SF',
+            'TotVArhImpQ1',
+            'TotVArhImpQ1PhA',
+            'TotVArhImpQ1PhB',
+            'TotVArhImpQ1PhC',
+            'TotVArhImpQ2',
+            'TotVArhImpQ2PhA',
+            'TotVArhImpQ2PhB',
+            'TotVArhImpQ2PhC',
+            'TotVArhExpQ3',
+            'TotVArhExpQ3PhA',
+            'TotVArhExpQ3PhB',
+            'TotVArhExpQ3PhC',
+            'TotVArhExpQ4',
+            'TotVArhExpQ4PhA',
+            'TotVArhExpQ4PhB',
+            'TotVArhExpQ4PhC',
+            'TotVArh_SF',
+            'Evt',
+        )
+
+    MODEL_ID = 203
+    MODEL_NAME = 'ac_meter'
+    LENGTH = 105
+    FIXED_LENGTH = 105
+    POINTS = (
+            'A',
+            'AphA',
+            'AphB',
+            'AphC',
+            'PhV',
+            'PhVphA',
+            'PhVphB',
+            'PhVphC',
+            'PPV',
+            'PhVphAB',
+            'PhVphBC',
+            'PhVphCA',
+            'Hz',
+            'W',
+            'WphA',
+            'WphB',
+            'WphC',
+            'VA',
+            'VAphA',
+            'VAphB',
+            'VAphC',
+            'VAR',
+            'VARphA',
+            'VARphB',
+            'VARphC',
+            'PF',
+            'PFphA',
+            'PFphB',
+            'PFphC',
+            'TotWhExp',
+            'TotWhExpPhA',
+            'TotWhExpPhB',
+            'TotWhExpPhC',
+            'TotWhImp',
+            'TotWhImpPhA',
+            'TotWhImpPhB',
+            'TotWhImpPhC',
+            'TotVAhExp',
+            'TotVAhExpPhA',
+            'TotVAhExpPhB',
+            'TotVAhExpPhC',
+            'TotVAhImp',
+            'TotVAhImpPhA',
+            'TotVAhImpPhB',
+            'TotVAhImpPhC',
+            'TotVArhImpQ1',
+            'TotVArhImpQ1PhA',
+            'TotVArhImpQ1PhB',
+            'TotVArhImpQ1PhC',
+            'TotVArhImpQ2',
+            'TotVArhImpQ2PhA',
+            'TotVArhImpQ2PhB',
+            'TotVArhImpQ2PhC',
+            'TotVArhExpQ3',
+            'TotVArhExpQ3PhA',
+            'TotVArhExpQ3PhB',
+            'TotVArhExpQ3PhC',
+            'TotVArhExpQ4',
+            'TotVArhExpQ4PhA',
+            'TotVArhExpQ4PhB',
+            'TotVArhExpQ4PhC',
+            'Evt',
+        )
+    SCALE_FACTORS = {
+            'A': 'A_SF',
+            'AphA': 'A_SF',
+            'AphB': 'A_SF',
+            'AphC': 'A_SF',
+            'PhV': 'V_SF',
+            'PhVphA': 'V_SF',
+            'PhVphB': 'V_SF',
+            'PhVphC': 'V_SF',
+            'PPV': 'V_SF',
+            'PhVphAB': 'V_SF',
+            'PhVphBC': 'V_SF',
+            'PhVphCA': 'V_SF',
+            'Hz': 'Hz_SF',
+            'W': 'W_SF',
+            'WphA': 'W_SF',
+            'WphB': 'W_SF',
+            'WphC': 'W_SF',
+            'VA': 'VA_SF',
+            'VAphA': 'VA_SF',
+            'VAphB': 'VA_SF',
+            'VAphC': 'VA_SF',
+            'VAR': 'VAR_SF',
+            'VARphA': 'VAR_SF',
+            'VARphB': 'VAR_SF',
+            'VARphC': 'VAR_SF',
+            'PF': 'PF_SF',
+            'PFphA': 'PF_SF',
+            'PFphB': 'PF_SF',
+            'PFphC': 'PF_SF',
+            'TotWhExp': 'TotWh_SF',
+            'TotWhExpPhA': 'TotWh_SF',
+            'TotWhExpPhB': 'TotWh_SF',
+            'TotWhExpPhC': 'TotWh_SF',
+            'TotWhImp': 'TotWh_SF',
+            'TotWhImpPhA': 'TotWh_SF',
+            'TotWhImpPhB': 'TotWh_SF',
+            'TotWhImpPhC': 'TotWh_SF',
+            'TotVAhExp': 'TotVAh_SF',
+            'TotVAhExpPhA': 'TotVAh_SF',
+            'TotVAhExpPhB': 'TotVAh_SF',
+            'TotVAhExpPhC': 'TotVAh_SF',
+            'TotVAhImp': 'TotVAh_SF',
+            'TotVAhImpPhA': 'TotVAh_SF',
+            'TotVAhImpPhB': 'TotVAh_SF',
+            'TotVAhImpPhC': 'TotVAh_SF',
+            'TotVArhImpQ1': 'TotVArh_SF',
+            'TotVArhImpQ1PhA': 'TotVArh_SF',
+            'TotVArhImpQ1PhB': 'TotVArh_SF',
+            'TotVArhImpQ1PhC': 'TotVArh_SF',
+            'TotVArhImpQ2': 'TotVArh_SF',
+            'TotVArhImpQ2PhA': 'TotVArh_SF',
+            'TotVArhImpQ2PhB': 'TotVArh_SF',
+            'TotVArhImpQ2PhC': 'TotVArh_SF',
+            'TotVArhExpQ3': 'TotVArh_SF',
+            'TotVArhExpQ3PhA': 'TotVArh_SF',
+            'TotVArhExpQ3PhB': 'TotVArh_SF',
+            'TotVArhExpQ3PhC': 'TotVArh_SF',
+            'TotVArhExpQ4': 'TotVArh_SF',
+            'TotVArhExpQ4PhA': 'TotVArh_SF',
+            'TotVArhExpQ4PhB': 'TotVArh_SF',
+            'TotVArhExpQ4PhC': 'TotVArh_SF',
+        }
+
+    _FIXED = Struct('>hhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhhLLLLLLLLhLLLLLLLLhLLLLLLLLLLLLLLLLhL')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2, _3, _4, _5, _6, _7, _8, _9, _10, _11, _12, _13, _14, _15, _16, _17, _18, _19, _20, _21, _22, _23, _24, _25, _26, _27, _28, _29, _30, _31, _32, _33, _34, _35, _36, _37, _38, _39, _40, _41, _42, _43, _44, _45, _46, _47, _48, _49, _50, _51, _52, _53, _54, _55, _56, _57, _58, _59, _60, _61, _62, _63, _64, _65, _66, _67, _68, _69, _70, _71) = self._FIXED.unpack_from(data, offset)
+        self.A = None if _0 == -32768 else _0
+        self.AphA = None if _1 == -32768 else _1
+        self.AphB = None if _2 == -32768 else _2
+        self.AphC = None if _3 == -32768 else _3
+        self.A_SF = None if _4 == -32768 else _4
+        self.PhV = None if _5 == -32768 else _5
+        self.PhVphA = None if _6 == -32768 else _6
+        self.PhVphB = None if _7 == -32768 else _7
+        self.PhVphC = None if _8 == -32768 else _8
+        self.PPV = None if _9 == -32768 else _9
+        self.PhVphAB = None if _10 == -32768 else _10
+        self.PhVphBC = None if _11 == -32768 else _11
+        self.PhVphCA = None if _12 == -32768 else _12
+        self.V_SF = None if _13 == -32768 else _13
+        self.Hz = None if _14 == -32768 else _14
+        self.Hz_SF = None if _15 == -32768 else _15
+        self.W = None if _16 == -32768 else _16
+        self.WphA = None if _17 == -32768 else _17
+        self.WphB = None if _18 == -32768 else _18
+        self.WphC = None if _19 == -32768 else _19
+        self.W_SF = None if _20 == -32768 else _20
+        self.VA = None if _21 == -32768 else _21
+        self.VAphA = None if _22 == -32768 else _22
+        self.VAphB = None if _23 == -32768 else _23
+        self.VAphC = None if _24 == -32768 else _24
+        self.VA_SF = None if _25 == -32768 else _25
+        self.VAR = None if _26 == -32768 else _26
+        self.VARphA = None if _27 == -32768 else _27
+        self.VARphB = None if _28 == -32768 else _28
+        self.VARphC = None if _29 == -32768 else _29
+        self.VAR_SF = None if _30 == -32768 else _30
+        self.PF = None if _31 == -32768 else _31
+        self.PFphA = None if _32 == -32768 else _32
+        self.PFphB = None if _33 == -32768 else _33
+        self.PFphC = None if _34 == -32768 else _34
+        self.PF_SF = None if _35 == -32768 else _35
+        self.TotWhExp = None if _36 == 0 else _36
+        self.TotWhExpPhA = None if _37 == 0 else _37
+        self.TotWhExpPhB = None if _38 == 0 else _38
+        self.TotWhExpPhC = None if _39 == 0 else _39
+        self.TotWhImp = None if _40 == 0 else _40
+        self.TotWhImpPhA = None if _41 == 0 else _41
+        self.TotWhImpPhB = None if _42 == 0 else _42
+        self.TotWhImpPhC = None if _43 == 0 else _43
+        self.TotWh_SF = None if _44 == -32768 else _44
+        self.TotVAhExp = None if _45 == 0 else _45
+        self.TotVAhExpPhA = None if _46 == 0 else _46
+        self.TotVAhExpPhB = None if _47 == 0 else _47
+        self.TotVAhExpPhC = None if _48 == 0 else _48
+        self.TotVAhImp = None if _49 == 0 else _49
+        self.TotVAhImpPhA = None if _50 == 0 else _50
+        self.TotVAhImpPhB = None if _51 == 0 else _51
+        self.TotVAhImpPhC = None if _52 == 0 else _52
+        self.TotVAh_SF = None if _53 == -32768 else _53
+        self.TotVArhImpQ1 = None if _54 == 0 else _54
+        self.TotVArhImpQ1PhA = None if _55 == 0 else _55
+        self.TotVArhImpQ1PhB = None if _56 == 0 else _56
+        self.TotVArhImpQ1PhC = None if _57 == 0 else _57
+        self.TotVArhImpQ2 = None if _58 == 0 else _58
+        self.TotVArhImpQ2PhA = None if _59 == 0 else _59
+        self.TotVArhImpQ2PhB = None if _60 == 0 else _60
+        self.TotVArhImpQ2PhC = None if _61 == 0 else _61
+        self.TotVArhExpQ3 = None if _62 == 0 else _62
+        self.TotVArhExpQ3PhA = None if _63 == 0 else _63
+        self.TotVArhExpQ3PhB = None if _64 == 0 else _64
+        self.TotVArhExpQ3PhC = None if _65 == 0 else _65
+        self.TotVArhExpQ4 = None if _66 == 0 else _66
+        self.TotVArhExpQ4PhA = None if _67 == 0 else _67
+        self.TotVArhExpQ4PhB = None if _68 == 0 else _68
+        self.TotVArhExpQ4PhC = None if _69 == 0 else _69
+        self.TotVArh_SF = None if _70 == -32768 else _70
+        self.Evt = None if _71 == 4294967295 else _71
@@ -0,0 +1,125 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 64900.
+# Do not edit.
+
+
+from .base import RecordBase, decode_string
+from struct import Struct
+
+
+class Model64900Record(RecordBase):
+    """
+    Register record for model 64900 (bsm).
+    """
+    __slots__ = (
+            'ErrM',
+            'SNM',
+            'SNC',
+            'VrM',
+            'VrC',
+            'MA1',
+            'MA2',
+            'RCR',
+            'RCR_SF',
+            'PDCnt',
+            'RCnt',
+            'OS',
+            'Epoch',
+            'TZO',
+            'EpochSetCnt',
+            'EpochSetOS',
+            'DI',
+            'DO',
+            'DIChgOS',
+            'DIChgEpoch',
+            'DIChgTZO',
+            'DOChgOS',
+            'DOChgEpoch',
+            'DOChgTZO',
+            'Meta1',
+            'Meta2',
+            'Meta3',
+            'NPK',
+            'BPK',
+            'PK',
+        )
+
+    MODEL_ID = 64900
+    MODEL_NAME = 'bsm'
+    LENGTH = 300
+    FIXED_LENGTH = 252
+    POINTS = (
+            'ErrM',
+            'SNM',
+            'SNC',
+            'VrM',
+            'VrC',
+            'MA1',
+            'MA2',
+            'RCR',
+            'PDCnt',
+            'RCnt',
+            'OS',
+            'Epoch',
+            'TZO',
+            'EpochSetCnt',
+            'EpochSetOS',
+            'DI',
+            'DO',
+            'DIChgOS',
+            'DIChgEpoch',
+            'DIChgTZO',
+            'DOChgOS',
+            'DOChgEpoch',
+            'DOChgTZO',
+            'Meta1',
+            'Meta2',
+            'Meta3',
+            'NPK',
+            'BPK',
+        )
+    SCALE_FACTORS = {
+            'RCR': 'RCR_SF',
+        }
+    BLOB = 'PK'
+
+    _FIXED = Struct('>8s16s16s16s16s16s16sLhLLLLhLLHHLLhLLh140s100s100sHH')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2, _3, _4, _5, _6, _7, _8, _9, _10, _11, _12, _13, _14, _15, _16, _17, _18, _19, _20, _21, _22, _23, _24, _25, _26, _27, _28) = self._FIXED.unpack_from(data, offset)
+        self.ErrM = decode_string(_0)
+        self.SNM = decode_string(_1)
+        self.SNC = decode_string(_2)
+        self.VrM = decode_string(_3)
+        self.VrC = decode_string(_4)
+        self.MA1 = decode_string(_5)
+        self.MA2 = decode_string(_6)
+        self.RCR = None if _7 == 0 else _7
+        self.RCR_SF = None if _8 == -32768 else _8
+        self.PDCnt = None if _9 == 4294967295 else _9
+        self.RCnt = None if _10 == 4294967295 else _10
+        self.OS = None if _11 == 4294967295 else _11
+        self.Epoch = None if _12 == 4294967295 else _12
+        self.TZO = None if _13 == -32768 else _13
+        self.EpochSetCnt = None if _14 == 4294967295 else _14
+        self.EpochSetOS = None if _15 == 4294967295 else _15
+        self.DI = None if _16 == 65535 else _16
+        self.DO = None if _17 == 65535 else _17
+        self.DIChgOS = None if _18 == 4294967295 else _18
+        self.DIChgEpoch = None if _19 == 4294967295 else _19
+        self.DIChgTZO = None if _20 == -32768 else _20
+        self.DOChgOS = None if _21 == 4294967295 else _21
+        self.DOChgEpoch = None if _22 == 4294967295 else _22
+        self.DOChgTZO = None if _23 == -32768 else _23
+        self.Meta1 = decode_string(_24)
+        self.Meta2 = decode_string(_25)
+        self.Meta3 = decode_string(_26)
+        self.NPK = None if _27 == 65535 else _27
+        self.BPK = None if _28 == 65535 else _28
+        self.PK = bytes(data[offset + 504:offset + 600])
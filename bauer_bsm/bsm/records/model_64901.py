@@ -0,0 +1,105 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 64901.
+# Do not edit.
+
+
+from .base import RecordBase, decode_string
+from struct import Struct
+
+
+class Model64901Record(RecordBase):
+    """
+    Register record for model 64901 (bsm_snapshot).
+    """
+    __slots__ = (
+            'Typ',
+            'St',
+            'RCR',
+            'TotWhImp',
+            'Wh_SF',
+            'W',
+            'W_SF',
+            'MA1',
+            'RCnt',
+            'OS',
+            'Epoch',
+            'TZO',
+            'EpochSetCnt',
+            'EpochSetOS',
+            'DI',
+            'DO',
+            'Meta1',
+            'Meta2',
+            'Meta3',
+            'Evt',
+            'NSig',
+            'BSig',
+            'Sig',
+        )
+
+    MODEL_ID = 64901
+    MODEL_NAME = 'bsm_snapshot'
+    LENGTH = 252
+    FIXED_LENGTH = 204
+    POINTS = (
+            'Typ',
+            'St',
+            'RCR',
+            'TotWhImp',
+            'W',
+            'MA1',
+            'RCnt',
+            'OS',
+            'Epoch',
+            'TZO',
+            'EpochSetCnt',
+            'EpochSetOS',
+            'DI',
+            'DO',
+            'Meta1',
+            'Meta2',
+            'Meta3',
+            'Evt',
+            'NSig',
+            'BSig',
+        )
+    SCALE_FACTORS = {
+            'RCR': 'Wh_SF',
+            'TotWhImp': 'Wh_SF',
+            'W': 'W_SF',
+        }
+    BLOB = 'Sig'
+
+    _FIXED = Struct('>HHLLhhh16sLLLhLLHH140s100s100sLHH')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2, _3, _4, _5, _6, _7, _8, _9, _10, _11, _12, _13, _14, _15, _16, _17, _18, _19, _20, _21) = self._FIXED.unpack_from(data, offset)
+        self.Typ = None if _0 == 65535 else _0
+        self.St = None if _1 == 65535 else _1
+        self.RCR = None if _2 == 0 else _2
+        self.TotWhImp = None if _3 == 0 else _3
+        self.Wh_SF = None if _4 == -32768 else _4
+        self.W = None if _5 == -32768 else _5
+        self.W_SF = None if _6 == -32768 else _6
+        self.MA1 = decode_string(_7)
+        self.RCnt = None if _8 == 4294967295 else _8
+        self.OS = None if _9 == 4294967295 else _9
+        self.Epoch = None if _10 == 4294967295 else _10
+        self.TZO = None if _11 == -32768 else _11
+        self.EpochSetCnt = None if _12 == 4294967295 else _12
+        self.EpochSetOS = None if _13 == 4294967295 else _13
+        self.DI = None if _14 == 65535 else _14
+        self.DO = None if _15 == 65535 else _15
+        self.Meta1 = decode_string(_16)
+        self.Meta2 = decode_string(_17)
+        self.Meta3 = decode_string(_18)
+        self.Evt = None if _19 == 4294967295 else _19
+        self.NSig = None if _20 == 65535 else _20
+        self.BSig = None if _21 == 65535 else _21
+        self.Sig = bytes(data[offset + 408:offset + 504])
@@ -0,0 +1,45 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 64902.
+# Do not edit.
+
+
+from .base import RecordBase
+from struct import Struct
+
+
+class Model64902Record(RecordBase):
+    """
+    Register record for model 64902 (bsm_blob).
+    """
+    __slots__ = (
+            'Typ',
+            'NB',
+            'BB',
+            'B',
+        )
+
+    MODEL_ID = 64902
+    MODEL_NAME = 'bsm_blob'
+    LENGTH = 20
+    FIXED_LENGTH = 4
+    POINTS = (
+            'Typ',
+            'NB',
+            'BB',
+        )
+    BLOB = 'B'
+
+    _FIXED = Struct('>HHH2x')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2) = self._FIXED.unpack_from(data, offset)
+        self.Typ = None if _0 == 65535 else _0
+        self.NB = None if _1 == 65535 else _1
+        self.BB = None if _2 == 65535 else _2
+        self.B = bytes(data[offset + 8:offset + 40])
@@ -0,0 +1,42 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+#
+# Generated by tools/generate-records from the SMDX definition of model 64903.
+# Do not edit.
+
+
+from .base import RecordBase, decode_string
+from struct import Struct
+
+
+class Model64903Record(RecordBase):
+    """
+    Register record for model 64903 (bsm_ocmf).
+    """
+    __slots__ = (
+            'Typ',
+            'St',
+            'O',
+        )
+
+    MODEL_ID = 64903
+    MODEL_NAME = 'bsm_ocmf'
+    LENGTH = 498
+    FIXED_LENGTH = 498
+    POINTS = (
+            'Typ',
+            'St',
+            'O',
+        )
+
+    _FIXED = Struct('>HH992s')
+
+
+    def decode(self, data, offset=0):
+        (_0, _1, _2) = self._FIXED.unpack_from(data, offset)
+        self.Typ = None if _0 == 65535 else _0
+        self.St = None if _1 == 65535 else _1
+        self.O = decode_string(_2)  # noqa: E741
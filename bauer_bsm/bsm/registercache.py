@@ -0,0 +1,172 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+import threading
+import time
+
+
+# Caching register data with a time to live per model instance.
+#
+# Identification data like the common model, the serial interface, the
+# communication module firmware hash, or the public key of a meter does not
+# change while the meter is running. Long-running integrations read it again
+# and again nevertheless. A RegisterCache passed as cache to BsmClientDevice
+# keeps the register data read for the time to live (TTL) configured for the
+# model instance it belongs to and serves subsequent reads of this data from
+# memory.
+#
+# TTLs are given in seconds by cache class. A cache class is one of the
+# aliases of a model instance (like 'common' or 'tpm') or 'sm_key' for the
+# public key part of the BSM model instance (the registers from 'NPK' to its
+# end). A TTL of None keeps data until it gets invalidated and a TTL of zero
+# disables caching. Writes through the client invalidate the registers
+# written and creating a snapshot invalidates the data changed by the meter
+# along with it. Writes by other Modbus masters are not noticed. Keep this in
+# mind when choosing TTLs for writable data.
+
+
+# Cache classes not changing while the meter is running.
+BSM_DEFAULT_CACHE_TTLS = {
+        'common': None,
+        'sih': None,
+        'si': None,
+        'cfwh': None,
+        'sm_key': None,
+    }
+# Data of all other cache classes (like the live values from 'tpm' or
+# snapshots) does not get cached by default.
+BSM_DEFAULT_CACHE_TTL = 0
+
+BSM_PUBLIC_KEY_CACHE_CLASS = 'sm_key'
+
+
+
+
+class RegisterCache:
+    """
+    Cache for register data read by a BsmClientDevice. Each client needs a
+    cache of its own as the data is kept by register address.
+
+    Attributes:
+
+        ttls
+            Dictionary mapping cache classes to their TTL in seconds.
+
+        default_ttl
+            The TTL for all other cache classes.
+
+        hits, misses
+            Counters for reads served from the cache and reads which were
+            not.
+    """
+    def __init__(self, ttls=BSM_DEFAULT_CACHE_TTLS, default_ttl=BSM_DEFAULT_CACHE_TTL,
+            clock=time.monotonic):
+        self.ttls = dict(ttls)
+        self.default_ttl = default_ttl
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # TTL by register address and cached register data along with its
+        # expiry time (None for not expiring).
+        self._register_ttls = {}
+        self._registers = {}
+
+
+    def __repr__(self):
+        return '{}(registers={}, hits={}, misses={})'.format(type(self).__name__,
+            len(self._registers), self.hits, self.misses)
+
+
+    def _lookup(self, addr, count, now):
+        data = []
+
+        for register in range(addr, addr + count):
+            entry = self._registers.get(register)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                return None
+            data.append(entry[0])
+
+        return b''.join(data)
+
+
+    def _ttl_for_classes(self, classes):
+        for name in classes:
+            if name in self.ttls:
+                return self.ttls[name]
+
+        return self.default_ttl
+
+
+    def add(self, addr, data):
+        """
+        Adds the register data read starting at the given address. Data of
+        registers which are not to be cached gets ignored.
+        """
+        now = self.clock()
+
+        with self._lock:
+            for offset in range(len(data) // 2):
+                ttl = self._register_ttls.get(addr + offset, 0)
+                if ttl is None:
+                    self._registers[addr + offset] = (data[2 * offset:2 * offset + 2], None)
+                elif ttl > 0:
+                    self._registers[addr + offset] = (data[2 * offset:2 * offset + 2], now + ttl)
+
+
+    def add_region(self, classes, addr, count):
+        """
+        Assigns a register range to the first of the given cache classes
+        with a configured TTL. A later assignment replaces an earlier one for
+        the registers they share.
+        """
+        ttl = self._ttl_for_classes(classes)
+
+        with self._lock:
+            for register in range(addr, addr + count):
+                self._register_ttls[register] = ttl
+                self._registers.pop(register, None)
+
+
+    def covers(self, addr, count):
+        """
+        Returns whether all data for the given register range is cached.
+        """
+        with self._lock:
+            return self._lookup(addr, count, self.clock()) is not None
+
+
+    def get(self, addr, count):
+        """
+        Returns the cached data for the given register range or None if not
+        all of it is cached.
+        """
+        now = self.clock()
+
+        with self._lock:
+            result = self._lookup(addr, count, now)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return result
+
+
+    def invalidate(self, addr=None, count=None):
+        """
+        Drops the cached data for the given register range or all data if no
+        range is given.
+        """
+        with self._lock:
+            if addr is None:
+                self._registers.clear()
+            else:
+                for register in range(addr, addr + count):
+                    self._registers.pop(register, None)
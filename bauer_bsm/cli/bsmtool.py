@@ -11,19 +11,26 @@
 from . import util as cliutil
 from ..bsm import config
 from ..bsm import util as bsmutil
-from ..bsm.client import BsmClientDevice, SunSpecBsmClientDevice
-from ..crypto import util as cryptoutil
-from ..exporter import chargy, ocmf, registers
+from ..crypto import formats as cryptoformats
 from ..sunspec.core import suns
 from ..util import package_version
 from argparse import ArgumentParser, FileType
 
-import csv
+import atexit
+import json
 import os
 import re
+import shlex
 import sys
 
 
+# Modules which take a considerable amount of time to import (the client
+# along with pySunSpec's Modbus and serial support, ecdsa, the exporters, ...)
+# get imported by the commands which actually need them. This keeps the
+# start-up time low for the many short-lived invocations of this tool. See
+# tools/check-startup-time.
+
+
 # Slicers for modbus messages in pySunSpec's tracing output. They are meant for
 # messages represented as contigous hex strings and will return an array of
 # logically grouped data (device address, function code, ...).
@@ -37,6 +44,62 @@ _TRACE_RTU_SLICERS = \
     }
 
 
+
+
+class _ModelCache:
+    """
+    Keeps track of the model instances read by the commands of a batch for
+    not reading them again. A disabled cache reads all models requested.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.models = []
+
+
+    def __contains__(self, model):
+        return any(map(lambda x: x is model, self.models))
+
+
+    def forget(self, models=None):
+        """
+        Forgets the given models or all if none are given. Call this after
+        writing data to the device.
+        """
+        if models is None:
+            self.models = []
+        else:
+            self.models = [x for x in self.models if not any(map(lambda y: y is x, models))]
+
+
+    def read(self, client, models, compact=False):
+        """
+        Reads the given models which have not been read before. Compact
+        reading uses read_points_compact instead of read_models.
+        """
+        models_to_read = []
+        for model in models:
+            if model not in self and not any(map(lambda x: x is model, models_to_read)):
+                models_to_read.append(model)
+
+        if compact:
+            for model in models_to_read:
+                client.read_points_compact(model)
+        else:
+            client.read_models(models_to_read)
+
+        self.remember(models_to_read)
+
+
+    def remember(self, models):
+        """
+        Remembers the given models as read.
+        """
+        if self.enabled:
+            self.models.extend(filter(lambda x: x not in self, models))
+
+
+
+
 def create_argument_parser():
     # TODO: How to get the main binary name? '%(prog)s' returns the subcommand
     # name for subcommands.
@@ -53,30 +116,44 @@ def create_argument_parser():
     # Attempt to retrieve communication paramter defaults from environment
     # variables. This will allow short command lines for repeated invocations.
     device = os.getenv('BSMTOOL_DEVICE')
+    host = os.getenv('BSMTOOL_HOST')
+    port = cliutil.auto_int(os.getenv('BSMTOOL_PORT', 502))
+    framing = os.getenv('BSMTOOL_FRAMING', 'tcp')
+    window = cliutil.auto_int(os.getenv('BSMTOOL_WINDOW', 1))
     baud = cliutil.auto_int(os.getenv('BSMTOOL_BAUD', 19200))
     unit = cliutil.auto_int(os.getenv('BSMTOOL_UNIT', 42))
     timeout = float(os.getenv('BSMTOOL_TIMEOUT', 13))
     chunk = cliutil.auto_int(os.getenv('BSMTOOL_CHUNK', 125))
+    adaptive = cliutil.auto_bool(os.getenv('BSMTOOL_ADAPTIVE', False))
+    cache = cliutil.auto_bool(os.getenv('BSMTOOL_CACHE', False))
+    socket_path = os.getenv('BSMTOOL_SOCKET')
 
     parser = ArgumentParser(description='BSM Modbus Tool',
-        epilog='You may specify communication parameters also by environment variables. Use BSMTOOL_DEVICE, BSMTOOL_BAUD, BSMTOOL_UNIT, BSMTOOL_TIMEOUT, and BSMTOOL_CHUNK.')
+        epilog='You may specify communication parameters also by environment variables. Use BSMTOOL_DEVICE, BSMTOOL_HOST, BSMTOOL_PORT, BSMTOOL_FRAMING, BSMTOOL_WINDOW, BSMTOOL_BAUD, BSMTOOL_UNIT, BSMTOOL_TIMEOUT, BSMTOOL_CHUNK, BSMTOOL_ADAPTIVE, BSMTOOL_CACHE, and BSMTOOL_SOCKET.')
     # Default parser for communication parameters.
-    parser.add_argument('--device', metavar='DEVICE', help='serial device', required=(device is None), default=device)
+    parser.add_argument('--device', metavar='DEVICE', help='serial device', default=device)
+    parser.add_argument('--host', metavar='HOST', help='Modbus TCP gateway (instead of serial device)', default=host)
+    parser.add_argument('--port', metavar='PORT', type=cliutil.auto_int, help='Modbus TCP gateway port', default=port)
+    parser.add_argument('--framing', choices=['tcp', 'rtu'], help='Modbus framing used by TCP gateway (Modbus TCP or RTU over TCP)', default=framing)
+    parser.add_argument('--window', metavar='REQUESTS', type=cliutil.auto_int, help='maximum amount of outstanding Modbus TCP requests (values greater than one require a gateway supporting this)', default=window)
     parser.add_argument('--baud', metavar='BAUD', type=cliutil.auto_int, help='serial baud rate', default=baud)
     parser.add_argument('--timeout', metavar='SECONDS', type=float, help='request timeout', default=timeout)
-    parser.add_argument('--unit', metavar='UNIT', type=cliutil.auto_int, help='Modbus RTU unit number', required=(unit is None), default=unit)
+    parser.add_argument('--unit', metavar='UNIT', type=cliutil.auto_int, help='Modbus unit number', required=(unit is None), default=unit)
     parser.add_argument('--chunk-size', metavar='REGISTERS', type=cliutil.auto_int, help='maximum amount of registers to read at once', default=chunk)
+    parser.add_argument('--adaptive', action='store_true', help='reduce amount of registers to read at once after errors (up to chunk size) and retry failed reads', default=adaptive)
+    parser.add_argument('--cache', action='store_true', help='keep identification data and the public key once read (useful with \'serve\' and \'batch\')', default=cache)
+    parser.add_argument('--socket', metavar='PATH', help='Unix domain socket of a BSM Tool server (see \'serve\') for executing commands', default=socket_path)
     parser.add_argument('--trace', action='store_true', help='trace Modbus communication (reads/writes)')
     parser.add_argument('--verbose', action='store_true', help='give verbose output')
     parser.add_argument('--dtr', metavar='VALUE', type=cliutil.auto_bool, help='set serial device DTR line to VALUE (which may be used for controlling test equipment)', default=None)
     parser.add_argument('--rts', metavar='VALUE', type=cliutil.auto_bool, help='set serial device RTS line to VALUE (which may be used for controlling test equipment)', default=None)
-    parser.add_argument('--public-key-format', choices=cryptoutil.PUBLIC_KEY_RENDERER.keys(), help='output format of ECDSA public key (see RFC 5480 for DER and SEC1 section 2.3.3 for details about formats)', default=cryptoutil.PUBLIC_KEY_DEFAULT_FORMAT)
+    parser.add_argument('--public-key-format', choices=cryptoformats.PUBLIC_KEY_FORMATS, help='output format of ECDSA public key (see RFC 5480 for DER and SEC1 section 2.3.3 for details about formats)', default=cryptoformats.PUBLIC_KEY_DEFAULT_FORMAT)
 
     subparsers = parser.add_subparsers(metavar='COMMAND', help='sub commands')
 
     # List model instances.
     models_parser = subparsers.add_parser('models', help='list SunSpec model instances')
-    models_parser.set_defaults(func=list_model_instances_command)
+    models_parser.set_defaults(func=list_model_instances_command, served=True)
 
     # Export register layout.
     export_parser = subparsers.add_parser('export', help='export register layout')
@@ -85,41 +162,62 @@ def create_argument_parser():
 
     # Get model instance or single data point values.
     get_parser = subparsers.add_parser('get', help='get individual values')
-    get_parser.set_defaults(func=get_command)
+    get_parser.set_defaults(func=get_command, served=True)
     get_parser.add_argument('paths', metavar='PATH', nargs='+', help='get data from models or data points for the given path(s).')
     get_parser.epilog = path_epilog
 
     # Set data point values.
     set_parser = subparsers.add_parser('set', help='set values')
-    set_parser.set_defaults(func=set_command)
+    set_parser.set_defaults(func=set_command, served=True)
     set_parser.add_argument('path_value_pairs', metavar='PATH_VALUE', nargs='+', help='set data point values for the given path and value pairs (in the form PATH=VALUE).')
     set_parser.epilog = path_epilog
 
     # Request generating a snapshot (for a given snapshot name).
     create_snapshot_parser = subparsers.add_parser('create-snapshot', help='create snapshot but don\'t fetch data')
-    create_snapshot_parser.set_defaults(func=create_snapshot_command)
+    create_snapshot_parser.set_defaults(func=create_snapshot_command, served=True)
     create_snapshot_parser.add_argument('name', help=snapshot_alias_help)
 
     # Request snapshot, wait for completion and get data.
     get_snapshot_parser = subparsers.add_parser('get-snapshot', help='create snapshot and fetch data')
-    get_snapshot_parser.set_defaults(func=get_snapshot_command)
+    get_snapshot_parser.set_defaults(func=get_snapshot_command, served=True)
+    get_snapshot_parser.add_argument('--max-wait', metavar='SECONDS', type=float, help='maximum time to wait for the snapshot to become ready (defaults to 30 s)', default=None)
     get_snapshot_parser.add_argument('name', help=snapshot_alias_help)
 
     # Verify snapshot signature.
     verify_snapshot_parser = subparsers.add_parser('verify-snapshot', help='verify snapshot signature (but do not create it)')
-    verify_snapshot_parser.set_defaults(func=verify_snapshot_command)
+    verify_snapshot_parser.set_defaults(func=verify_snapshot_command, served=True)
     verify_snapshot_parser.add_argument('name', help=snapshot_alias_help)
 
     # Verify a signature for given message digest and public key.
-    verify_signature_parser = subparsers.add_parser('verify-signature', help='verify arbitrary signature for a given public key and digest')
-    verify_signature_parser.set_defaults(func=verify_signature_command)
-    verify_signature_parser.add_argument('public_key', metavar='PUBLIC_KEY', type=cliutil.hex_data_or_file, help='public key as hex data or a file name to read binary data from. The data is expected to be catenated x and y coordinates x || y.')
-    verify_signature_parser.add_argument('message_digest', metavar='MD', type=cliutil.hex_data_or_file, help='message digest as hex data or a file name to read binary data from.')
-    verify_signature_parser.add_argument('signature', metavar='SIGNATURE', type=cliutil.hex_data_or_file, help='signature as hex data or a file name to read binary from. The data is expected to be catenated r and s values r || s.')
+    verify_signature_parser = subparsers.add_parser('verify-signature', help='verify arbitrary signature for a given public key and digest',
+        epilog='In batch mode, each line of the input contains PUBLIC_KEY, MD, and SIGNATURE as hex data separated by whitespace. Empty lines and lines starting with \'#\' are ignored. The result gets printed for each signature along with its line number.')
+    verify_signature_parser.set_defaults(func=verify_signature_command, offline=True)
+    verify_signature_parser.add_argument('--batch', metavar='FILE', type=FileType('r'), help='verify signatures from FILE (\'-\' for standard input) instead of the command line arguments')
+    verify_signature_parser.add_argument('--processes', metavar='COUNT', type=cliutil.auto_int, help='number of processes for batch verification (defaults to the number of CPUs)', default=None)
+    verify_signature_parser.add_argument('public_key', metavar='PUBLIC_KEY', nargs='?', type=cliutil.hex_data_or_file, help='public key as hex data or a file name to read binary data from. The data is expected to be catenated x and y coordinates x || y.')
+    verify_signature_parser.add_argument('message_digest', metavar='MD', nargs='?', type=cliutil.hex_data_or_file, help='message digest as hex data or a file name to read binary data from.')
+    verify_signature_parser.add_argument('signature', metavar='SIGNATURE', nargs='?', type=cliutil.hex_data_or_file, help='signature as hex data or a file name to read binary from. The data is expected to be catenated r and s values r || s.')
+
+    # Verify signed meter values from Chargy JSON documents.
+    verify_chargy_parser = subparsers.add_parser('verify-chargy', help='verify signed meter values from Chargy JSON documents',
+        epilog='Each FILE contains either a single Chargy JSON document or one document per line (NDJSON). The result gets printed for each signed meter value along with its file (and line) and ID. Signed meter values occurring more than once get verified just once.')
+    verify_chargy_parser.set_defaults(func=verify_chargy_command, offline=True)
+    verify_chargy_parser.add_argument('--processes', metavar='COUNT', type=cliutil.auto_int, help='number of processes for verification (defaults to the number of CPUs)', default=None)
+    verify_chargy_parser.add_argument('files', metavar='FILE', nargs='+', help='Chargy JSON file (\'-\' for standard input)')
+
+    # Verify OCMF data.
+    verify_ocmf_parser = subparsers.add_parser('verify-ocmf', help='verify OCMF data from OCMF XML or files with OCMF data per line',
+        epilog='The signatures get verified with the public key given by --public-key, read from the meter with --meter-key, or the one supplied along with the data in OCMF XML. The result gets printed for each OCMF data along with its file and line (or index within OCMF XML).')
+    verify_ocmf_parser.set_defaults(func=verify_ocmf_command, offline=True)
+    verify_ocmf_parser.add_argument('--public-key', metavar='PUBLIC_KEY', type=cliutil.hex_data_or_file, help='public key (DER) as hex data or a file name to read binary data from', default=None)
+    verify_ocmf_parser.add_argument('--meter-key', action='store_true', help='read the public key from the meter')
+    verify_ocmf_parser.add_argument('--encoding', metavar='ENCODING', help='encoding of OCMF data per line (defaults to {})'.format(config.PYSUNSPEC_STRING_ENCODING), default=config.PYSUNSPEC_STRING_ENCODING)
+    verify_ocmf_parser.add_argument('--processes', metavar='COUNT', type=cliutil.auto_int, help='number of processes for verification (defaults to the number of CPUs)', default=None)
+    verify_ocmf_parser.add_argument('files', metavar='FILE', nargs='+', help='OCMF XML or OCMF data file (\'-\' for standard input)')
 
     # Generate data for Chargy from already existing snapshots.
     chargy_parser = subparsers.add_parser('chargy', help='generate billing data sample for Chargy from already existing snapshots (stons and stoffs)')
-    chargy_parser.set_defaults(func=chargy_command)
+    chargy_parser.set_defaults(func=chargy_command, served=True)
     chargy_parser.add_argument('--station-serial-number', metavar='SERIAL_NUMBER', help='charging station\'s serial number', default='2020-24-T-042')
     chargy_parser.add_argument('--station-compliance-info', metavar='INFO', help='compliance info information for the charging station', default='See https://www.chargeit-mobility.com/wp-content/uploads/chargeIT-Baumusterpr%C3%BCfbescheinigung-Lades%C3%A4ule-Online.pdf for type examination certificate')
     chargy_parser.add_argument('start', metavar='START', nargs='?', help=snapshot_alias_help, default='stons')
@@ -130,56 +228,115 @@ def create_argument_parser():
         epilog='Use matching matching start and end snapshots like \'stons\' and \'stoffs\' for typical OCMF XML output.')
     ocmf_xml_parser.add_argument('start', metavar='START', nargs='?', help=snapshot_alias_help, default='ostons')
     ocmf_xml_parser.add_argument('end', metavar='END', nargs='?', help=snapshot_alias_help, default='ostoffs')
-    ocmf_xml_parser.set_defaults(func=ocmf_xml_command)
+    ocmf_xml_parser.set_defaults(func=ocmf_xml_command, served=True)
+
+    # Execute commands from a file.
+    batch_parser = subparsers.add_parser('batch', help='execute commands from a file over a single connection',
+        epilog='Each line of FILE contains a command with its arguments like on the command line (for example \'get-snapshot stons\'). Empty lines and lines starting with \'#\' are ignored. The commands models, get, set, create-snapshot, get-snapshot, verify-snapshot, chargy, ocmf-xml, and dump are supported. They share the connection to the meter and model data read by a previous command gets reused until a command writes to the meter. A JSON object with line number, arguments, exit status, and output gets printed for each command.')
+    batch_parser.set_defaults(func=batch_command)
+    batch_parser.add_argument('--stop-on-error', action='store_true', help='stop at the first failing command')
+    batch_parser.add_argument('file', metavar='FILE', nargs='?', type=FileType('r'), help='file with one command per line (defaults to standard input)', default='-')
 
     # Hex-dump registers.
     dump_parser = subparsers.add_parser('dump', help='dump registers')
-    dump_parser.set_defaults(func=dump_command)
+    dump_parser.set_defaults(func=dump_command, served=True)
     dump_parser.add_argument('offset', metavar='OFFSET', type=cliutil.auto_int, help='Modbus register offset (words, starting at 0)')
     dump_parser.add_argument('length', metavar='LENGTH', type=cliutil.auto_int, help='block length (words)')
 
+    # Serve commands from a resident client.
+    serve_parser = subparsers.add_parser('serve', help='serve commands over a Unix domain socket (given by --socket)',
+        epilog='The server keeps the connection to the meter and its model instances and executes the commands models, get, set, create-snapshot, get-snapshot, verify-snapshot, chargy, ocmf-xml, and dump one after another. The BSM Tool sends these commands to the server when a socket is given by --socket or BSMTOOL_SOCKET. Communication parameters and --trace are taken from the server\'s command line then.')
+    serve_parser.set_defaults(func=serve_command)
+
     # Print version information.
     version_parser = subparsers.add_parser('version', help='print version')
-    version_parser.set_defaults(func=version_command)
+    version_parser.set_defaults(func=version_command, offline=True)
 
     return parser
 
 
+def create_bus(args):
+    from ..bsm import bus
+
+    if args.host is not None:
+        if args.framing == 'rtu':
+            result = bus.RtuOverTcpBus(args.host, port=args.port, timeout=args.timeout)
+        elif args.window > 1:
+            result = bus.PipelinedTcpBus(args.host, port=args.port,
+                timeout=args.timeout, window=args.window)
+        else:
+            result = bus.TcpBus(args.host, port=args.port, timeout=args.timeout)
+    else:
+        result = bus.SerialBus(args.device, baudrate=args.baud, timeout=args.timeout)
+
+        # Set the two modem control lines DTR and RTS. This might be useful
+        # for controlling test equipment via this lines.
+        if args.dtr is not None:
+            result.serial.dtr = args.dtr
+
+        if args.rts is not None:
+            result.serial.rts = args.rts
+
+    return result
+
+
 def create_client_backend(clazz, args):
     trace = None
     if args.trace:
-        trace = trace_modbus_rtu
-
-    client = clazz(slave_id=args.unit, name=args.device,
-        baudrate=args.baud, timeout=args.timeout, max_count=args.chunk_size,
-        trace=trace)
-
-    # Set the two modem control lines DTR and RTS. This might be useful for
-    # controlling test equipment via this lines.
-    serial = None
-    if isinstance(client, BsmClientDevice):
-        serial = client.modbus_device.client.serial
-    elif isinstance(client, SunSpecBsmClientDevice):
-        serial = client.device.modbus_device.client.serial
-    else:
-        raise ValueError('Unsupported client class {}'.format(type(client).__name__))
+        # The slicers only know about RTU frames. Print Modbus TCP frames as
+        # they are.
+        if args.host is not None and args.framing != 'rtu':
+            trace = print
+        else:
+            trace = trace_modbus_rtu
 
-    if args.dtr is not None:
-        serial.dtr = args.dtr
+    link = None
+    if args.adaptive:
+        from ..bsm.link import AdaptiveLink
+        link = AdaptiveLink(max_count=args.chunk_size)
 
-    if args.rts is not None:
-        serial.rts = args.rts
+        if args.verbose:
+            # Report the parameters chosen for the link when done.
+            atexit.register(lambda: print('Link: {}'.format(link), file=sys.stderr))
+
+    cache = None
+    if args.cache:
+        from ..bsm.registercache import RegisterCache
+        cache = RegisterCache()
 
-    return client
+        if args.verbose:
+            atexit.register(lambda: print('Cache: {}'.format(cache), file=sys.stderr))
+
+    return clazz(slave_id=args.unit, max_count=args.chunk_size, trace=trace,
+        bus=create_bus(args), link=link, cache=cache)
 
 
 
 def create_client(args):
+    # Commands executed by 'bsmtool serve' use the server's client. Closing
+    # it keeps the connection open.
+    client = getattr(args, 'resident_client', None)
+    if client is not None:
+        return client
+
+    from ..bsm.client import BsmClientDevice
     return create_client_backend(BsmClientDevice, args)
 
 
-def create_sunspec_client(args):
-    return create_client_backend(SunSpecBsmClientDevice, args)
+def execute_served_command(argv, client, cache=None):
+    """
+    Executes a command forwarded to 'bsmtool serve' or from a batch with the
+    given client. A batch passes its model cache.
+    """
+    parser = create_argument_parser()
+    args = parser.parse_args(argv)
+
+    if not getattr(args, 'served', False):
+        parser.error('command is not served')
+
+    args.resident_client = client
+    args.model_cache = cache
+    args.func(args)
 
 
 def md_trace_print(string):
@@ -187,6 +344,14 @@ def md_trace_print(string):
         print(line)
 
 
+def model_cache(args):
+    # Only a batch shares model data between commands.
+    cache = getattr(args, 'model_cache', None)
+    if cache is None:
+        cache = _ModelCache(enabled=False)
+    return cache
+
+
 def trace_modbus_rtu(string):
     # Attempt to logically group known Modbus frame formats in the trace output
     # from pySunSpec.
@@ -250,6 +415,9 @@ def export_command(args):
     """
     Exports the complete Modbus register layout from model data into CSV.
     """
+    from ..exporter import registers
+    import csv
+
     client = create_client(args)
     writer = csv.writer(args.file)
 
@@ -260,28 +428,52 @@ def export_command(args):
 
 def get_command(args):
     client = create_client(args)
+    lookups = []
+    models_to_read = []
+    points_to_read = []
 
     for path in args.paths:
         (model_name, point_id) = cliutil.model_name_and_point_id_for_path(path)
 
-        # TODO: Reuse models already read for this command.
         model = client.lookup_model(model_name)
         if not model:
             print('Unknown model \'{}\'.'.format(model_name), file=sys.stderr)
             sys.exit(1)
 
-        model.read_points()
+        # Attempt to interpret point_id as either a regular data point ID
+        # or the ID of a BLOB. Only the former could be read on its own.
+        #
+        # TODO: Add support for printing non-BLOB data from repeating
+        # blocks if required.
+        point = None
+        if point_id:
+            point = client.lookup_point_in_model(model, point_id)
 
+        lookups.append((model_name, model, point_id, point))
+        if point:
+            entry = next(filter(lambda x: x[0] is model, points_to_read), None)
+            if entry is None:
+                entry = (model, [])
+                points_to_read.append(entry)
+            entry[1].append(point)
+        elif not any(map(lambda x: x is model, models_to_read)):
+            models_to_read.append(model)
+
+    # Read each model instance just once and with as few requests as
+    # possible. Single data points get read along with their scale factors
+    # only, unless their model gets read completely anyway or has already
+    # been read within a batch.
+    cache = model_cache(args)
+    cache.read(client, models_to_read)
+    for (model, points) in points_to_read:
+        if model not in cache and not any(map(lambda x: x is model, models_to_read)):
+            client.read_points_subset(model, points)
+
+    for (model_name, model, point_id, point) in lookups:
         if point_id:
             device = model.device
             prefix = '{}/'.format(model.model_type.name)
 
-            # Attempt to interpret point_id as either a regular data point ID
-            # or the ID of a BLOB.
-            #
-            # TODO: Add support for printing non-BLOB data from repeating
-            # blocks if required.
-            point = client.lookup_point_in_model(model, point_id)
             if point:
                 cliutil.print_point_data(point, prefix=prefix)
             elif device.has_repeating_blocks_blob_layout(model) and device.repeating_blocks_blob_id(model).lower() == point_id.lower():
@@ -304,7 +496,9 @@ def set_command(args):
     for path_value in args.path_value_pairs:
         (path, value) = tuple(path_value.split('=', 1))
         (model_name, point_id) = cliutil.model_name_and_point_id_for_path(path)
-        (model, point) = client.lookup_model_and_point(model_name, point_id)
+        # Read the data point along with its scale factor for getting the
+        # new value scaled the same way as the one read.
+        (model, point) = client.lookup_model_and_point(model_name, point_id, read_data=True)
 
         if not model or not point:
             print('Unknown data point \'{}\''.format(path), file=sys.stderr)
@@ -323,6 +517,7 @@ def set_command(args):
     # working with this backend.
     for model in models_to_write:
         model.write_points()
+    model_cache(args).forget(models_to_write)
 
     client.close()
 
@@ -339,6 +534,8 @@ def create_snapshot_command(args):
         sys.exit(1)
     else:
         client.create_snapshot(alias)
+        # Creating a snapshot updates other models as well.
+        model_cache(args).forget()
 
     client.close()
 
@@ -355,8 +552,22 @@ def get_snapshot_command(args):
             file=sys.stderr)
         sys.exit(1)
     else:
-        snapshot = client.get_snapshot(alias)
+        from ..bsm.client import SnapshotTimeoutError
+
+        kwargs = {}
+        if args.max_wait is not None:
+            kwargs['timeout'] = args.max_wait
+
+        cache = model_cache(args)
+        cache.forget()
+        try:
+            snapshot = client.get_snapshot(alias, **kwargs)
+        except SnapshotTimeoutError as e:
+            print('Updating \'{}\' failed: {}'.format(args.name, e), file=sys.stderr)
+            sys.exit(1)
+
         if snapshot is not None:
+            cache.remember([model])
             print('Updating \'{}\' succeeded'.format(args.name))
             print('Snapshot data:')
             cliutil.print_model_data(model, verbose=args.verbose)
@@ -373,11 +584,59 @@ def get_snapshot_command(args):
         sys.exit(1)
 
 
+def batch_command(args):
+    from . import daemon
+
+    client = create_client(args)
+    cache = _ModelCache()
+    encoding = 'utf-8'
+    failed = False
+
+    for (number, line) in enumerate(args.file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            response = {'status': 2, 'stdout': '', 'stderr': 'Malformed command: {}\n'.format(e)}
+            argv = None
+        else:
+            response = daemon.execute_captured(
+                lambda: execute_served_command(argv, client, cache), encoding)
+            # Output gets captured as bytes. Give it as text in the JSON
+            # output.
+            for name in ['stdout', 'stderr']:
+                response[name] = daemon.transported_output(response[name]).decode(
+                    encoding, errors='backslashreplace')
+
+        result = {'line': number, 'argv': argv}
+        result.update(response)
+        print(json.dumps(result, separators=(',', ':')), flush=True)
+
+        if response['status'] != 0:
+            failed = True
+            # Data read before the error might be inconsistent.
+            cache.forget()
+            if args.stop_on_error:
+                break
+
+    client.close()
+    if failed:
+        sys.exit(1)
+
+
 def chargy_command(args):
-    client = create_sunspec_client(args)
+    from ..exporter import chargy
+
+    client = create_client(args)
     result = False
 
+    models = [config.COMMON_INSTANCE_ALIAS, config.BSM_INSTANCE_ALIAS, args.start, args.end]
+    model_cache(args).read(client, [client.model_aliases[x] for x in models])
     output = chargy.generate_chargy_json(client, args.start, args.end,
+        read_data=False,
         station_serial_number=args.station_serial_number,
         station_compliance_info=args.station_compliance_info)
 
@@ -394,10 +653,15 @@ def chargy_command(args):
 
 
 def ocmf_xml_command(args):
-    client = create_sunspec_client(args)
+    from ..exporter import ocmf
+
+    client = create_client(args)
     result = False
 
-    xml = ocmf.generate_ocmf_xml(client, begin_alias=args.start, end_alias=args.end)
+    models = [config.BSM_INSTANCE_ALIAS, args.start, args.end]
+    model_cache(args).read(client, [client.model_aliases[x] for x in models], compact=True)
+    xml = ocmf.generate_ocmf_xml(client, begin_alias=args.start, end_alias=args.end,
+        read_data=False)
 
     if xml is not None:
         sys.stdout.buffer.write(xml)
@@ -411,6 +675,141 @@ def ocmf_xml_command(args):
         sys.exit(1)
 
 
+def serve_command(args):
+    from . import daemon
+
+    if args.socket is None:
+        print('Serving requires a socket (--socket).', file=sys.stderr)
+        sys.exit(1)
+
+    client = create_client(args)
+    if args.verbose:
+        print('Serving on \'{}\'.'.format(args.socket), file=sys.stderr)
+    daemon.serve(args.socket, client, execute_served_command)
+    client.close()
+
+
+def verify_chargy_command(args):
+    from ..exporter import chargy
+
+    files = map(lambda x: sys.stdin if x == '-' else x, args.files)
+    results = chargy.verify_chargy_documents(chargy.read_chargy_documents(files),
+        processes=args.processes)
+    count = 0
+    duplicates = 0
+    failed = 0
+
+    for result in results:
+        count += 1
+        duplicates += result.duplicate
+        note = ' (duplicate)' if result.duplicate else ''
+
+        if result.error is not None:
+            print('{}: {}: Failed. {}'.format(result.source, result.id, result.error))
+            failed += 1
+        elif result.result:
+            if args.verbose:
+                print('{}: {}: Success{}.'.format(result.source, result.id, note))
+        else:
+            print('{}: {}: Failed{}.'.format(result.source, result.id, note))
+            failed += 1
+
+    if args.verbose:
+        print('Verified {} signed meter values ({} duplicates), {} failed.'.format(
+            count, duplicates, failed), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def verify_ocmf_command(args):
+    from ..exporter import ocmf
+
+    public_key = args.public_key
+    if args.meter_key:
+        if public_key is not None:
+            print('--public-key and --meter-key are mutually exclusive.', file=sys.stderr)
+            sys.exit(1)
+        if args.device is None and args.host is None:
+            print('Reading the public key requires a serial device (--device) or a Modbus TCP gateway (--host).', file=sys.stderr)
+            sys.exit(1)
+
+        client = create_client(args)
+        public_key = client.get_public_key()
+        client.close()
+
+    files = map(lambda x: sys.stdin.buffer if x == '-' else x, args.files)
+    results = ocmf.verify_ocmf_data(ocmf.read_ocmf_files(files, encoding=args.encoding),
+        public_key=public_key, processes=args.processes)
+    count = 0
+    failed = 0
+
+    for result in results:
+        count += 1
+        pagination = None
+        if result.ocmf is not None:
+            pagination = result.ocmf.payload.get('PG')
+
+        if result.error is not None:
+            print('{}: {}: Failed. {}'.format(result.source, pagination, result.error))
+            failed += 1
+        elif result.result:
+            if args.verbose:
+                print('{}: {}: Success.'.format(result.source, pagination))
+        else:
+            print('{}: {}: Failed.'.format(result.source, pagination))
+            failed += 1
+
+    if args.verbose:
+        print('Verified {} OCMF data, {} failed.'.format(count, failed), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+def verify_signature_batch(args):
+    from ..crypto import util as cryptoutil
+    from collections import deque
+
+    line_numbers = deque()
+
+    def items():
+        for (number, line) in enumerate(args.batch, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            try:
+                (public_key, message_digest, signature) = map(bytes.fromhex, line.split())
+            except ValueError:
+                # Let malformed lines fail verification for reporting them
+                # in order.
+                print('Malformed line {}.'.format(number), file=sys.stderr)
+                (public_key, message_digest, signature) = (b'', b'', b'')
+
+            line_numbers.append(number)
+            yield (public_key, message_digest, signature)
+
+    results = cryptoutil.verify_signed_digests(items(), config.BSM_MESSAGE_DIGEST,
+        processes=args.processes)
+    count = 0
+    failed = 0
+
+    for result in results:
+        number = line_numbers.popleft()
+        count += 1
+
+        if result:
+            if args.verbose:
+                print('{}: Success.'.format(number))
+        else:
+            print('{}: Failed.'.format(number))
+            failed += 1
+
+    if args.verbose:
+        print('Verified {} signatures, {} failed.'.format(count, failed), file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
 def verify_signature_command(args):
     # The following example will be verified successfully:
     #
@@ -418,6 +817,18 @@ def verify_signature_command(args):
     #     message digest: cab351d004e66292963ca855717cc7ba55cc84b11a655d0d1db4c705d05796e7
     #     signature:      30450220633af3e89b89747ed105f7b7df02b814ad289dc8d20aed6815c184e4344a0109022100d1e0019af352cadc5aef90687903c54c0e41074a3ede65d8798769ab44959329
     #
+    from ..crypto import util as cryptoutil
+
+    arguments = [args.public_key, args.message_digest, args.signature]
+    if args.batch is not None:
+        if any(map(lambda x: x is not None, arguments)):
+            print('Batch mode does not take signature data arguments.', file=sys.stderr)
+            sys.exit(1)
+        verify_signature_batch(args)
+        return
+    if any(map(lambda x: x is None, arguments)):
+        print('Public key, message digest, and signature are required.', file=sys.stderr)
+        sys.exit(1)
 
     if cryptoutil.verify_signed_digest(args.public_key, config.BSM_MESSAGE_DIGEST, args.signature, args.message_digest):
         if args.verbose:
@@ -439,7 +850,9 @@ def verify_snapshot_command(args):
             file=sys.stderr)
         sys.exit(1)
     else:
-        result = client.verify_snapshot(alias, trace=md_trace_print)
+        bsm = client.model_aliases[config.BSM_INSTANCE_ALIAS]
+        model_cache(args).read(client, [bsm, snapshot], compact=True)
+        result = client.verify_snapshot(alias, read_data=False, trace=md_trace_print)
 
     client.close()
     if not result:
@@ -460,6 +873,23 @@ def main():
     parser = create_argument_parser()
     args = parser.parse_args()
 
+    # Forward commands to a server if there is one.
+    if args.socket is not None and getattr(args, 'served', False):
+        from . import daemon
+
+        try:
+            sys.exit(daemon.forward(args.socket, sys.argv[1:]))
+        except OSError as e:
+            print('Could not connect to server at \'{}\': {}'.format(args.socket, e),
+                file=sys.stderr)
+            sys.exit(1)
+
+    offline = getattr(args, 'offline', False)
+    if not offline and args.device is None and args.host is None:
+        parser.error('either a serial device (--device) or a Modbus TCP gateway (--host) is required')
+    if args.host is not None and (args.dtr is not None or args.rts is not None):
+        parser.error('--dtr and --rts require a serial device')
+
     if hasattr(args, 'func'):
         args.func(args)
     else:
@@ -0,0 +1,198 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+
+
+# Serving BSM Tool commands from a resident client.
+#
+# 'bsmtool serve' keeps the connection to the meter and the model instances of
+# its client and executes commands sent over a Unix domain socket one after
+# another. The BSM Tool forwards these commands to the server when a socket is
+# configured. So callers neither pay for connection set-up and model loading
+# nor fight over the serial port.
+#
+# Requests and responses are compact JSON objects, one per line. A request
+# carries the command line arguments and the encoding for text output:
+#
+#     {"argv":["get","common/Md"],"encoding":"utf-8"}
+#
+# The response gives the exit status and the output of the command. Output is
+# transported as written (text in the requested encoding or binary data like
+# OCMF XML) with each byte mapped to the code point of the same value:
+#
+#     {"status":0,"stdout":"...","stderr":""}
+#
+# A connection may carry several requests.
+
+
+# Encoding mapping each byte to the code point of the same value.
+_OUTPUT_TRANSPORT_ENCODING = 'latin-1'
+
+
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode('utf-8'))
+                argv = request['argv']
+                encoding = request.get('encoding', 'utf-8')
+                if not isinstance(argv, list) or not all(map(lambda x: isinstance(x, str), argv)):
+                    raise ValueError('argv is not a list of strings')
+            except (KeyError, TypeError, ValueError) as e:
+                response = {'status': 2, 'stdout': '', 'stderr': 'Malformed request: {}\n'.format(e)}
+            else:
+                response = self.server.execute(argv, encoding)
+
+            self.wfile.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+    def __init__(self, path, client, execute):
+        super(_Server, self).__init__(path, _RequestHandler)
+        self.client = client
+        self.execute_command = execute
+        self.lock = threading.Lock()
+
+
+    def execute(self, argv, encoding):
+        """
+        Executes a command with the resident client and returns the response
+        for it.
+        """
+        # Commands print to sys.stdout and sys.stderr which get redirected
+        # for the whole process. Executing one command at a time also
+        # serializes the access to the meter.
+        with self.lock:
+            return execute_captured(lambda: self.execute_command(argv, self.client),
+                encoding)
+
+
+
+
+def _output_stream(encoding):
+    return io.TextIOWrapper(io.BytesIO(), encoding=encoding,
+        errors='backslashreplace', write_through=True)
+
+
+def _remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        # Nobody is listening anymore.
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+
+    raise OSError('A server is already listening on \'{}\'.'.format(path))
+
+
+def execute_captured(function, encoding):
+    """
+    Calls function with sys.stdout and sys.stderr redirected and returns a
+    response with its exit status and output. Output gets written in the
+    given encoding and transported as described above.
+    """
+    stdout = _output_stream(encoding)
+    stderr = _output_stream(encoding)
+    status = 0
+
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            function()
+        except SystemExit as e:
+            status = e.code
+            if status is None:
+                status = 0
+            elif not isinstance(status, int):
+                print(status, file=sys.stderr)
+                status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            stdout.flush()
+            stderr.flush()
+
+    return {
+            'status': status,
+            'stdout': stdout.buffer.getvalue().decode(_OUTPUT_TRANSPORT_ENCODING),
+            'stderr': stderr.buffer.getvalue().decode(_OUTPUT_TRANSPORT_ENCODING),
+        }
+
+
+def forward(path, argv):
+    """
+    Sends the command given by argv to the server listening on path, writes
+    its output to sys.stdout and sys.stderr, and returns its exit status.
+    """
+    request = {'argv': argv, 'encoding': sys.stdout.encoding or 'utf-8'}
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(request, separators=(',', ':')).encode('utf-8') + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline().decode('utf-8'))
+
+    for (name, stream) in [('stdout', sys.stdout), ('stderr', sys.stderr)]:
+        stream.flush()
+        stream.buffer.write(transported_output(response[name]))
+        stream.buffer.flush()
+
+    return response['status']
+
+
+def serve(path, client, execute):
+    """
+    Serves commands on the Unix domain socket at path until being
+    interrupted or terminated. Commands get executed by calling execute
+    with the command line arguments and the given client.
+    """
+    _remove_stale_socket(path)
+    server = _Server(path, client, execute)
+
+    # Clean up on SIGTERM too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def transported_output(text):
+    """
+    Returns the output bytes transported as text in a response.
+    """
+    return text.encode(_OUTPUT_TRANSPORT_ENCODING)
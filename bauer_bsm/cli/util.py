@@ -5,9 +5,8 @@
 # SPDX-License-Identifier: Apache-2.0
 
 
-from ..bsm import config
 from ..bsm import format as fmt
-from ..crypto import util as cryptoutil
+from ..crypto import formats as cryptoformats
 
 import argparse
 import string
@@ -93,7 +92,7 @@ def print_block_data(block, indent=MODEL_DATA_INDENT):
         print_point_data(point, prefix=indent)
 
 
-def print_model_data(model, indent=MODEL_DATA_INDENT, verbose=False, pk_format=cryptoutil.PUBLIC_KEY_DEFAULT_FORMAT):
+def print_model_data(model, indent=MODEL_DATA_INDENT, verbose=False, pk_format=cryptoformats.PUBLIC_KEY_DEFAULT_FORMAT):
     first = model.blocks[0]
     repeating = model.blocks[1:]
 
@@ -128,6 +127,11 @@ def print_point_data(point, prefix=''):
 
 
 def render_blob_data(model, pk_format='der'):
+    # Rendering public keys requires the ecdsa package which takes a while to
+    # import. Only do so when actually required.
+    from ..bsm import config
+    from ..crypto import util as cryptoutil
+
     device = model.device
     data = device.repeating_blocks_blob(model)
 
@@ -0,0 +1,136 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+from .curves import SECP256r1
+from ecdsa import BadSignatureError
+from ecdsa import der
+from ecdsa.util import MalformedSignature
+import functools
+
+
+# Backends for verifying ECDSA signatures.
+#
+# Verifying a signature with the pure-Python ecdsa package takes milliseconds.
+# The OpenSSL-backed cryptography package does this much faster and gets used
+# when it is available. Decoding keys and signatures is always done by ecdsa
+# so both backends accept and reject exactly the same input. The cryptography
+# backend just performs the final check for the curve secp256r1 and hands
+# everything else to ecdsa. See tools/check-crypto-backends for comparing
+# their results.
+
+
+# Number of cryptography public keys to keep around.
+_PUBLIC_KEY_CACHE_SIZE = 128
+
+
+
+
+class EcdsaBackend:
+    """
+    Verification backend using the pure-Python ecdsa package.
+    """
+    name = 'ecdsa'
+
+
+    def verify_digest(self, public_key, signature_data, digest, sigdecode):
+        """
+        Verifies the signature for the given digest and ecdsa VerifyingKey
+        and returns the result.
+        """
+        try:
+            return public_key.verify_digest(signature_data, digest, sigdecode=sigdecode)
+        except BadSignatureError:
+            return False
+
+
+
+
+class CryptographyBackend(EcdsaBackend):
+    """
+    Verification backend using the cryptography package for secp256r1. It
+    raises ImportError when cryptography is not available.
+    """
+    name = 'cryptography'
+
+
+    def __init__(self):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import \
+            Prehashed, encode_dss_signature
+
+        self._encode_signature = encode_dss_signature
+        self._invalid_signature = InvalidSignature
+        self._algorithm = ec.ECDSA(Prehashed(hashes.SHA256()))
+        self._digest_len = hashes.SHA256.digest_size
+
+
+    def verify_digest(self, public_key, signature_data, digest, sigdecode):
+        curve = public_key.curve
+        digest = bytes(digest)
+
+        # Leave other curves and digests which ecdsa would reject or interpret
+        # differently to ecdsa.
+        if curve.oid != SECP256r1.oid or not 0 < len(digest) <= self._digest_len:
+            return super(CryptographyBackend, self).verify_digest(public_key,
+                signature_data, digest, sigdecode)
+
+        try:
+            (r, s) = sigdecode(signature_data, public_key.pubkey.order)
+        except (der.UnexpectedDER, MalformedSignature):
+            return False
+
+        order = public_key.pubkey.order
+        if not (0 < r < order and 0 < s < order):
+            return False
+
+        # Shorter digests represent the same number when padded with leading
+        # zeros like ecdsa does.
+        digest = digest.rjust(self._digest_len, b'\0')
+
+        try:
+            _cryptography_public_key(public_key.to_string('uncompressed')).verify(
+                self._encode_signature(r, s), digest, self._algorithm)
+            return True
+        except self._invalid_signature:
+            return False
+
+
+
+
+@functools.lru_cache(maxsize=_PUBLIC_KEY_CACHE_SIZE)
+def _cryptography_public_key(point):
+    from cryptography.hazmat.primitives.asymmetric import ec
+    return ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), point)
+
+
+@functools.lru_cache(maxsize=None)
+def default_backend():
+    """
+    Returns the fastest backend available.
+    """
+    try:
+        return CryptographyBackend()
+    except ImportError:
+        return EcdsaBackend()
+
+
+def get_backend(name):
+    """
+    Returns the backend with the given name. It raises ImportError if the
+    package required by this backend is not available.
+    """
+    return BACKENDS[name]()
+
+
+
+
+BACKENDS = {
+        EcdsaBackend.name: EcdsaBackend,
+        CryptographyBackend.name: CryptographyBackend,
+    }
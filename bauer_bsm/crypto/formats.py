@@ -0,0 +1,17 @@
+# BSM Python library and command line tool
+#
+# Copyright (C) 2020 chargeIT mobility GmbH
+#
+# SPDX-License-Identifier: Apache-2.0
+
+
+# Names of the supported public key output formats. They are kept apart from
+# the actual renderers in crypto.util for not requiring the ecdsa package
+# when just referring to them.
+PUBLIC_KEY_DEFAULT_FORMAT = 'der'
+PUBLIC_KEY_FORMATS = [
+        'der',
+        'raw',
+        'sec1-compressed',
+        'sec1-uncompressed',
+    ]
@@ -7,15 +7,32 @@
 
 from ..bsm import config
 from ..bsm import dlms
+from ..bsm import md
 from ..bsm.client import BsmClientDevice, SnapshotStatus, SunSpecBsmClientDevice
 from ..sunspec.core import suns
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, deque, namedtuple
 from datetime import datetime, timedelta, timezone
+from struct import error as StructError, pack
 import json
 import uuid
 
 
 
+ChargyVerificationResult = namedtuple('ChargyVerificationResult',
+    'source, document_id, id, result, duplicate, error')
+ChargyVerificationResult.__doc__ = \
+    """
+    Result of verifying a signed meter value from a Chargy document. Source
+    gives the file (and line) the document has been read from, id the '@id'
+    of the signed meter value and document_id the one of its document.
+    Duplicate tells whether the result has been taken from an earlier
+    verification of the same signed meter value. Error describes why a
+    signed meter value could not be verified at all.
+    """
+
+_ChargyRecord = namedtuple('_ChargyRecord',
+    'source, document_id, id, public_key, digest, signature, error')
+
 _DisplayHint = namedtuple('_DisplayHint', 'prefix, precision')
 
 
@@ -71,11 +88,74 @@ _SNAPSHOT_METADATA_POINT_IDS = [
     ]
 
 
+_CHARGY_STRUCT_FORMAT_BY_VALUE_TYPE = {
+        'Integer32': '>lbB',
+        'UnsignedInteger32': '>LbB',
+    }
+
+# Chargy assumes UTF-8 for string values without an explicit encoding.
+_CHARGY_DEFAULT_VALUE_ENCODING = 'UTF-8'
+
+
 _KNOWN_ID_TYPE_SCHEMES = ['rfid', 'sms']
 
 
 
 
+def _chargy_records(source, document, error):
+    """
+    Yields a record with the data for verifying each signed meter value from
+    a Chargy document.
+    """
+    if error is not None:
+        yield _ChargyRecord(source, None, None, None, None, None, error)
+        return
+
+    if not isinstance(document, dict) or not isinstance(document.get('signedMeterValues'), list):
+        yield _ChargyRecord(source, None, None, None, None, None,
+            'Not a Chargy document with signed meter values.')
+        return
+
+    document_id = document.get('@id')
+
+    for value in document['signedMeterValues']:
+        id_ = value.get('@id') if isinstance(value, dict) else None
+
+        try:
+            public_key = bytes.fromhex(value['meterInfo']['publicKey'])
+            signature = bytes.fromhex(value['signature'])
+            data = b''.join(map(_chargy_value_md_data, value['additionalValues']))
+            digest = config.BSM_MESSAGE_DIGEST(data).digest()
+        except (KeyError, LookupError, StructError, TypeError, ValueError) as e:
+            yield _ChargyRecord(source, document_id, id_, None, None, None,
+                'Malformed signed meter value ({}: {}).'.format(type(e).__name__, e))
+        else:
+            yield _ChargyRecord(source, document_id, id_, public_key, digest,
+                signature, None)
+
+
+def _chargy_value_md_data(value):
+    """
+    Returns the message digest input for a value from 'additionalValues'
+    like md.update_md_from_point does for the data point it has been
+    generated from.
+    """
+    measured = value['measuredValue']
+    type_ = measured['valueType']
+    data = measured.get('value')
+
+    # Values of data points which are not implemented have been left out.
+    if data is None:
+        data = md.md_unimpl_value_for_snapshot_point(value['measurand']['name'])
+
+    if type_ == 'String':
+        encoded = data.encode(measured.get('valueEncoding', _CHARGY_DEFAULT_VALUE_ENCODING))
+        return pack('>L', len(encoded)) + encoded
+    else:
+        return pack(_CHARGY_STRUCT_FORMAT_BY_VALUE_TYPE[type_], data,
+            measured['scale'], measured['unitEncoded'])
+
+
 def _generate_chargy_contract_information(snapshot):
     contract = _tagged_snapshot_metadata(snapshot, 'contract-id')
     result = {}
@@ -93,19 +173,23 @@ def _generate_chargy_contract_information(snapshot):
 def _generate_chargy_data(client, start_alias, end_alias, read_data=True, station_serial_number=None, station_compliance_info=None):
     data = None
 
-    common = client.model_aliases[config.COMMON_INSTANCE_ALIAS]
-    bsm = client.model_aliases[config.BSM_INSTANCE_ALIAS]
     start = client.model_aliases[start_alias]
     end = client.model_aliases[end_alias]
 
-    if read_data:
-        common.read_points()
-        bsm.read_points()
-        start.read_points()
-        end.read_points()
+    if read_data and client.identity_store is None:
+        # Read the model instances for the identity of the meter along with
+        # the snapshots.
+        common = client.model_aliases[config.COMMON_INSTANCE_ALIAS]
+        bsm = client.model_aliases[config.BSM_INSTANCE_ALIAS]
+        client.read_models([common, bsm, start, end])
+        identity = client.meter_identity(read_data=False)
+    else:
+        if read_data:
+            client.read_models([start, end])
+        identity = client.meter_identity(read_data=read_data)
 
-    start_data = _generate_chargy_snapshot_data(client, common, bsm, start)
-    end_data = _generate_chargy_snapshot_data(client, common, bsm, end)
+    start_data = _generate_chargy_snapshot_data(client, identity, start)
+    end_data = _generate_chargy_snapshot_data(client, identity, end)
 
     if start_data and end_data:
         data = OrderedDict()
@@ -146,7 +230,7 @@ def _generate_chargy_point_info_data(client, start, end):
     return data
 
 
-def _generate_chargy_snapshot_data(client, common, bsm, snapshot):
+def _generate_chargy_snapshot_data(client, identity, snapshot):
     data = None
 
     snapshot_status = snapshot.points[config.SNAPSHOT_STATUS_DATA_POINT_ID].value
@@ -176,15 +260,14 @@ def _generate_chargy_snapshot_data(client, common, bsm, snapshot):
 
         # Provide a combined firmware information string for meter and
         # communication module.
-        firmware_version = '{}, {}'.format(
-            bsm.points[config.BSM_SOFTWARE_VERSION_METER_DATA_POINT_ID].value,
-            bsm.points[config.BSM_SOFTWARE_VERSION_COMMUNICATION_MODULE_DATA_POINT_ID].value)
+        firmware_version = '{}, {}'.format(identity.meter_version,
+            identity.communication_module_version)
         data['meterInfo'] = {
                 'firmwareVersion': firmware_version,
-                'publicKey': client.get_public_key(read_data=False).hex(),
+                'publicKey': identity.public_key.hex(),
                 'meterId': meter_id,
-                'manufacturer': common.points[config.COMMON_MANUFACTURER_DATA_POINT_ID].value,
-                'type': common.points[config.COMMON_MODEL_DATA_POINT_ID].value,
+                'manufacturer': identity.manufacturer,
+                'type': identity.model,
             }
 
         data['contract'] = _generate_chargy_contract_information(snapshot)
@@ -286,6 +369,41 @@ def _put_non_null(dict_, key, value):
         dict_[key] = value
 
 
+def _read_chargy_file(name, file_):
+    lines = enumerate(file_, 1)
+    first = None
+
+    for (number, line) in lines:
+        if line.strip():
+            first = line
+            break
+    if first is None:
+        return
+
+    # A file starting with a complete JSON document in its first line is a
+    # stream of documents with one per line. Everything else is taken for a
+    # single (pretty-printed) document.
+    try:
+        document = json.loads(first)
+    except ValueError:
+        text = first + ''.join(map(lambda x: x[1], lines))
+        try:
+            yield (name, json.loads(text), None)
+        except ValueError as e:
+            yield (name, None, 'Malformed JSON ({}).'.format(e))
+        return
+
+    yield ('{}:{}'.format(name, number), document, None)
+
+    for (number, line) in lines:
+        if line.strip():
+            source = '{}:{}'.format(name, number)
+            try:
+                yield (source, json.loads(line), None)
+            except ValueError as e:
+                yield (source, None, 'Malformed JSON ({}).'.format(e))
+
+
 def _tagged_snapshot_metadata(snapshot, tag):
     prefix = tag + ': '
     result = None
@@ -329,3 +447,96 @@ def generate_chargy_json(client, start_alias, end_alias, read_data=True, station
     if data is not None:
         data = json.dumps(data, indent=2).encode('utf-8')
     return data
+
+
+def read_chargy_documents(files):
+    """
+    Reads Chargy JSON documents from files given by their names or as text
+    file objects. A file contains either a single JSON document or a stream
+    of documents with one per line (NDJSON).
+
+    Yields tuples of the source (the file name along with the line number
+    for streams), the document, and an error message for input which could
+    not be parsed.
+    """
+    for file_ in files:
+        if isinstance(file_, str):
+            with open(file_, encoding='utf-8') as f:
+                yield from _read_chargy_file(file_, f)
+        else:
+            yield from _read_chargy_file(getattr(file_, 'name', '-'), file_)
+
+
+def verify_chargy_documents(documents, processes=None, cache=None):
+    """
+    Verifies the signed meter values from Chargy documents given as tuples
+    like the ones from read_chargy_documents. The message digest gets
+    computed from 'additionalValues' and the signature gets verified with
+    the public key from 'meterInfo'. Yields a ChargyVerificationResult for
+    each signed meter value in the order of the input.
+
+    Signatures get verified in parallel by crypto.util.verify_signed_digests
+    (see there for processes). Signed meter values with the same '@id' and
+    signature get verified just once when they match in public key and
+    message digest too. The cache is a dictionary mapping these pairs to a
+    fingerprint and the result. Pass the same one to subsequent calls for
+    skipping signed meter values verified before.
+    """
+    from ..crypto import util as cryptoutil
+
+    if cache is None:
+        cache = {}
+
+    # Records in the order of the input along with their cache key and the
+    # fingerprint of their public key and digest. The latter is None for
+    # records not getting verified on their own. These get passed as
+    # placeholders with an unusable public key for keeping the amount of
+    # pending records bounded by the batches of verify_signed_digests.
+    pending = deque()
+    # Fingerprints of records getting verified by cache key.
+    verifying = {}
+
+    def items():
+        for document in documents:
+            for record in _chargy_records(*document):
+                if record.error is not None:
+                    pending.append((record, None, None))
+                    yield (None, None, None)
+                    continue
+
+                key = (record.id, record.signature)
+                fingerprint = config.BSM_MESSAGE_DIGEST(record.public_key + record.digest).digest()
+                known = verifying.get(key)
+                if known is None:
+                    known = cache.get(key, (None, None))[0]
+
+                if fingerprint == known:
+                    pending.append((record, key, None))
+                    yield (None, None, None)
+                else:
+                    verifying[key] = fingerprint
+                    pending.append((record, key, fingerprint))
+                    yield (record.public_key, record.digest, record.signature)
+
+    def resolve(entry, result=None):
+        (record, key, fingerprint) = entry
+        duplicate = False
+
+        if record.error is not None:
+            result = False
+        elif fingerprint is None:
+            result = cache[key][1]
+            duplicate = True
+        else:
+            cache[key] = (fingerprint, result)
+            if verifying.get(key) == fingerprint:
+                del verifying[key]
+
+        return ChargyVerificationResult(record.source, record.document_id,
+            record.id, result, duplicate, record.error)
+
+    results = cryptoutil.verify_signed_digests(items(), config.BSM_MESSAGE_DIGEST,
+        processes=processes)
+
+    for result in results:
+        yield resolve(pending.popleft(), result)
@@ -7,6 +7,177 @@
 
 from ..bsm import config
 from ..bsm.client import BsmClientDevice, SnapshotStatus, SunSpecBsmClientDevice
+from collections import deque, namedtuple
+import base64
+import binascii
+import itertools
+import json
+
+
+OcmfVerificationResult = namedtuple('OcmfVerificationResult',
+    'source, ocmf, result, error')
+OcmfVerificationResult.__doc__ = \
+    """
+    Result of verifying OCMF data. Source gives the file and the line or
+    the index of the value within OCMF XML the data has been read from and
+    ocmf the parsed data (if parsing succeeded). Error describes why the data
+    could not be verified at all.
+    """
+
+
+OCMF_HEADER = 'OCMF'
+OCMF_SEPARATOR = '|'
+
+# Signature algorithm, encoding, and format as used by the BSM-WS36A. These
+# are the defaults from the OCMF specification as well, except for the
+# algorithm.
+OCMF_SIGNATURE_ALGORITHM = 'ECDSA-secp256r1-SHA256'
+OCMF_SIGNATURE_ENCODING = 'hex'
+OCMF_SIGNATURE_MIME_TYPE = 'application/x-der'
+
+_OCMF_SIGNATURE_DECODERS = {
+        'base64': base64.b64decode,
+        'hex': bytes.fromhex,
+    }
+
+
+
+
+class OcmfError(ValueError):
+    """
+    Raised for malformed or unsupported OCMF data.
+    """
+    pass
+
+
+
+
+class Ocmf:
+    """
+    OCMF data as created by the meter in the form
+    'OCMF|{payload}|{signature}'.
+
+    Attributes:
+
+        payload_text
+            The payload section as text. The signature is computed for
+            exactly this text in the meter's string encoding.
+
+        payload
+            The payload section as parsed from JSON.
+
+        signature
+            The signature section as parsed from JSON.
+    """
+    def __init__(self, payload_text, payload, signature):
+        self.payload_text = payload_text
+        self.payload = payload
+        self.signature = signature
+
+
+    def __repr__(self):
+        return '{}(payload={!r}, signature={!r})'.format(type(self).__name__,
+            self.payload, self.signature)
+
+
+    def digest(self):
+        """
+        Returns the message digest of the payload section.
+        """
+        data = self.payload_text.encode(config.PYSUNSPEC_STRING_ENCODING)
+        return config.BSM_MESSAGE_DIGEST(data).digest()
+
+
+    def signature_data(self):
+        """
+        Returns the signature data (DER). OcmfError gets raised for
+        signature algorithms and encodings not used by the BSM-WS36A.
+        """
+        algorithm = self.signature.get('SA', OCMF_SIGNATURE_ALGORITHM)
+        encoding = self.signature.get('SE', OCMF_SIGNATURE_ENCODING)
+        mime_type = self.signature.get('SM', OCMF_SIGNATURE_MIME_TYPE)
+
+        if algorithm != OCMF_SIGNATURE_ALGORITHM:
+            raise OcmfError('Unsupported signature algorithm \'{}\'.'.format(algorithm))
+        if mime_type != OCMF_SIGNATURE_MIME_TYPE:
+            raise OcmfError('Unsupported signature format \'{}\'.'.format(mime_type))
+        decoder = _OCMF_SIGNATURE_DECODERS.get(encoding)
+        if decoder is None:
+            raise OcmfError('Unsupported signature encoding \'{}\'.'.format(encoding))
+
+        try:
+            return decoder(self.signature['SD'])
+        except (KeyError, TypeError, ValueError, binascii.Error) as e:
+            raise OcmfError('Malformed signature data ({}: {}).'.format(type(e).__name__, e))
+
+
+
+
+def _ocmf_line(name, number, line, encoding):
+    source = '{}:{}'.format(name, number)
+
+    try:
+        return (source, line.decode(encoding).strip(), None)
+    except UnicodeDecodeError as e:
+        return (source, None, 'Malformed data ({}).'.format(e))
+
+
+def _read_ocmf_file(name, file_, encoding):
+    lines = enumerate(file_, 1)
+
+    for (number, line) in lines:
+        if not line.strip():
+            continue
+
+        if line.lstrip().startswith(b'<'):
+            # Parse XML incrementally from the data read so far and the
+            # remaining lines.
+            yield from _read_ocmf_xml(name,
+                itertools.chain([line], map(lambda x: x[1], lines)))
+        else:
+            yield _ocmf_line(name, number, line, encoding)
+            for (number, line) in lines:
+                if line.strip():
+                    yield _ocmf_line(name, number, line, encoding)
+        return
+
+
+def _read_ocmf_xml(name, chunks):
+    from xml.etree.ElementTree import ParseError, XMLPullParser
+
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+    index = 0
+
+    try:
+        for chunk in chunks:
+            parser.feed(chunk)
+            for (event, element) in parser.read_events():
+                if root is None:
+                    root = element
+                if event != 'end' or element.tag != 'value':
+                    continue
+
+                index += 1
+                source = '{}[{}]'.format(name, index)
+                signed_data = element.find('signedData')
+                public_key = element.find('publicKey')
+
+                if signed_data is None:
+                    yield (source, None, 'Value without signed data.')
+                elif signed_data.get('format', 'OCMF') != 'OCMF' \
+                        or signed_data.get('encoding', 'plain') != 'plain':
+                    yield (source, None, 'Unsupported signed data format or encoding.')
+                else:
+                    if public_key is not None:
+                        public_key = (public_key.text or '').strip()
+                    yield (source, (signed_data.text or '').strip(), public_key)
+
+                # Drop processed values for keeping memory usage bounded.
+                root.clear()
+        parser.close()
+    except ParseError as e:
+        yield (name, None, 'Malformed XML ({}).'.format(e))
 
 
 def generate_ocmf_xml(client, begin_alias, end_alias, read_data=True):
@@ -23,15 +194,13 @@ def generate_ocmf_xml(client, begin_alias, end_alias, read_data=True):
         client = client.device
     assert isinstance(client, BsmClientDevice)
 
-    bsm = client.model_aliases['bs_meter']
     begin = client.model_aliases[begin_alias]
     end = client.model_aliases[end_alias]
     result = None
 
     if read_data:
-        bsm.read_points()
-        begin.read_points()
-        end.read_points()
+        client.read_points_compact(begin)
+        client.read_points_compact(end)
 
     begin_status = begin.points[config.OCMF_STATUS_DATA_POINT_ID].value
     begin_data = begin.points[config.OCMF_DATA_DATA_POINT_ID].value
@@ -41,9 +210,9 @@ def generate_ocmf_xml(client, begin_alias, end_alias, read_data=True):
     if begin_status == SnapshotStatus.VALID \
         and end_status == SnapshotStatus.VALID:
 
-        # Don't read BSM model instance containing the public key data
-        # again. If requested, this has been done above.
-        der = client.get_public_key(read_data=False).hex()
+        # Get the public key from the identity store or the BSM model
+        # instance if requested. This is not required for invalid snapshots.
+        der = client.get_public_key(read_data=read_data).hex()
 
         template = \
             '<?xml version="1.0" encoding="{encoding}" standalone="yes"?>\n' \
@@ -71,3 +240,109 @@ def generate_ocmf_xml(client, begin_alias, end_alias, read_data=True):
         result = template.format(**values).encode(config.PYSUNSPEC_STRING_ENCODING)
 
     return result
+
+
+def parse_ocmf(text):
+    """
+    Parses OCMF data in the form 'OCMF|{payload}|{signature}' as read from
+    the data point 'O' of the OCMF model instances and returns an Ocmf
+    object. OcmfError gets raised for malformed data.
+    """
+    (header, separator, sections) = text.partition(OCMF_SEPARATOR)
+    if header != OCMF_HEADER or not separator:
+        raise OcmfError('Missing OCMF header.')
+
+    # The payload may contain separators within strings but the signature
+    # does not.
+    (payload_text, separator, signature_text) = sections.rpartition(OCMF_SEPARATOR)
+    if not separator:
+        raise OcmfError('Missing signature section.')
+
+    try:
+        payload = json.loads(payload_text)
+        signature = json.loads(signature_text)
+    except ValueError as e:
+        raise OcmfError('Malformed JSON ({}).'.format(e))
+    if not isinstance(payload, dict) or not isinstance(signature, dict):
+        raise OcmfError('Sections are not JSON objects.')
+
+    return Ocmf(payload_text, payload, signature)
+
+
+def read_ocmf_files(files, encoding=config.PYSUNSPEC_STRING_ENCODING):
+    """
+    Reads OCMF data from files given by their names or as binary file
+    objects. A file contains either OCMF XML as generated by
+    generate_ocmf_xml or OCMF data with one per line in the given encoding.
+    The input gets processed incrementally.
+
+    Yields tuples of the source (the file name along with the line number
+    or the index of the value in OCMF XML), the OCMF text, and the public
+    key given along with it in OCMF XML as hex data. The OCMF text is None
+    and the public key gives an error message for input which could not be
+    processed.
+    """
+    for file_ in files:
+        if isinstance(file_, str):
+            with open(file_, 'rb') as f:
+                yield from _read_ocmf_file(file_, f, encoding)
+        else:
+            yield from _read_ocmf_file(getattr(file_, 'name', '-'), file_, encoding)
+
+
+def verify_ocmf_data(records, public_key=None, processes=None):
+    """
+    Verifies OCMF data given as tuples like the ones from read_ocmf_files.
+    The signatures get verified with the given public key (DER, like the
+    one from the BSM model instance) or otherwise with the one supplied
+    along with the data. Yields an OcmfVerificationResult for each record
+    in the order of the input.
+
+    Signatures get verified in parallel by crypto.util.verify_signed_digests
+    (see there for processes). Records get processed incrementally and the
+    amount of records in flight is bounded.
+    """
+    from ..crypto import util as cryptoutil
+
+    # Results or errors known in advance (None for records getting
+    # verified) in the order of the input. Failed records get passed as
+    # placeholders with an unusable public key which fail verification
+    # without any effort. This keeps the amount of pending records bounded
+    # by the batches of verify_signed_digests.
+    pending = deque()
+
+    def items():
+        for (source, text, key) in records:
+            ocmf = None
+            error = None
+
+            if text is None:
+                error = key
+            else:
+                try:
+                    ocmf = parse_ocmf(text)
+                    signature = ocmf.signature_data()
+                    if public_key is not None:
+                        key = public_key
+                    elif key is not None:
+                        key = bytes.fromhex(key)
+                    else:
+                        raise OcmfError('No public key.')
+                except ValueError as e:
+                    error = str(e)
+
+            pending.append((source, ocmf, error))
+            if error is None:
+                yield (key, ocmf.digest(), signature)
+            else:
+                yield (None, None, None)
+
+    results = cryptoutil.verify_signed_digests(items(), config.BSM_MESSAGE_DIGEST,
+        processes=processes)
+
+    for result in results:
+        (source, ocmf, error) = pending.popleft()
+        if error is None:
+            yield OcmfVerificationResult(source, ocmf, result, None)
+        else:
+            yield OcmfVerificationResult(source, ocmf, False, error)
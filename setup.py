@@ -30,13 +30,19 @@ setup(
         'setuptools_scm',
     ],
     # pySunSpec requires Python 3 in version 3.5 or greater. As we do not test
-    # on Python 2, we ignore the Python 2 support from pySunSpec.
-    python_requires='>=3.5',
+    # on Python 2, we ignore the Python 2 support from pySunSpec. Our lazy
+    # attributes of the config module (PEP 562) and the asyncio client
+    # require Python 3.7.
+    python_requires='>=3.7',
     install_requires=[
         'aenum',
         'ecdsa',
         'pyserial',
     ],
+    extras_require={
+        # Considerably faster signature verification.
+        'cryptography': ['cryptography'],
+    },
     packages=find_packages(),
     # Include model data from pySunSpec and us.
     package_data={